@@ -0,0 +1,115 @@
+# src/deepbase/budget.py
+"""
+Packer per --max-tokens: sceglie per ogni file la rappresentazione
+(contenuto completo, light o solo voce nell'albero) in modo che il documento
+stia nel budget di token, massimizzando il valore complessivo.
+
+È un knapsack a scelta multipla risolto con il greedy classico sull'inviluppo
+convesso delle opzioni di ogni file: si parte da "solo albero" e si applicano
+gli upgrade (albero -> light -> completo) in ordine di valore per token.
+Costo O(n log n) sul numero di file.
+"""
+
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+REPR_TREE = "tree"
+REPR_LIGHT = "light"
+REPR_FULL = "full"
+
+# Peso dei file che corrispondono a un pattern --focus
+FOCUS_WEIGHT = 10.0
+# Valore della versione light rispetto al contenuto completo dello stesso file:
+# firme e docstring portano la maggior parte dell'informazione strutturale
+LIGHT_SHARE = 0.7
+
+
+@dataclass
+class PackItem:
+    """Un file candidato: costi in token delle due rappresentazioni (None = non disponibile)."""
+    rel_path: str
+    full_tokens: Optional[int]
+    light_tokens: Optional[int]
+    in_focus: bool = False
+
+
+def file_value(item: PackItem) -> float:
+    """
+    Valore del contenuto completo di un file: cresce (meno che linearmente) con la dimensione,
+    diminuisce con la profondità nell'albero, è moltiplicato per i file in focus.
+    """
+    depth = item.rel_path.count("/")
+    size = item.full_tokens if item.full_tokens is not None else item.light_tokens or 0
+    value = math.log2(2 + size) / (1 + depth)
+    return value * FOCUS_WEIGHT if item.in_focus else value
+
+
+def _options(item: PackItem) -> List[Tuple[str, int, float]]:
+    """Opzioni non dominate del file, oltre a "solo albero": (rappresentazione, costo, valore)."""
+    value = file_value(item)
+    options = []
+    if item.light_tokens is not None:
+        options.append((REPR_LIGHT, item.light_tokens, value * LIGHT_SHARE))
+    if item.full_tokens is not None:
+        # Una light che non costa meno del completo non serve
+        options = [o for o in options if o[1] < item.full_tokens]
+        options.append((REPR_FULL, item.full_tokens, value))
+    return options
+
+
+def _upgrades(options: List[Tuple[str, int, float]]) -> List[Tuple[str, int, float]]:
+    """
+    Passi dell'inviluppo convesso: (rappresentazione, costo incrementale, valore incrementale),
+    con valore per token decrescente.
+    """
+    if len(options) == 2:
+        (_, light_cost, light_value), (_, full_cost, full_value) = options
+        # Se passare da light a completo rende più che fermarsi alla light, la light non è sull'inviluppo
+        if (full_value - light_value) / max(1, full_cost - light_cost) >= light_value / max(1, light_cost):
+            options = options[1:]
+    steps = []
+    prev_cost, prev_value = 0, 0.0
+    for name, cost, value in options:
+        steps.append((name, cost - prev_cost, value - prev_value))
+        prev_cost, prev_value = cost, value
+    return steps
+
+
+def pack(items: List[PackItem], budget: int) -> List[str]:
+    """Rappresentazione scelta per ogni item (stesso ordine), con costo totale <= budget."""
+    choice = [REPR_TREE] * len(items)
+    remaining = budget
+    all_options = [_options(item) for item in items]
+    plans = [_upgrades(options) for options in all_options]
+
+    heap: List[Tuple[float, int, int]] = []
+    for i, steps in enumerate(plans):
+        if steps:
+            _, cost, value = steps[0]
+            heapq.heappush(heap, (-value / max(1, cost), i, 0))
+
+    while heap and remaining > 0:
+        _, i, step = heapq.heappop(heap)
+        name, cost, _ = plans[i][step]
+        if cost <= remaining:
+            choice[i] = name
+            remaining -= cost
+            if step + 1 < len(plans[i]):
+                _, next_cost, next_value = plans[i][step + 1]
+                heapq.heappush(heap, (-next_value / max(1, next_cost), i, step + 1))
+        elif step == 0:
+            # Il primo passo non entra: si prova con l'opzione più economica, se era stata saltata
+            cheapest = all_options[i][0]
+            if cheapest[0] != name and cheapest[1] <= remaining:
+                plans[i] = [cheapest]
+                heapq.heappush(heap, (-cheapest[2] / max(1, cheapest[1]), i, 0))
+    return choice
+
+
+def pack_summary(choice: List[str]) -> Dict[str, int]:
+    counts = {REPR_FULL: 0, REPR_LIGHT: 0, REPR_TREE: 0}
+    for name in choice:
+        counts[name] += 1
+    return counts
@@ -0,0 +1,154 @@
+# src/deepbase/cache.py
+"""
+Cache persistente delle rappresentazioni light, indirizzata per contenuto.
+Ogni voce è identificata da hash del contenuto + parser + versione del parser + modalità:
+un file rinominato o copiato riusa la stessa voce, un parser aggiornato la invalida.
+Per evitare di rileggere i file invariati, l'indice ricorda anche l'hash associato
+a (path, size, mtime): se la stat coincide il file non viene nemmeno aperto.
+La dimensione su disco è limitata e le voci meno usate di recente vengono eliminate.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from deepbase.output import write_atomic
+
+CACHE_DIR_NAME = ".deepbase_cache"
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Da incrementare se cambia il formato delle voci su disco
+CACHE_FORMAT_VERSION = 2
+
+_INDEX_FILE = "index.json"
+_HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache su disco, in genere <progetto>/.deepbase_cache/.
+    L'indice viene caricato una volta e riscritto da save() a fine run.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # path -> [size, mtime_ns, hash del contenuto]
+        self._files: Dict[str, list] = {}
+        # chiave -> [dimensione della voce, ultimo accesso]
+        self._entries: Dict[str, list] = {}
+        self._dirty = False
+        self._load_index()
+
+    @classmethod
+    def for_project(cls, root_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> "ParseCache":
+        return cls(os.path.join(root_dir, CACHE_DIR_NAME), max_bytes)
+
+    # --- Indice ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, _INDEX_FILE)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "objects", key[:2], key + ".json")
+
+    def _load_index(self) -> None:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Formato diverso: la cache viene ricostruita da zero
+        if not isinstance(data, dict) or data.get("version") != CACHE_FORMAT_VERSION:
+            return
+        self._files = data.get("files", {})
+        self._entries = data.get("entries", {})
+
+    def save(self) -> None:
+        """Applica l'eviction LRU e scrive l'indice (solo se qualcosa è cambiato)."""
+        if not self._dirty:
+            return
+        self._evict()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = {"version": CACHE_FORMAT_VERSION, "files": self._files, "entries": self._entries}
+        write_atomic(self._index_path(), json.dumps(data, separators=(",", ":")))
+        self._dirty = False
+
+    def _evict(self) -> None:
+        total = sum(size for size, _ in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+            del self._entries[key]
+            total -= size
+        live = {key[:64] for key in self._entries}
+        self._files = {p: v for p, v in self._files.items() if v[2] in live}
+
+    # --- Lookup ---
+
+    def content_hash(self, file_path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """Hash del contenuto: dalla sola stat se il file non è cambiato, altrimenti rileggendolo."""
+        known = self._files.get(file_path)
+        if known is not None and known[0] == size and known[1] == mtime_ns:
+            return known[2]
+        try:
+            digest = hash_file(file_path)
+        except OSError:
+            return None
+        self._files[file_path] = [size, mtime_ns, digest]
+        self._dirty = True
+        return digest
+
+    @staticmethod
+    def make_key(content_hash: str, parser_id: str, mode: str, max_bytes: Optional[int] = None) -> str:
+        # I primi 64 caratteri sono l'hash del contenuto (usato dall'eviction per ripulire l'indice dei path)
+        variant = hashlib.sha256(f"{parser_id}|{mode}|{max_bytes}".encode("utf-8")).hexdigest()[:16]
+        return f"{content_hash}-{variant}"
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[str], Optional[int]]]:
+        """Ritorna (rappresentazione, encoding, token del contenuto completo) oppure None."""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            del self._entries[key]
+            self._dirty = True
+            self.misses += 1
+            return None
+        self._entries[key][1] = time.time()
+        self._dirty = True
+        self.hits += 1
+        return data["repr"], data.get("encoding"), data.get("tokens")
+
+    def put(self, key: str, representation: str, encoding: Optional[str], tokens: Optional[int] = None) -> None:
+        path = self._entry_path(key)
+        payload = json.dumps({"repr": representation, "encoding": encoding, "tokens": tokens})
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, payload)
+        except OSError:
+            # Cache non scrivibile (es. filesystem in sola lettura): si prosegue senza
+            return
+        self._entries[key] = [len(payload.encode("utf-8")), time.time()]
+        self._dirty = True
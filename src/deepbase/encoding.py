@@ -0,0 +1,163 @@
+# src/deepbase/encoding.py
+"""
+Rilevamento dell'encoding a livelli:
+1. BOM (UTF-8 / UTF-16 / UTF-32)
+2. decodifica UTF-8 stretta
+3. solo se fallisce, chardet (UniversalDetector) su un campione limitato
+L'encoding rilevato viene memorizzato per file, così ogni file viene analizzato una sola volta per run.
+"""
+
+import codecs
+import mmap
+from typing import Dict, Optional, Tuple, Union
+
+from chardet import UniversalDetector
+
+# Byte massimi passati a chardet: è puro Python, mai sull'intero file
+CHARDET_SAMPLE_BYTES = 64 * 1024
+_CHARDET_CHUNK = 4096
+
+# UTF-32 prima di UTF-16: il BOM UTF-32 LE inizia con quello UTF-16 LE
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+# Tutte le funzioni accettano qualsiasi buffer (bytes, mmap, memoryview):
+# la decodifica avviene direttamente dal buffer, senza una copia intermedia in bytes.
+Buffer = Union[bytes, mmap.mmap, memoryview]
+
+
+def _bom_encoding(raw_data: Buffer) -> Optional[str]:
+    head = bytes(raw_data[:4])
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _is_utf8(raw_data: Buffer, partial: bool) -> bool:
+    """Con partial=True una sequenza multibyte tagliata in fondo non è un errore."""
+    try:
+        if partial:
+            codecs.getincrementaldecoder("utf-8")().decode(raw_data, final=False)
+        else:
+            str(raw_data, "utf-8")
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _detect_with_chardet(raw_data: Buffer) -> str:
+    detector = UniversalDetector()
+    sample = memoryview(raw_data)[:CHARDET_SAMPLE_BYTES]
+    for start in range(0, len(sample), _CHARDET_CHUNK):
+        detector.feed(bytes(sample[start:start + _CHARDET_CHUNK]))
+        if detector.done:
+            break
+    detector.close()
+    return detector.result.get("encoding") or "utf-8"
+
+
+def detect_encoding(raw_data: Buffer, partial: bool = False) -> str:
+    """
+    Rileva l'encoding di un buffer. Con partial=True il buffer è una finestra
+    di un file più grande e può terminare a metà di un carattere.
+    """
+    encoding = _bom_encoding(raw_data)
+    if encoding:
+        return encoding
+    if _is_utf8(raw_data, partial):
+        return "utf-8"
+    return _detect_with_chardet(raw_data)
+
+
+# Ampiezza dell'unità di codifica: la coda di un file deve iniziare su un suo multiplo
+_CODE_UNIT = {"utf-16": 2, "utf-32": 4}
+
+
+def trim_window_start(window: bytes, encoding: str) -> bytes:
+    """Toglie dall'inizio di una finestra (la coda di un file) i byte di un carattere tagliato."""
+    width = _CODE_UNIT.get(encoding)
+    if width:
+        return window[len(window) % width:]
+    if encoding in ("utf-8", "utf-8-sig"):
+        skip = 0
+        # Al più 3 byte di continuazione (10xxxxxx) prima dell'inizio di un carattere
+        while skip < min(3, len(window)) and 0x80 <= window[skip] < 0xC0:
+            skip += 1
+        return window[skip:]
+    return window
+
+
+# Per una finestra senza BOM (la coda) l'ordine dei byte va preso dal BOM della testa:
+# i codec "utf-16"/"utf-32" senza BOM usano l'ordine nativo
+_BOM_BYTE_ORDER = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+def tail_encoding(head: bytes, encoding: str) -> str:
+    """Encoding con cui decodificare la coda di un file la cui testa è head."""
+    if encoding in _CODE_UNIT:
+        for bom, name in _BOM_BYTE_ORDER:
+            if name.startswith(encoding) and head.startswith(bom):
+                return name
+    return encoding
+
+
+def detect_window_encoding(head: Buffer, tail: bytes) -> str:
+    """
+    Encoding comune alle due finestre (testa e coda) di un file troncato: la testa può
+    finire e la coda iniziare a metà di un carattere. L'UTF-8 vale solo se lo sono
+    entrambe; altrimenti chardet analizza la coda, l'unica che non lo è.
+    """
+    encoding = detect_encoding(head, partial=True)
+    if encoding != "utf-8":
+        return encoding
+    tail = trim_window_start(tail, encoding)
+    if _is_utf8(tail, partial=False):
+        return encoding
+    return _detect_with_chardet(tail)
+
+
+def decode_bytes(raw_data: Buffer, encoding: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Decodifica un file intero. Se l'encoding è già noto lo usa direttamente,
+    altrimenti applica il rilevamento a livelli senza decodificare due volte.
+    Ritorna: (testo, encoding)
+    """
+    if encoding is None:
+        encoding = _bom_encoding(raw_data)
+    if encoding is None:
+        try:
+            return str(raw_data, "utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            encoding = _detect_with_chardet(raw_data)
+    return str(raw_data, encoding, "replace"), encoding
+
+
+class EncodingCache:
+    """Encoding rilevati per (path, size, mtime): un file modificato viene rianalizzato."""
+
+    def __init__(self):
+        self._encodings: Dict[Tuple[str, int, int], str] = {}
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[str]:
+        return self._encodings.get(key)
+
+    def put(self, key: Tuple[str, int, int], encoding: str) -> None:
+        self._encodings[key] = encoding
+
+    def clear(self) -> None:
+        self._encodings.clear()
+
+
+encoding_cache = EncodingCache()
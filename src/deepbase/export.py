@@ -0,0 +1,79 @@
+# src/deepbase/export.py
+"""
+Formati leggibili da macchina.
+- --format jsonl: un record JSON per riga, uno per ogni file del progetto
+  (path, tipo, modalità, dimensione, token stimati, contenuto o rappresentazione).
+- --index: file accanto all'output (<output>.index.json) con offset e lunghezza in byte
+  della sezione di ogni file, per leggerla con una seek senza scorrere il documento.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from deepbase.output import write_atomic
+
+FORMAT_MARKDOWN = "md"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_MARKDOWN, FORMAT_JSONL)
+
+MODE_FULL = "full"
+MODE_LIGHT = "light"
+MODE_TREE = "tree"
+MODE_DUPLICATE = "duplicate"
+MODE_SIMILAR = "similar"
+
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 1
+
+
+def index_path_for(output_path: str) -> str:
+    return output_path + INDEX_SUFFIX
+
+
+def jsonl_record(
+    rel_path: str,
+    kind: str,
+    mode: str,
+    size: int,
+    tokens: int,
+    content: Optional[str],
+    truncated: bool = False,
+    focused: bool = False,
+    encoding: Optional[str] = None,
+    duplicate_of: Optional[str] = None,
+    similar_to: Optional[str] = None
+) -> str:
+    """
+    Riga JSONL (con newline finale) di un file; content è None per i file solo nell'albero
+    e per i duplicati, che riportano in duplicate_of il path del primo file identico.
+    I file raggruppati con --collapse-similar hanno in content il diff rispetto a similar_to.
+    """
+    record = {
+        "path": rel_path, "kind": kind, "mode": mode, "size": size, "tokens": tokens,
+        "truncated": truncated, "focused": focused, "encoding": encoding,
+        "duplicate_of": duplicate_of, "similar_to": similar_to, "content": content
+    }
+    # ensure_ascii=False: il testo resta leggibile e le dimensioni in byte non si gonfiano
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class SectionIndex:
+    """Offset in byte delle sezioni di un output, nell'ordine in cui sono state scritte."""
+
+    def __init__(self, output_format: str):
+        self.output_format = output_format
+        self.files: List[Dict[str, Any]] = []
+
+    def add(self, rel_path: str, mode: str, offset: int, length: int) -> None:
+        self.files.append({"path": rel_path, "mode": mode, "offset": offset, "length": length})
+
+    def save(self, path: str, output_path: str) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "output": os.path.basename(output_path),
+            "format": self.output_format,
+            "files": self.files,
+        }
+        # Scrittura atomica: un consumatore non legge mai un indice a metà
+        write_atomic(path, json.dumps(data, ensure_ascii=False))
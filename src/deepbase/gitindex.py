@@ -0,0 +1,156 @@
+# src/deepbase/gitindex.py
+"""
+Selezione dei file basata sull'indice di git.
+Legge direttamente .git/index (versioni 2, 3 e 4, senza invocare il binario git)
+e restituisce l'insieme dei file tracciati: la scansione può così scartare intere
+sotto-directory non tracciate o ignorate prima di elencarle o di fare stat.
+"""
+
+import os
+import struct
+from typing import List, Optional, Set, Tuple
+
+_ENTRY_FIXED_SIZE = 62          # ctime, mtime, dev, ino, mode, uid, gid, size, sha1, flags
+_FLAG_EXTENDED = 0x4000
+
+
+def find_git_dir(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Risale da path fino alla root del repository.
+    Ritorna: (work_tree, git_dir) oppure None se path non è dentro un repository.
+    Supporta anche i file .git dei worktree e dei submodule ("gitdir: ...").
+    """
+    current = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(current, ".git")
+        if os.path.isdir(dot_git):
+            return current, dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, "r", encoding="utf-8") as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if line.startswith("gitdir:"):
+                git_dir = line[len("gitdir:"):].strip()
+                return current, os.path.normpath(os.path.join(current, git_dir))
+            return None
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    # Codifica "offset" di git usata dall'indice v4 per la compressione dei path
+    c = data[pos]
+    pos += 1
+    value = c & 0x7f
+    while c & 0x80:
+        value += 1
+        c = data[pos]
+        pos += 1
+        value = (value << 7) + (c & 0x7f)
+    return value, pos
+
+
+def read_index_paths(index_path: str) -> List[str]:
+    """
+    Estrae i percorsi (relativi al work tree, separati da '/') dal file di indice.
+    Solleva ValueError se il file non è un indice git supportato.
+    """
+    with open(index_path, "rb") as f:
+        data = f.read()
+
+    if len(data) < 12 or data[:4] != b"DIRC":
+        raise ValueError(f"'{index_path}' is not a git index")
+    version, count = struct.unpack(">II", data[4:12])
+    if version not in (2, 3, 4):
+        raise ValueError(f"Unsupported git index version: {version}")
+
+    paths = []
+    previous = b""
+    pos = 12
+    try:
+        for _ in range(count):
+            start = pos
+            (flags,) = struct.unpack(">H", data[pos + 60:pos + 62])
+            pos += _ENTRY_FIXED_SIZE
+            if version >= 3 and flags & _FLAG_EXTENDED:
+                pos += 2
+
+            if version == 4:
+                strip, pos = _read_varint(data, pos)
+                end = data.index(b"\0", pos)
+                name = previous[:len(previous) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                end = data.index(b"\0", pos)
+                name = data[pos:end]
+                # Le entry v2/v3 sono allineate a 8 byte con 1-8 NUL di padding
+                pos = start + ((end - start + 8) & ~7)
+
+            previous = name
+            paths.append(name.decode("utf-8", errors="surrogateescape"))
+    except (struct.error, ValueError, IndexError):
+        raise ValueError(f"Corrupted git index: '{index_path}'")
+
+    return paths
+
+
+class GitFilter:
+    """
+    Filtro sui file tracciati, con percorsi relativi alla root della scansione.
+    Una directory viene visitata solo se contiene almeno un file tracciato.
+    """
+
+    def __init__(self, tracked_paths: List[str]):
+        self._files: Set[str] = set()
+        self._dirs: Set[str] = set()
+        self._sparse_dirs: Set[str] = set()
+        for path in tracked_paths:
+            # L'indice "sparse" contiene directory intere (con '/' finale)
+            if path.endswith('/'):
+                path = path.rstrip('/')
+                self._sparse_dirs.add(path)
+                self._dirs.add(path)
+            else:
+                self._files.add(path)
+            parent = path.rpartition('/')[0]
+            while parent and parent not in self._dirs:
+                self._dirs.add(parent)
+                parent = parent.rpartition('/')[0]
+
+    @classmethod
+    def from_target(cls, target: str) -> Optional["GitFilter"]:
+        """
+        Costruisce il filtro per la directory target leggendo l'indice del suo repository.
+        Ritorna None se target non è dentro un repository git.
+        """
+        found = find_git_dir(target)
+        if found is None:
+            return None
+        work_tree, git_dir = found
+        index_path = os.path.join(git_dir, "index")
+        # Repository appena inizializzato: nessun file ancora tracciato
+        paths = read_index_paths(index_path) if os.path.exists(index_path) else []
+
+        prefix = os.path.relpath(os.path.abspath(target), work_tree).replace(os.sep, '/')
+        if prefix == ".":
+            return cls(paths)
+        prefix += '/'
+        return cls([p[len(prefix):] for p in paths if p.startswith(prefix)])
+
+    def _in_sparse_dir(self, rel_path: str) -> bool:
+        parent = rel_path.rpartition('/')[0]
+        while parent:
+            if parent in self._sparse_dirs:
+                return True
+            parent = parent.rpartition('/')[0]
+        return False
+
+    def allows_dir(self, rel_path: str) -> bool:
+        return rel_path in self._dirs or (bool(self._sparse_dirs) and self._in_sparse_dir(rel_path))
+
+    def allows_file(self, rel_path: str) -> bool:
+        return rel_path in self._files or (bool(self._sparse_dirs) and self._in_sparse_dir(rel_path))
@@ -0,0 +1,232 @@
+# src/deepbase/incremental.py
+"""
+Ricostruzione incrementale dell'output (--incremental).
+Accanto all'output viene salvato un manifest con, per ogni directory, un hash Merkle
+calcolato da nomi, dimensioni e mtime dei figli, e la posizione di ogni sezione di
+FILE CONTENTS nel file generato. Al run successivo:
+- le directory con mtime invariato non vengono elencate: si fa solo la stat dei file noti
+- se l'hash della root non è cambiato il run termina subito, senza riscrivere nulla
+- le sezioni dei file invariati vengono copiate dal vecchio output invece di essere rigenerate
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+
+from deepbase.output import write_atomic
+from deepbase.scanner import DirNode, FileRecord, ScanResult, preorder_dirs
+from deepbase.sniff import KIND_DATABASE, sniff_kind
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 2
+
+# Un file modificato subito dopo (o durante) il run precedente può avere lo stesso mtime
+# registrato nel manifest: entro questa finestra il suo stato non viene considerato affidabile.
+_RACY_WINDOW_NS = 2 * 10**9
+
+
+def manifest_path_for(output_path: str) -> str:
+    return output_path + MANIFEST_SUFFIX
+
+
+def run_fingerprint(**params: Any) -> str:
+    """Hash dei parametri del run: se cambiano, il manifest precedente non è riutilizzabile."""
+    data = json.dumps({"version": MANIFEST_VERSION, **params}, sort_keys=True, default=sorted)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _file_state(record: FileRecord) -> list:
+    return [
+        record.name, record.size, record.mtime_ns, record.kind,
+        record.light_size, record.light_tokens, record.tokens
+    ]
+
+
+def _hash_dir(node: DirNode, child_hashes: Dict[str, str]) -> str:
+    digest = hashlib.sha1()
+    for entry in node.entries:
+        if isinstance(entry, DirNode):
+            digest.update(f"d\0{entry.name}\0{child_hashes[entry.rel_path]}\n".encode("utf-8"))
+        else:
+            digest.update(f"f\0{entry.name}\0{entry.size}\0{entry.mtime_ns}\0{entry.kind}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SectionReader:
+    """Sezioni FILE CONTENTS del vecchio output, riutilizzabili per i file invariati."""
+
+    def __init__(self, manifest: "Manifest", data: bytes):
+        self._manifest = manifest
+        self._data = data
+
+    def has(self, record: FileRecord) -> bool:
+        return record.rel_path in self._manifest.sections and self._manifest.file_unchanged(record)
+
+    def get(self, record: FileRecord) -> str:
+        offset, length = self._manifest.sections[record.rel_path]
+        text = self._data[offset:offset + length].decode("utf-8", errors="replace")
+        # L'output è scritto in modalità testo: si torna ai newline logici prima di riscriverlo
+        return text.replace(os.linesep, "\n") if os.linesep != "\n" else text
+
+
+class Manifest:
+    """
+    Stato di un run: per ogni directory mtime, hash Merkle e figli in ordine
+    (i file con size, mtime, tipo, dimensione light e token); per ogni file emesso
+    la posizione della sua sezione nell'output.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        started_ns: int,
+        root_hash: str = "",
+        dirs: Optional[Dict[str, Dict[str, Any]]] = None,
+        sections: Optional[Dict[str, List[int]]] = None,
+        output_stat: Optional[List[int]] = None
+    ):
+        self.fingerprint = fingerprint
+        self.started_ns = started_ns
+        self.root_hash = root_hash
+        self.dirs = dirs or {}
+        self.sections = sections or {}
+        self.output_stat = output_stat
+        self.newest_ns = 0
+        self._files: Dict[str, list] = {}
+        for rel_dir, state in self.dirs.items():
+            for entry in state["entries"]:
+                if len(entry) > 1:
+                    self._files[f"{rel_dir}/{entry[0]}" if rel_dir else entry[0]] = entry
+
+    # --- Persistenza ---
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str, output_path: str) -> Optional["Manifest"]:
+        """
+        Carica il manifest del run precedente.
+        Ritorna None se manca, se i parametri sono cambiati o se l'output è stato modificato.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            st = os.stat(output_path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("fingerprint") != fingerprint:
+            return None
+        if data.get("output") != [st.st_size, st.st_mtime_ns]:
+            return None
+        return cls(
+            fingerprint, data["started_ns"], data["root_hash"],
+            data["dirs"], data["sections"], data["output"]
+        )
+
+    def save(self, path: str, output_path: str) -> None:
+        st = os.stat(output_path)
+        self.output_stat = [st.st_size, st.st_mtime_ns]
+        data = {
+            "fingerprint": self.fingerprint,
+            "started_ns": self.started_ns,
+            "root_hash": self.root_hash,
+            "output": self.output_stat,
+            "dirs": self.dirs,
+            "sections": self.sections,
+        }
+        write_atomic(path, json.dumps(data, separators=(",", ":")))
+
+    @classmethod
+    def from_scan(cls, scan: ScanResult, fingerprint: str, started_ns: int) -> "Manifest":
+        """Calcola gli hash Merkle bottom-up a partire dall'albero della scansione."""
+        manifest = cls(fingerprint, started_ns)
+        hashes: Dict[str, str] = {}
+        for node in reversed(preorder_dirs(scan.root)):
+            hashes[node.rel_path] = _hash_dir(node, hashes)
+            entries = []
+            for entry in node.entries:
+                if isinstance(entry, DirNode):
+                    entries.append([entry.name])
+                else:
+                    entries.append(_file_state(entry))
+                    manifest._files[entry.rel_path] = entries[-1]
+                    manifest.newest_ns = max(manifest.newest_ns, entry.mtime_ns)
+            # L'mtime delle directory non entra in newest_ns: una directory modificata di recente
+            # viene sempre rielencata (known_entries) e i nomi dei figli sono già nell'hash.
+            # Così le scritture del run stesso nel progetto (cache, output, manifest) non
+            # impediscono al run successivo di riconoscere che nulla è cambiato
+            manifest.dirs[node.rel_path] = {"mtime_ns": node.mtime_ns, "entries": entries}
+        manifest.root_hash = hashes[scan.root.rel_path]
+        return manifest
+
+    # --- Confronto con il run precedente ---
+
+    def _is_stable(self, mtime_ns: int) -> bool:
+        return mtime_ns + _RACY_WINDOW_NS < self.started_ns
+
+    def is_up_to_date(self, current: "Manifest") -> bool:
+        """Nessun file o directory cambiato dall'ultimo run (e nessuna modifica troppo recente per dirlo)."""
+        return self.root_hash == current.root_hash and self._is_stable(current.newest_ns)
+
+    def file_unchanged(self, record: FileRecord) -> bool:
+        state = self._files.get(record.rel_path)
+        return (
+            state is not None and state[1] == record.size and state[2] == record.mtime_ns
+            and self._is_stable(record.mtime_ns)
+        )
+
+    def known_entries(self, node: DirNode) -> Optional[List[Union[DirNode, FileRecord]]]:
+        """
+        Ricostruisce i figli di una directory dal manifest, senza elencarla.
+        Ritorna None se la directory è cambiata (o potrebbe esserlo) e va rielencata.
+        """
+        state = self.dirs.get(node.rel_path)
+        if state is None or state["mtime_ns"] != node.mtime_ns or not self._is_stable(node.mtime_ns):
+            return None
+
+        entries: List[Union[DirNode, FileRecord]] = []
+        for entry in state["entries"]:
+            name = entry[0]
+            path = os.path.join(node.path, name)
+            rel_path = f"{node.rel_path}/{name}" if node.rel_path else name
+            if len(entry) == 1:
+                entries.append(DirNode(path, rel_path, name))
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            size, mtime_ns, kind = entry[1:4]
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                # Contenuto cambiato: il tipo va riesaminato, e se un database diventa
+                # (o smette di essere) tale la directory va rielencata e rifiltrata
+                kind = sniff_kind(path, st)
+                if (kind == KIND_DATABASE) != (entry[3] == KIND_DATABASE):
+                    return None
+            entries.append(FileRecord(
+                path, rel_path, name, st.st_size, kind, mtime=st.st_mtime, mtime_ns=st.st_mtime_ns
+            ))
+        return entries
+
+    def restore_light(self, record: FileRecord) -> bool:
+        """Riusa dimensione e token light di un file invariato la cui sezione è nel vecchio output."""
+        state = self._files.get(record.rel_path)
+        if state is None or state[4] is None or record.rel_path not in self.sections:
+            return False
+        if not self.file_unchanged(record):
+            return False
+        record.light_size, record.light_tokens, record.tokens = state[4:7]
+        return True
+
+    # --- Sezioni ---
+
+    def read_sections(self, output_path: str) -> Optional[SectionReader]:
+        """Legge il vecchio output (prima che venga sovrascritto) per riusarne le sezioni."""
+        try:
+            with open(output_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return SectionReader(self, data)
+
+    def add_section(self, rel_path: str, offset: int, length: int) -> None:
+        self.sections[rel_path] = [offset, length]
@@ -1,19 +1,43 @@
 # src/deepbase/main.py
 
 import os
+import math
+import time
 import typer
 import fnmatch
-import math
 from rich.console import Console
 from rich.progress import Progress
 import tomli
-import chardet
 from importlib.metadata import version as get_package_version, PackageNotFoundError
-from typing import List, Dict, Any, Set, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Union, Callable
 
-from deepbase.toon import generate_toon_representation, generate_light_representation, generate_database_focused
+from deepbase.toon import generate_light_representation, generate_database_focused
 from deepbase.parsers import get_document_structure
-from deepbase.database import is_sqlite_database, get_database_schema, generate_database_context_full
+from deepbase.database import get_database_schema, generate_database_context_full
+from deepbase.sniff import KIND_TEXT, KIND_DATABASE, KIND_BINARY, is_database_file
+from deepbase.matcher import PathMatcher
+from deepbase.gitindex import GitFilter, find_git_dir
+from deepbase.cache import ParseCache, DEFAULT_CACHE_MAX_BYTES, hash_file
+from deepbase.incremental import Manifest, SectionReader, manifest_path_for, run_fingerprint
+from deepbase.parsers.registry import registry
+from deepbase.watch import watch_loop
+from deepbase.budget import PackItem, REPR_FULL, REPR_LIGHT, REPR_TREE, pack, pack_summary
+from deepbase.tokens import estimator
+from deepbase.shards import Shard, ShardWriter, shard_path_for
+from deepbase.similarity import SimilarCollapser, find_similar
+from deepbase.export import (
+    FORMAT_MARKDOWN, FORMAT_JSONL, FORMATS, MODE_FULL, MODE_LIGHT, MODE_TREE, MODE_DUPLICATE, MODE_SIMILAR,
+    SectionIndex, index_path_for, jsonl_record
+)
+from deepbase.output import STDOUT, COMPRESSION_SUFFIXES, open_output, output_path_for, zstd_available
+from deepbase.scanner import (
+    DirNode, FileRecord, ScanResult, scan_project, aggregate_stats,
+    file_byte_limit, read_text_windows, light_representation,
+    read_record_content, iter_record_contents, render_light_records
+)
+# Ri-esportati: erano definiti qui prima dello spostamento in deepbase.scanner
+from deepbase.scanner import is_significant_file, read_file_content  # noqa: F401
 
 from rich.table import Table
 from rich.panel import Panel
@@ -34,12 +58,20 @@ DEFAULT_CONFIG = {
     },
     "significant_extensions": {
         ".py", ".java", ".js", ".jsx", ".ts", ".tsx", ".html", ".css", ".scss", ".sql",
+        ".kt", ".kts", ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs",
         ".md", ".json", ".xml", ".yml", ".yaml", ".sh", ".bat", "Dockerfile",
         ".dockerignore", ".gitignore", "requirements.txt", "pom.xml", "gradlew",
         "pyproject.toml", "setup.py", "package.json", "tsconfig.json",
         ".tex", ".bib", ".sty", ".cls",
         ".db", ".sqlite", ".sqlite3", ".db3"
-    }
+    },
+    # Limiti per singolo file (None = nessun limite): oltre soglia si leggono solo testa e coda
+    "max_file_bytes": None,
+    "max_file_tokens": None,
+    # Dimensione massima su disco della cache persistente (.deepbase_cache/)
+    "cache_max_bytes": DEFAULT_CACHE_MAX_BYTES,
+    # Vocabolario BPE locale (tokenizer.json o .tiktoken) per conteggi token esatti
+    "tokenizer_vocab": None
 }
 
 LIGHT_MODE_NOTICE = """> **[LIGHT MODE]** Questo file è stato generato in modalità risparmio token: vengono incluse solo le firme dei metodi/funzioni e i commenti iniziali dei file. Il corpo del codice è omesso. Se hai bisogno di approfondire un file, una classe o un metodo specifico, chiedi all'utente di fornire la porzione di codice completa.
@@ -85,6 +117,22 @@ def load_config(root_dir: str) -> Tuple[Dict[str, Any], bool, List[str], List[st
             config["ignore_dirs"].update(user_dirs)
             config["ignore_files"].update(user_files)
             config["significant_extensions"].update(user_config.get("significant_extensions", []))
+
+            for key in ("max_file_bytes", "max_file_tokens", "cache_max_bytes"):
+                if key in user_config:
+                    value = user_config[key]
+                    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                        config[key] = value
+                    else:
+                        console.print(f"[bold yellow]Warning:[/bold yellow] '{key}' must be a positive integer, ignored.")
+
+            if "tokenizer_vocab" in user_config:
+                value = user_config["tokenizer_vocab"]
+                if isinstance(value, str) and value:
+                    # Percorso relativo alla directory del file di configurazione
+                    config["tokenizer_vocab"] = os.path.join(root_dir, os.path.expanduser(value))
+                else:
+                    console.print("[bold yellow]Warning:[/bold yellow] 'tokenizer_vocab' must be a file path, ignored.")
             
         except tomli.TOMLDecodeError as e:
             console.print(f"[bold yellow]Warning:[/bold yellow] Error parsing '.deepbase.toml': {e}")
@@ -92,9 +140,22 @@ def load_config(root_dir: str) -> Tuple[Dict[str, Any], bool, List[str], List[st
     return config, toml_found, user_ignore_dirs, user_ignore_files
 
 
-def estimate_tokens(size_bytes: int) -> str:
-    if size_bytes == 0: return "0t"
-    tokens = math.ceil(size_bytes / 4)
+def configure_token_estimator(config: Dict[str, Any]) -> None:
+    """Carica il vocabolario di 'tokenizer_vocab', se configurato; altrimenti resta la stima calibrata."""
+    vocab_path = config.get("tokenizer_vocab")
+    if not vocab_path or estimator.vocab_path == vocab_path:
+        return
+    try:
+        estimator.load_vocabulary(vocab_path)
+    except ImportError as e:
+        console.print(f"[bold yellow]Warning:[/bold yellow] 'tokenizer_vocab' needs the '{e.name}' package, using the built-in estimate.")
+    except Exception as e:
+        # tokenizers segnala i file non validi con eccezioni generiche
+        console.print(f"[bold yellow]Warning:[/bold yellow] Cannot load tokenizer vocabulary '{vocab_path}': {e}. Using the built-in estimate.")
+
+
+def format_tokens(tokens: int) -> str:
+    if tokens == 0: return "0t"
     if tokens < 1000:
         return f"~{tokens}t"
     elif tokens < 1000000:
@@ -103,287 +164,129 @@ def estimate_tokens(size_bytes: int) -> str:
         return f"~{tokens/1000000:.1f}M t"
 
 
-def estimate_tokens_for_content(text: str) -> int:
-    return math.ceil(len(text.encode("utf-8")) / 4)
-
-def calculate_light_tokens(file_path: str, content: str) -> int:
-    from deepbase.toon import generate_light_representation
-    light_repr = generate_light_representation(file_path, content)
-    return estimate_tokens_for_content(light_repr)
-
-
-def _should_ignore_dir(dir_path: str, root_dir: str, ignore_dirs: Set[str]) -> bool:
-    """
-    Controlla se una directory deve essere ignorata.
-    Supporta:
-    - Nomi semplici (es: "node_modules")
-    - Percorsi relativi dalla root (es: "app/templates")
-    - Wildcard patterns (es: "*.egg-info")
-    """
-    dir_name = os.path.basename(dir_path)
-    rel_path = os.path.relpath(dir_path, root_dir).replace(os.sep, '/')
-    
-    for pattern in ignore_dirs:
-        pattern = pattern.replace(os.sep, '/')
-        
-        # Match esatto nome directory
-        if pattern == dir_name:
-            return True
-        
-        # Match percorso relativo completo
-        if pattern == rel_path:
-            return True
-        
-        # Match wildcard sul nome
-        if fnmatch.fnmatch(dir_name, pattern):
-            return True
-        
-        # Match wildcard sul percorso relativo
-        if fnmatch.fnmatch(rel_path, pattern):
-            return True
-        
-        # Match se il pattern è un prefisso del percorso (per ignorare sotto-directory)
-        # Es: pattern "app/templates" matcha "app/templates" e "app/templates/subdir"
-        if rel_path.startswith(pattern + '/') or rel_path == pattern:
-            return True
-    
-    return False
-
-
-def _should_ignore_file(file_path: str, root_dir: str, ignore_files: Set[str]) -> bool:
-    """
-    Controlla se un file deve essere ignorato.
-    Supporta:
-    - Nomi esatti (es: "secrets.env")
-    - Patterns con wildcard (es: "*.log")
-    - Percorsi relativi dalla root (es: "app/config/local.env")
-    """
-    file_name = os.path.basename(file_path)
-    rel_path = os.path.relpath(file_path, root_dir).replace(os.sep, '/')
-    
-    for pattern in ignore_files:
-        pattern = pattern.replace(os.sep, '/')
-        
-        # Match esatto nome file
-        if pattern == file_name:
-            return True
-        
-        # Match percorso relativo completo
-        if pattern == rel_path:
-            return True
-        
-        # Match wildcard sul nome
-        if fnmatch.fnmatch(file_name, pattern):
-            return True
-        
-        # Match wildcard sul percorso relativo
-        if fnmatch.fnmatch(rel_path, pattern):
-            return True
-    
-    return False
-
+def estimate_tokens(size_bytes: int, file_path: str = "") -> str:
+    """Stima formattata dalla sola dimensione (calibrata per estensione, vedi deepbase.tokens)."""
+    return format_tokens(estimator.estimate_size(size_bytes, file_path))
 
-def is_significant_file(file_path: str, config: Dict[str, Any], root_dir: str = "", output_file_abs: str = None) -> bool:
-    file_name = os.path.basename(file_path)
 
-    if output_file_abs and os.path.abspath(file_path) == output_file_abs:
-        return False
+# Il documento generato è markdown: tabella di calibrazione per testo/markup
+_DOCUMENT_NAME = "context.md"
 
-    if output_file_abs and file_name == os.path.basename(output_file_abs):
-        return False
 
-    # Check ignore_files con supporto per percorsi
-    if root_dir and _should_ignore_file(file_path, root_dir, config["ignore_files"]):
-        return False
-    elif file_name in config["ignore_files"]:
-        return False
+def estimate_tokens_for_content(text: str, file_path: str = _DOCUMENT_NAME) -> int:
+    return estimator.count(text, file_path)
 
-    significant_extensions = config["significant_extensions"]
 
-    if file_name in significant_extensions:
-        return True
+def count_document_tokens(parts: Iterable[str]) -> int:
+    """Token di un testo prodotto a pezzi (es. le righe dell'albero), contati a blocchi di ~1 MB."""
+    total, chunk, chunk_len = 0, [], 0
+    for part in parts:
+        chunk.append(part)
+        chunk_len += len(part)
+        if chunk_len >= 1 << 20:
+            total += estimate_tokens_for_content("".join(chunk))
+            chunk, chunk_len = [], 0
+    return total + estimate_tokens_for_content("".join(chunk))
 
-    _, ext = os.path.splitext(file_path)
-    if ext in significant_extensions:
-        return True
 
-    if is_sqlite_database(file_path):
-        return True
-
-    return False
+def calculate_light_tokens(file_path: str, content: str) -> int:
+    from deepbase.toon import generate_light_representation
+    light_repr = generate_light_representation(file_path, content)
+    return estimate_tokens_for_content(light_repr, file_path)
 
 
 def calculate_project_stats(root_dir: str, config: Dict[str, Any], output_file_abs: str, light_mode: bool = False) -> int:
-    total_size = 0
-    ignore_dirs = config["ignore_dirs"]
-    
-    for dirpath, dirnames, filenames in os.walk(root_dir, topdown=True):
-        # Filtra directory usando la nuova funzione
-        dirnames[:] = [
-            d for d in dirnames 
-            if not _should_ignore_dir(os.path.join(dirpath, d), root_dir, ignore_dirs)
-            and not d.startswith('.')
-        ]
-        
-        for f in filenames:
-            fpath = os.path.join(dirpath, f)
-            if is_significant_file(fpath, config, root_dir, output_file_abs):
-                try:
-                    if light_mode and not is_sqlite_database(fpath):
-                        content = read_file_content(fpath)
-                        light_repr = generate_light_representation(fpath, content)
-                        total_size += len(light_repr.encode("utf-8"))
-                    else:
-                        total_size += os.path.getsize(fpath)
-                except OSError:
-                    pass
-    return total_size
+    return scan_project(root_dir, config, output_file_abs, light_mode).total_size
 
 
 # --- ALBERO DELLE DIRECTORY ---
 
-def _generate_tree_recursive(
-    current_path: str,
-    prefix: str,
-    config: Dict[str, Any],
-    root_dir: str,
-    total_project_size: int,
-    output_file_abs: str,
-    light_mode: bool = False
-) -> Tuple[str, int]:
-    output_str = ""
-    subtree_size = 0
-
-    try:
-        items = sorted(os.listdir(current_path))
-    except PermissionError:
-        return "", 0
-
-    filtered_items = []
-    for item in items:
-        full_path = os.path.join(current_path, item)
-        is_dir = os.path.isdir(full_path)
-
-        if is_dir:
-            if not _should_ignore_dir(full_path, root_dir, config["ignore_dirs"]) and not item.startswith('.'):
-                filtered_items.append((item, True))
-        else:
-            if is_significant_file(full_path, config, root_dir, output_file_abs):
-                filtered_items.append((item, False))
-
-    for i, (name, is_dir) in enumerate(filtered_items):
-        is_last = (i == len(filtered_items) - 1)
-        full_path = os.path.join(current_path, name)
-        connector = "└── " if is_last else "├── "
-
-        if is_dir:
-            extension = "    " if is_last else "│   "
-            sub_tree_str, sub_dir_size = _generate_tree_recursive(
-                full_path,
-                prefix + extension,
-                config,
-                root_dir,
-                total_project_size,
-                output_file_abs
-            )
-
-            subtree_size += sub_dir_size
+def _format_stats(tokens: int, total_tokens: int) -> str:
+    # Le percentuali sono sui token stimati, non sui byte: 1 KB di JSON pesa più di 1 KB di Python
+    if total_tokens > 0 and tokens > 0:
+        percent = (tokens / total_tokens) * 100
+        return f" ({percent:.1f}% | {format_tokens(tokens)})"
+    return ""
 
-            folder_stats = ""
-            if total_project_size > 0 and sub_dir_size > 0:
-                percent = (sub_dir_size / total_project_size) * 100
-                token_est = estimate_tokens(sub_dir_size)
-                folder_stats = f" ({percent:.1f}% | {token_est})"
 
-            output_str += f"{prefix}{connector}📁 {name}/{folder_stats}\n"
-            output_str += sub_tree_str
-
-        else:
-            icon = "🗄️ " if is_sqlite_database(full_path) else "📄 "
-            try:
-                raw_size = os.path.getsize(full_path)
-                if light_mode and not is_sqlite_database(full_path):
-                    content = read_file_content(full_path)
-                    light_repr = generate_light_representation(full_path, content)
-                    size = len(light_repr.encode("utf-8"))
-                else:
-                    size = raw_size
-                subtree_size += size
-
-                file_stats = ""
-                if total_project_size > 0 and size > 0:
-                    percent = (size / total_project_size) * 100
-                    token_est = estimate_tokens(size)
-                    file_stats = f" ({percent:.1f}% | {token_est})"
-
-                output_str += f"{prefix}{connector}{icon}{name}{file_stats}\n"
+def _format_totals(scan: ScanResult, light_mode: bool) -> str:
+    """Riga con dimensione e token totali sotto l'intestazione dell'albero."""
+    total_bytes, total_tokens = scan.raw_size, scan.total_tokens
+    if light_mode:
+        return f"> Total Size (raw): {total_bytes/1024:.2f} KB | Est. Tokens (light): ~{total_tokens:,}\n"
+    return f"> Total Size: {total_bytes/1024:.2f} KB | Est. Tokens: ~{total_tokens:,}\n"
 
-            except OSError:
-                pass
 
-    return output_str, subtree_size
+def _format_entry(entry: Union[DirNode, FileRecord], prefix: str, connector: str, total_tokens: int) -> str:
+    if isinstance(entry, DirNode):
+        return f"{prefix}{connector}📁 {entry.name}/{_format_stats(entry.tokens, total_tokens)}\n"
+    if entry.kind == KIND_BINARY:
+        return f"{prefix}{connector}📦 {entry.name} (binary | {entry.size/1024:.1f} KB)\n"
+    icon = "🗄️ " if entry.kind == KIND_DATABASE else "📄 "
+    truncated = " [truncated]" if entry.truncated else ""
+    if entry.duplicate_of is not None:
+        truncated += f" [duplicate of {entry.duplicate_of}]"
+    elif entry.similar_to is not None:
+        truncated += f" [similar to {entry.similar_to}]"
+    return f"{prefix}{connector}{icon}{entry.name}{_format_stats(entry.stats_tokens, total_tokens)}{truncated}\n"
 
 
-def generate_directory_tree(root_dir: str, config: Dict[str, Any], output_file_abs: str, light_mode: bool = False) -> Tuple[str, int, int]:
-    abs_root = os.path.abspath(root_dir)
-    total_size = calculate_project_stats(root_dir, config, output_file_abs, light_mode)
-    tree_body, _ = _generate_tree_recursive(root_dir, "", config, root_dir, total_size, output_file_abs, light_mode)
-    header = f"📁 {os.path.basename(abs_root) or '.'}/\n"
-    total_tokens_est = math.ceil(total_size / 4)
-    return header + tree_body, total_size, total_tokens_est
+def iter_tree_lines(root: DirNode, total_tokens: int, dirs_only: bool = False) -> Iterator[str]:
+    """
+    Righe dell'albero in preordine, prodotte una alla volta con uno stack esplicito:
+    nessuna ricorsione (catene di directory profonde) e nessun sottoalbero materializzato.
+    Le statistiche delle directory sono già state calcolate bottom-up da scan_project.
+    Con dirs_only l'albero è compatto: solo le directory (usato nelle intestazioni degli shard).
+    """
+    children = (lambda node: [e for e in node.entries if isinstance(e, DirNode)]) if dirs_only else (lambda node: node.entries)
+    yield f"📁 {root.name}/\n"
+    # [figli, indice del prossimo figlio, prefisso delle righe di questo livello]
+    stack = [[children(root), 0, ""]]
+    while stack:
+        frame = stack[-1]
+        entries, i, prefix = frame
+        if i == len(entries):
+            stack.pop()
+            continue
+        frame[1] = i + 1
+        entry = entries[i]
+        is_last = (i == len(entries) - 1)
+        yield _format_entry(entry, prefix, "└── " if is_last else "├── ", total_tokens)
+        if isinstance(entry, DirNode):
+            stack.append([children(entry), 0, prefix + ("    " if is_last else "│   ")])
+
+
+def generate_directory_tree(
+    root_dir: str,
+    config: Dict[str, Any],
+    output_file_abs: str,
+    light_mode: bool = False,
+    scan: Optional[ScanResult] = None
+) -> Tuple[str, int, int]:
+    """
+    Genera l'albero delle directory.
+    Se viene passato uno ScanResult già calcolato, il progetto non viene rivisitato.
+    Ritorna: (albero, dimensione raw in byte, token stimati)
+    """
+    if scan is None:
+        scan = scan_project(root_dir, config, output_file_abs, light_mode)
+    return "".join(iter_tree_lines(scan.root, scan.total_tokens)), scan.raw_size, scan.total_tokens
 
 
 # --- CORE ---
 
 def get_all_significant_files(root_dir: str, config: Dict[str, Any], output_file_abs: str) -> List[str]:
-    significant_files = []
-    ignore_dirs = config["ignore_dirs"]
-    
-    for dirpath, dirnames, filenames in os.walk(root_dir, topdown=True):
-        # Filtra directory usando la nuova funzione
-        dirnames[:] = [
-            d for d in dirnames 
-            if not _should_ignore_dir(os.path.join(dirpath, d), root_dir, ignore_dirs)
-            and not d.startswith('.')
-        ]
-        
-        for filename in sorted(filenames):
-            file_path = os.path.join(dirpath, filename)
-            if is_significant_file(file_path, config, root_dir, output_file_abs):
-                significant_files.append(file_path)
-    return significant_files
-
-
-def read_file_content(file_path: str) -> str:
-    if is_sqlite_database(file_path):
-        try:
-            schema = get_database_schema(file_path)
-            return generate_database_context_full(schema, os.path.basename(file_path))
-        except Exception as e:
-            return f"!!! Error reading database: {e} !!!"
-    try:
-        with open(file_path, "rb") as fb:
-            raw_data = fb.read()
-        detection = chardet.detect(raw_data)
-        encoding = detection['encoding'] if detection['encoding'] else 'utf-8'
-        return raw_data.decode(encoding, errors="replace")
-    except Exception as e:
-        return f"!!! Error reading file: {e} !!!"
+    return [record.path for record in scan_project(root_dir, config, output_file_abs).files]
 
 
 def matches_focus(file_path: str, root_dir: str, focus_patterns: List[str]) -> bool:
     if not focus_patterns: return False
-    rel_path = os.path.relpath(file_path, root_dir)
-    rel_path_fwd = rel_path.replace(os.sep, '/')
-    for pattern in focus_patterns:
-        clean_pattern = pattern.replace(os.sep, '/')
-        if fnmatch.fnmatch(rel_path_fwd, clean_pattern): return True
-        if clean_pattern in rel_path_fwd: return True
-    return False
+    rel_path = os.path.relpath(file_path, root_dir).replace(os.sep, '/')
+    return PathMatcher(focus_patterns=focus_patterns).matches_focus(rel_path)
 
 
 def extract_focused_tables(file_path: str, focus_patterns: List[str]) -> List[str]:
-    if not is_sqlite_database(file_path): return []
+    if not is_database_file(file_path): return []
     db_name = os.path.basename(file_path)
     focused_tables = []
     for pattern in focus_patterns:
@@ -393,6 +296,243 @@ def extract_focused_tables(file_path: str, focus_patterns: List[str]) -> List[st
     return focused_tables
 
 
+# --- CONTENUTI ---
+
+@dataclass
+class ContentEntry:
+    record: FileRecord
+    full: bool                      # True: contenuto completo, False: rappresentazione light
+    is_in_focus: bool
+    focused_tables: List[str]
+
+
+def plan_file_contents(
+    files: List[FileRecord],
+    matcher: PathMatcher,
+    focus_patterns: List[str],
+    include_all: bool,
+    light_mode: bool
+) -> List[ContentEntry]:
+    """
+    Decide, per ogni file, se emettere il contenuto completo, la versione light o nulla.
+    Mantiene l'ordine di files.
+    """
+    entries = []
+    for record in files:
+        if record.kind == KIND_BINARY:
+            continue
+        is_in_focus = matcher.matches_focus(record.rel_path)
+        focused_tables = []
+        if record.kind == KIND_DATABASE:
+            focused_tables = extract_focused_tables(record.path, focus_patterns)
+            if focused_tables: is_in_focus = True
+
+        should_write_full = include_all or is_in_focus
+        if should_write_full or light_mode:
+            entries.append(ContentEntry(record, should_write_full, is_in_focus, focused_tables))
+    return entries
+
+
+def mark_duplicate_entries(entries: List[ContentEntry], cache: Optional[ParseCache] = None) -> int:
+    """
+    Segna i file con contenuto identico a quello di un file precedente emesso nello stesso modo:
+    verranno emessi come riferimento di una riga al primo. L'hash si calcola solo per i file
+    che hanno la stessa dimensione di almeno un altro. Ritorna il numero di duplicati.
+    """
+    by_size: Dict[int, List[ContentEntry]] = {}
+    for entry in entries:
+        record = entry.record
+        record.duplicate_of = None
+        # I file vuoti sono tutti uguali, ma un riferimento non farebbe risparmiare nulla
+        if record.kind != KIND_BINARY and record.size > 0:
+            by_size.setdefault(record.size, []).append(entry)
+
+    duplicates = 0
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        first: Dict[Tuple[str, bool, Tuple[str, ...]], str] = {}
+        for entry in group:
+            record = entry.record
+            if cache is not None:
+                digest = cache.content_hash(record.path, record.size, record.mtime_ns)
+            else:
+                try:
+                    digest = hash_file(record.path)
+                except OSError:
+                    digest = None
+            if digest is None:
+                continue
+            key = (digest, entry.full, tuple(entry.focused_tables))
+            if key in first:
+                record.duplicate_of = first[key]
+                duplicates += 1
+            else:
+                first[key] = record.rel_path
+    return duplicates
+
+
+def collapse_similar_entries(entries: List[ContentEntry], threshold: float, jobs: int = 1) -> SimilarCollapser:
+    """
+    Raggruppa i file quasi identici (vedi deepbase.similarity). Serve un primo passaggio sui
+    corpi per calcolare le firme; i corpi non vengono conservati e si rigenerano in scrittura.
+    Un secondo passaggio, solo sui file dei gruppi, scarta i membri per cui il diff non è più
+    corto del file: l'albero (scritto prima dei contenuti) segna solo i file davvero raggruppati.
+    """
+    bodies = render_file_bodies(entries, jobs)
+    candidates = find_similar(((e.record.rel_path, body) for e, body in zip(entries, bodies)), threshold)
+    grouped = set(candidates) | set(candidates.values())
+    involved = [e for e in entries if e.record.rel_path in grouped]
+    decider = SimilarCollapser(candidates)
+    similar_to = {}
+    for entry, body in zip(involved, render_file_bodies(involved, jobs)):
+        rel_path = entry.record.rel_path
+        if body is not None and decider.diff_for(rel_path, body) is not None:
+            similar_to[rel_path] = candidates[rel_path]
+    for entry in entries:
+        entry.record.similar_to = similar_to.get(entry.record.rel_path)
+    if similar_to:
+        console.print(f"[dim]{len(similar_to)} similar files collapsed into diffs[/dim]")
+    return SimilarCollapser(similar_to)
+
+
+def format_duplicate(light_mode: bool, rel_path: str, original: str) -> str:
+    """Riga che sostituisce la sezione di un file identico a uno già emesso."""
+    if light_mode:
+        return f"> DUPLICATE: {rel_path} (same content as {original})\n\n"
+    return f"--- DUPLICATE FILE: {rel_path} (same content as {original}) ---\n\n"
+
+
+def render_file_bodies(
+    entries: List[ContentEntry],
+    jobs: int = 1,
+    sections: Optional[SectionReader] = None
+) -> Iterator[Optional[str]]:
+    """
+    Produce il corpo di ogni entry, nell'ordine di entries (None per i file binari e i duplicati).
+    Le letture complete dei file di testo vengono distribuite su jobs processi;
+    con sections i file invariati vengono copiati dal vecchio output.
+    """
+    reused = [sections is not None and sections.has(e.record) for e in entries]
+    full_text = [
+        e.record for e, r in zip(entries, reused)
+        if e.full and e.record.kind == KIND_TEXT and not r and e.record.duplicate_of is None
+    ]
+    contents = iter_record_contents(full_text, jobs)
+
+    for entry, is_reused in zip(entries, reused):
+        record = entry.record
+        fpath = record.path
+        if record.duplicate_of is not None:
+            # Emesso come riferimento al primo file identico: non va letto
+            yield None
+        elif is_reused:
+            yield sections.get(record)
+        elif record.kind == KIND_DATABASE:
+            if not entry.full:
+                yield generate_light_representation(fpath, "")
+            elif entry.focused_tables:
+                yield generate_database_focused(fpath, entry.focused_tables)
+            else:
+                schema = get_database_schema(fpath)
+                yield generate_database_context_full(schema, os.path.basename(fpath))
+        elif entry.full:
+            yield next(contents)
+        elif record.light_repr is not None:
+            yield record.light_repr
+        else:
+            content = read_record_content(record)
+            yield None if content is None else generate_light_representation(fpath, content)
+
+
+# Token riservati alla riga di riepilogo del budget nel documento
+_BUDGET_NOTE_TOKENS = 40
+
+
+def fit_to_budget(
+    entries: List[ContentEntry],
+    budget: int,
+    light_only: bool,
+    section_overhead: Callable[[ContentEntry], int],
+    light_records: Optional[Dict[str, FileRecord]] = None
+) -> Tuple[List[ContentEntry], Dict[str, int]]:
+    """
+    Sceglie per ogni entry contenuto completo, light o solo albero perché le sezioni
+    stiano in budget token (vedi deepbase.budget). Con light_only il contenuto completo
+    resta riservato ai file in focus. light_records fornisce le rappresentazioni light
+    quando non sono sui record stessi. Ritorna le entry da emettere (in ordine) e il riepilogo.
+    """
+    items = []
+    # Rappresentazioni il cui costo è già misurato come nel documento finale
+    measured: List[set] = []
+    for entry in entries:
+        record = entry.record
+        if light_records is not None and record.rel_path in light_records:
+            shadow = light_records[record.rel_path]
+            # Solo la rappresentazione: light_size resta vuoto, così le statistiche dell'albero non cambiano
+            record.light_repr, record.encoding = shadow.light_repr, shadow.encoding
+            source = shadow
+        else:
+            source = record
+        overhead = section_overhead(entry)
+        if record.kind == KIND_DATABASE:
+            full_text = (
+                generate_database_focused(record.path, entry.focused_tables) if entry.focused_tables
+                else generate_database_context_full(get_database_schema(record.path), record.name)
+            )
+            full_tokens = estimate_tokens_for_content(full_text)
+            light_tokens = estimate_tokens_for_content(generate_light_representation(record.path, ""))
+            measured.append({REPR_FULL, REPR_LIGHT})
+        else:
+            measured.append(set())
+            full_tokens = source.tokens
+            if full_tokens is None:
+                full_tokens = estimator.estimate_size(min(record.size, record.max_bytes) if record.truncated else record.size, record.name)
+            light_tokens = source.light_tokens if source.light_size is not None else None
+        if light_only and not entry.full:
+            full_tokens = None
+        items.append(PackItem(
+            record.rel_path,
+            None if full_tokens is None else full_tokens + overhead,
+            None if light_tokens is None else light_tokens + overhead,
+            entry.is_in_focus
+        ))
+
+    # Le stime per file usano la calibrazione del loro tipo, ma il documento viene contato come
+    # un unico testo: le sezioni scelte si rimisurano così (sono al più budget token) e il
+    # packing si ripete finché tutte le sezioni scelte hanno il costo misurato
+    while True:
+        choice = pack(items, budget)
+        pending = [(i, name) for i, name in enumerate(choice) if name != REPR_TREE and name not in measured[i]]
+        if not pending:
+            break
+        estimated = actual = 0
+        for i, name in pending:
+            item, record = items[i], entries[i].record
+            body = record.light_repr if name == REPR_LIGHT else read_record_content(record)
+            tokens = estimate_tokens_for_content(body) if body else 0
+            tokens += section_overhead(entries[i])
+            if name == REPR_FULL:
+                estimated, item.full_tokens = estimated + item.full_tokens, tokens
+            else:
+                estimated, item.light_tokens = estimated + item.light_tokens, tokens
+            actual += tokens
+            measured[i].add(name)
+        # Lo stesso scarto si applica alle stime non ancora verificate
+        ratio = actual / max(1, estimated)
+        for item, done in zip(items, measured):
+            if item.full_tokens is not None and REPR_FULL not in done:
+                item.full_tokens = math.ceil(item.full_tokens * ratio)
+            if item.light_tokens is not None and REPR_LIGHT not in done:
+                item.light_tokens = math.ceil(item.light_tokens * ratio)
+
+    selected = [
+        ContentEntry(entry.record, name == REPR_FULL, entry.is_in_focus, entry.focused_tables)
+        for entry, name in zip(entries, choice) if name != REPR_TREE
+    ]
+    return selected, pack_summary(choice)
+
+
 def load_focus_patterns_from_file(file_path: str) -> List[str]:
     patterns = []
     if os.path.exists(file_path):
@@ -409,6 +549,477 @@ def load_focus_patterns_from_file(file_path: str) -> List[str]:
     return patterns
 
 
+def load_git_filter(target: str) -> Optional[GitFilter]:
+    """
+    Legge l'indice git del repository che contiene target.
+    In caso di problemi stampa un warning e la scansione prosegue senza filtro git.
+    """
+    try:
+        git_filter = GitFilter.from_target(target)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold yellow]Warning:[/bold yellow] Could not read git index: {e}")
+        return None
+    if git_filter is None:
+        console.print(f"[bold yellow]Warning:[/bold yellow] '{target}' is not inside a git repository, --git ignored.")
+    else:
+        console.print("[dim]  Using git index: untracked and ignored files are skipped[/dim]")
+    return git_filter
+
+
+def save_parse_cache(cache: ParseCache, verbose: bool = False) -> None:
+    """Salva l'indice della cache persistente; un errore di scrittura non interrompe il run."""
+    try:
+        cache.save()
+    except OSError as e:
+        console.print(f"[bold yellow]Warning:[/bold yellow] Could not write parse cache: {e}")
+        return
+    if verbose:
+        console.print(f"[dim]  Parse cache: {cache.hits} hits, {cache.misses} misses[/dim]")
+
+
+def git_index_stamp(target: str) -> Optional[List[int]]:
+    """Dimensione e mtime dell'indice git: con --git un nuovo commit/add invalida l'output incrementale."""
+    found = find_git_dir(target)
+    if found is None:
+        return None
+    try:
+        st = os.stat(os.path.join(found[1], "index"))
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def section_start(
+    entry: ContentEntry,
+    light_mode: bool,
+    fmt_file_start: Callable[..., str],
+    diff_against: Optional[str] = None
+) -> str:
+    """
+    Intestazione della sezione di un file, con i marker di focus, light e troncamento;
+    con diff_against la sezione contiene il diff rispetto a quel file (--collapse-similar).
+    """
+    record = entry.record
+    marker = " [FOCUSED]" if (entry.is_in_focus and light_mode) else ""
+    # Solo con --max-tokens un documento completo può contenere sezioni light
+    if not light_mode and not entry.full: marker += " [LIGHT]"
+    if record.truncated: marker += " [TRUNCATED]"
+    if diff_against is not None: marker += f" [DIFF vs {diff_against}]"
+    icon = "🗄️ " if record.kind == KIND_DATABASE else ""
+    return fmt_file_start(record.rel_path + marker, icon)
+
+
+def get_formatters(light_mode: bool):
+    """Ritorna (fmt_header, fmt_file_start, fmt_file_end, fmt_separator) per la modalità scelta."""
+    if light_mode:
+        def fmt_header(title): return f"### {title}\n\n"
+        def fmt_file_start(path, icon=""): return f"> FILE: {icon}{path}\n"
+        def fmt_file_end(path): return "\n"
+        def fmt_separator(): return ""
+    else:
+        def fmt_header(title): return f"{'='*80}\n### {title} ###\n{'='*80}\n\n"
+        def fmt_file_start(path, icon=""): return f"--- START OF FILE: {icon}{path} ---\n\n"
+        def fmt_file_end(path): return f"\n\n--- END OF FILE: {path} ---\n"
+        def fmt_separator(): return "-" * 40 + "\n\n"
+    return fmt_header, fmt_file_start, fmt_file_end, fmt_separator
+
+
+@dataclass
+class RunOptions:
+    light_mode: bool = False
+    include_all: bool = False
+    focus_patterns: List[str] = field(default_factory=list)
+    walk_workers: int = 1
+    git_mode: bool = False
+    jobs: int = 1
+    no_cache: bool = False
+    incremental: bool = False
+    verbose: bool = False
+    compress: Optional[str] = None
+    max_tokens: Optional[int] = None
+    shard_tokens: Optional[int] = None
+    dedup: bool = True
+    collapse_similar: Optional[float] = None
+    output_format: str = FORMAT_MARKDOWN
+    write_index: bool = False
+
+
+def write_file_context(target: str, output: str, config: Dict[str, Any], options: RunOptions) -> None:
+    """Genera il contesto per un singolo file."""
+    fmt_header, fmt_file_start, fmt_file_end, _ = get_formatters(options.light_mode)
+    light_mode = options.light_mode
+    active_focus_patterns = options.focus_patterns
+
+    with open_output(output, options.compress) as outfile:
+        filename = os.path.basename(target)
+        is_db = is_database_file(target)
+        outfile.write(f"# Analysis: {filename}\n\n")
+        if light_mode:
+            outfile.write(LIGHT_MODE_NOTICE + "\n")
+
+        if is_db:
+            schema = get_database_schema(target)
+            focused_tables = extract_focused_tables(target, active_focus_patterns)
+            is_focused = bool(focused_tables) or (active_focus_patterns and any(
+                fnmatch.fnmatch(filename, p) or p in filename for p in active_focus_patterns
+            ))
+            outfile.write(fmt_header("DATABASE SCHEMA"))
+            if light_mode and not is_focused:
+                outfile.write(generate_light_representation(target, ""))
+            elif focused_tables:
+                outfile.write(generate_database_focused(target, focused_tables))
+            else:
+                outfile.write(generate_database_context_full(schema, filename))
+        else:
+            head, notice, tail, _ = read_text_windows(target, file_byte_limit(config, target))
+            content = head if notice is None else head + notice + tail
+            if content is None:
+                # File binario: mai decodificato né parsato
+                outfile.write(fmt_header("CONTENT"))
+                outfile.write(f"(Binary file, {os.path.getsize(target):,} bytes — content omitted)\n")
+            else:
+                structure = get_document_structure(target, content)
+                outfile.write(fmt_header("STRUCTURE"))
+                outfile.write(structure or "N/A")
+                outfile.write("\n\n")
+                outfile.write(fmt_header("CONTENT"))
+                outfile.write(fmt_file_start(filename))
+                if light_mode:
+                    outfile.write(light_representation(target, head, notice))
+                else:
+                    outfile.write(content)
+                outfile.write(fmt_file_end(filename))
+
+
+def write_directory_context(
+    target: str,
+    output: str,
+    config: Dict[str, Any],
+    options: RunOptions
+) -> Tuple[bool, Optional[Manifest]]:
+    """
+    Genera il contesto per una directory.
+    Ritorna: (output riscritto, manifest del run) — il manifest è None senza --incremental.
+    """
+    fmt_header, fmt_file_start, fmt_file_end, fmt_separator = get_formatters(options.light_mode)
+    light_mode, include_all = options.light_mode, options.include_all
+    active_focus_patterns = options.focus_patterns
+    abs_output_path = os.path.abspath(output)
+    packing = options.max_tokens is not None
+
+    # Unica visita del progetto: albero, statistiche e contenuti usano gli stessi record
+    # Pattern di ignore e focus compilati una sola volta per tutto il run
+    matcher = PathMatcher.from_config(config, active_focus_patterns)
+    git_filter = load_git_filter(target) if options.git_mode else None
+    # La cache serve solo quando si parsano i file: in light mode e con --max-tokens,
+    # che calcola le rappresentazioni light di tutti i file per scegliere cosa includere
+    cache = ParseCache.for_project(target, config["cache_max_bytes"]) if (light_mode or packing) and not options.no_cache else None
+
+    previous = manifest = sections = None
+    if options.incremental:
+        started_ns = time.time_ns()
+        manifest_path = manifest_path_for(abs_output_path)
+        fingerprint = run_fingerprint(
+            target=os.path.abspath(target), config=config, light=light_mode, all=include_all,
+            focus=sorted(active_focus_patterns), git=git_index_stamp(target) if options.git_mode else None,
+            parsers=registry.fingerprint(), max_tokens=options.max_tokens,
+            tokens=estimator.fingerprint, format=options.output_format, index=options.write_index,
+            dedup=options.dedup
+        )
+        previous = Manifest.load(manifest_path, fingerprint, abs_output_path)
+
+    scan = scan_project(
+        target, config, abs_output_path, light_mode,
+        matcher=matcher, walk_workers=options.walk_workers, git_filter=git_filter, jobs=options.jobs,
+        cache=cache, incremental=options.incremental, previous=previous
+    )
+    light_records = None
+    if packing and not light_mode:
+        # Il packer ha bisogno delle dimensioni light di tutti i file: vengono calcolate su copie
+        # dei record, così l'albero di un documento completo mostra le dimensioni reali
+        shadows = [replace(r) for r in scan.files if r.kind == KIND_TEXT]
+        render_light_records(shadows, options.jobs, cache)
+        light_records = {r.rel_path: r for r in shadows if r.light_size is not None}
+    if cache is not None:
+        save_parse_cache(cache, options.verbose)
+
+    if options.incremental:
+        manifest = Manifest.from_scan(scan, fingerprint, started_ns)
+        if previous is not None and previous.is_up_to_date(manifest):
+            console.print(f"\n[bold green]✔ UP TO DATE[/bold green]: No changes since the last run, [cyan]'{output}'[/cyan] left as is")
+            return False, previous
+        # Il vecchio output va letto prima di essere sovrascritto; con --max-tokens la
+        # rappresentazione scelta per un file invariato può cambiare, quindi nessun riuso
+        if previous is not None and not packing:
+            sections = previous.read_sections(abs_output_path)
+
+    preamble = [f"# Project Context: {os.path.basename(os.path.abspath(target))}\n\n"]
+    if light_mode:
+        preamble.append(LIGHT_MODE_NOTICE + "\n")
+    preamble.append(fmt_header("PROJECT STRUCTURE"))
+    preamble.append(_format_totals(scan, light_mode))
+    section_title = "FILE CONTENTS"
+    if light_mode: section_title += " (LIGHT — signatures only)"
+
+    budget_note = ""
+    if packing:
+        # Tutti i file sono candidati; entry.full segna quelli in focus
+        entries = plan_file_contents(scan.files, matcher, active_focus_patterns, False, True)
+        # Quello che non dipende dalla scelta: intestazioni, albero, riga del riepilogo
+        fixed_tokens = count_document_tokens(preamble + [fmt_header(section_title)])
+        fixed_tokens += count_document_tokens(iter_tree_lines(scan.root, scan.total_tokens)) + _BUDGET_NOTE_TOKENS
+
+        def section_overhead(entry: ContentEntry) -> int:
+            path = entry.record.rel_path
+            start = fmt_file_start(path + " [FOCUSED] [LIGHT] [TRUNCATED]", "🗄️ ")
+            return estimate_tokens_for_content(start + fmt_file_end(path) + fmt_separator())
+
+        budget = options.max_tokens - fixed_tokens
+        if budget < 0:
+            console.print(f"[bold yellow]Warning:[/bold yellow] The tree alone exceeds --max-tokens {options.max_tokens:,}, no file contents included.")
+        entries, summary = fit_to_budget(entries, max(0, budget), light_mode, section_overhead, light_records)
+        budget_note = (
+            f"> Token budget: ~{options.max_tokens:,} | full: {summary[REPR_FULL]}, "
+            f"light: {summary[REPR_LIGHT]}, tree only: {summary[REPR_TREE]}\n\n"
+        )
+    elif include_all or light_mode or active_focus_patterns:
+        entries = plan_file_contents(scan.files, matcher, active_focus_patterns, include_all, light_mode)
+    else:
+        entries = None
+        if options.shard_tokens is not None:
+            console.print("[bold yellow]Warning:[/bold yellow] --shard-tokens needs --light, --all, --focus or --max-tokens, writing a single file.")
+
+    if entries is not None and options.dedup:
+        duplicates = mark_duplicate_entries(entries, cache)
+        if duplicates:
+            console.print(f"[dim]{duplicates} duplicate files emitted as references[/dim]")
+            if options.output_format == FORMAT_MARKDOWN:
+                # Nell'albero e nel totale un duplicato pesa quanto la sua riga di riferimento
+                for entry in entries:
+                    record = entry.record
+                    if record.duplicate_of is not None:
+                        line = format_duplicate(light_mode, record.rel_path, record.duplicate_of)
+                        record.reference_size = len(line.encode("utf-8"))
+            aggregate_stats(scan.root)
+            preamble[-1] = _format_totals(scan, light_mode)
+        if cache is not None:
+            # Gli hash calcolati qui restano nell'indice della cache per i run successivi
+            save_parse_cache(cache)
+
+    collapser = None
+    if entries is not None and options.collapse_similar is not None:
+        collapser = collapse_similar_entries(entries, options.collapse_similar, options.jobs)
+
+    index = SectionIndex(options.output_format) if options.write_index else None
+    if options.output_format == FORMAT_JSONL:
+        write_jsonl(output, scan, entries or [], options, index, collapser)
+        if index is not None:
+            index.save(index_path_for(abs_output_path), abs_output_path)
+        return True, manifest
+
+    if entries is not None and options.shard_tokens is not None:
+        preamble[-1] += "".join(iter_tree_lines(scan.root, scan.total_tokens, dirs_only=True)) + "\n\n"
+        write_shards(
+            target, output, entries, options, preamble,
+            fmt_header(section_title) + budget_note, sections, collapser
+        )
+        return True, manifest
+
+    with open_output(output, options.compress) as outfile:
+        outfile.writelines(preamble)
+        # L'albero viene scritto riga per riga, senza costruirlo in memoria
+        outfile.writelines(iter_tree_lines(scan.root, scan.total_tokens))
+        outfile.write("\n\n")
+
+        if entries is not None:
+            outfile.write(fmt_header(section_title))
+            outfile.write(budget_note)
+
+            with Progress(console=console) as progress:
+                task = progress.add_task("[cyan]Processing...", total=len(entries))
+                # I corpi arrivano nello stesso ordine di entries anche con --jobs > 1
+                for entry, body in zip(entries, render_file_bodies(entries, options.jobs, sections)):
+                    record = entry.record
+                    rel_path = record.rel_path
+                    progress.update(task, advance=1, description=f"[cyan]{rel_path}[/cyan]")
+
+                    offset = outfile.tell() if index is not None else 0
+                    if record.duplicate_of is not None:
+                        outfile.write(format_duplicate(light_mode, rel_path, record.duplicate_of))
+                        if index is not None:
+                            index.add(rel_path, MODE_DUPLICATE, offset, outfile.tell() - offset)
+                        continue
+                    # File binario scoperto solo in lettura: compare nell'albero ma non nei contenuti
+                    if body is None:
+                        continue
+
+                    diff = collapser.diff_for(rel_path, body) if collapser is not None else None
+                    if diff is not None:
+                        body = diff
+                    outfile.write(section_start(entry, light_mode, fmt_file_start, record.similar_to if diff is not None else None))
+                    if manifest is not None:
+                        # Posizione della sezione nell'output, per riusarla al prossimo run
+                        start = outfile.tell()
+                        outfile.write(body)
+                        manifest.add_section(rel_path, start, outfile.tell() - start)
+                    else:
+                        outfile.write(body)
+                    outfile.write(fmt_file_end(rel_path))
+                    if index is not None:
+                        mode = MODE_SIMILAR if diff is not None else (MODE_FULL if entry.full else MODE_LIGHT)
+                        index.add(rel_path, mode, offset, outfile.tell() - offset)
+                    outfile.write(fmt_separator())
+        else:
+            console.print("[dim]Directory tree generated. Use --light, --all, or --focus for content.[/dim]")
+
+    if manifest is not None:
+        manifest.save(manifest_path, abs_output_path)
+    if index is not None:
+        index.save(index_path_for(abs_output_path), abs_output_path)
+    return True, manifest
+
+
+def _section_tokens(entry: ContentEntry, body: str, framing: str) -> int:
+    """Token di una sezione: i conteggi già noti dalla scansione evitano di ricontare il corpo."""
+    record = entry.record
+    known = record.tokens if entry.full else record.light_tokens
+    if known is None or record.kind != KIND_TEXT:
+        known = estimator.count(body, record.path)
+    return known + estimate_tokens_for_content(framing)
+
+
+def write_jsonl(
+    output: str,
+    scan: ScanResult,
+    entries: List[ContentEntry],
+    options: RunOptions,
+    index: Optional[SectionIndex] = None,
+    collapser: Optional[SimilarCollapser] = None
+) -> None:
+    """
+    Output --format jsonl: una riga per ogni file della scansione, nell'ordine dell'albero.
+    I file selezionati in entries portano contenuto o rappresentazione, gli altri solo i metadati.
+    """
+    selected = {entry.record.rel_path: entry for entry in entries}
+    # Le entry seguono l'ordine di scan.files: i corpi si consumano man mano
+    bodies = render_file_bodies(entries, options.jobs)
+    with open_output(output, options.compress) as outfile, Progress(console=console) as progress:
+        task = progress.add_task("[cyan]Processing...", total=len(scan.files))
+        for record in scan.files:
+            progress.update(task, advance=1, description=f"[cyan]{record.rel_path}[/cyan]")
+            entry = selected.get(record.rel_path)
+            content = next(bodies) if entry is not None else None
+            if record.duplicate_of is not None:
+                mode, tokens = MODE_DUPLICATE, 0
+            elif content is None:
+                mode, tokens = MODE_TREE, record.stats_tokens
+            else:
+                diff = collapser.diff_for(record.rel_path, content) if collapser is not None else None
+                if diff is not None:
+                    content, mode, tokens = diff, MODE_SIMILAR, estimator.count(diff, record.path)
+                else:
+                    mode, tokens = (MODE_FULL if entry.full else MODE_LIGHT), _section_tokens(entry, content, "")
+            line = jsonl_record(
+                record.rel_path, record.kind, mode, record.size, tokens, content,
+                truncated=record.truncated, focused=entry is not None and entry.is_in_focus,
+                encoding=record.encoding, duplicate_of=record.duplicate_of,
+                similar_to=record.similar_to if mode == MODE_SIMILAR else None
+            )
+            offset = outfile.tell() if index is not None else 0
+            outfile.write(line)
+            if index is not None:
+                index.add(record.rel_path, mode, offset, outfile.tell() - offset)
+
+
+def write_shards(
+    target: str,
+    output: str,
+    entries: List[ContentEntry],
+    options: RunOptions,
+    preamble: List[str],
+    contents_header: str,
+    sections: Optional[SectionReader] = None,
+    collapser: Optional[SimilarCollapser] = None
+) -> List[str]:
+    """
+    Scrive FILE CONTENTS in shard di al più options.shard_tokens token (vedi deepbase.shards).
+    Ogni shard ripete preamble (con l'albero compatto) e l'elenco dei propri file;
+    l'intestazione rientra nel limite, salvo file che da soli lo superano.
+    """
+    fmt_header, fmt_file_start, fmt_file_end, fmt_separator = get_formatters(options.light_mode)
+    project_name = os.path.basename(os.path.abspath(target))
+
+    def render_header(shard: Shard) -> str:
+        parts = [f"# Project Context: {project_name} (shard {shard.index})\n\n"] + preamble[1:]
+        parts.append(fmt_header(f"FILES IN THIS SHARD ({len(shard.files)} | ~{shard.tokens:,} tokens)"))
+        parts.extend(f"- {rel_path}\n" for rel_path in shard.files)
+        parts.append("\n")
+        parts.append(contents_header)
+        return "".join(parts)
+
+    # Intestazione fissa (numero di shard e conteggi a 6 cifre: stima per eccesso)
+    header_tokens = estimate_tokens_for_content(render_header(Shard(999, tokens=999999)))
+    limit = max(1, options.shard_tokens - header_tokens)
+    writer = ShardWriter(output, limit, render_header, options.compress, workers=min(4, max(2, options.jobs)))
+    with writer, Progress(console=console) as progress:
+        task = progress.add_task("[cyan]Processing...", total=len(entries))
+        for entry, body in zip(entries, render_file_bodies(entries, options.jobs, sections)):
+            rel_path = entry.record.rel_path
+            progress.update(task, advance=1, description=f"[cyan]{rel_path}[/cyan]")
+            if entry.record.duplicate_of is not None:
+                line = format_duplicate(options.light_mode, rel_path, entry.record.duplicate_of)
+                writer.add(rel_path, line, estimate_tokens_for_content(f"{line}- {rel_path}\n"))
+                continue
+            if body is None:
+                continue
+            diff = collapser.diff_for(rel_path, body) if collapser is not None else None
+            if diff is not None:
+                body = diff
+            start = section_start(entry, options.light_mode, fmt_file_start, entry.record.similar_to if diff is not None else None)
+            end = fmt_file_end(rel_path) + fmt_separator()
+            # La sezione costa anche la sua riga nell'elenco dei file dello shard
+            body_tokens = estimator.count(body, rel_path) if diff is not None else _section_tokens(entry, body, "")
+            writer.add(rel_path, start + body + end, body_tokens + estimate_tokens_for_content(f"{start}{end}- {rel_path}\n"))
+    console.print(f"[dim]{len(writer.paths)} shards of up to ~{options.shard_tokens:,} tokens[/dim]")
+    return writer.paths
+
+
+def watch_directory(
+    target: str,
+    output: str,
+    config: Dict[str, Any],
+    options: RunOptions,
+    manifest: Manifest
+) -> None:
+    """
+    Resta in esecuzione e rigenera l'output quando il progetto cambia.
+    Il controllo è una scansione incrementale (solo stat per le directory invariate);
+    la rigenerazione riusa manifest, cache e stato già caldi del processo.
+    """
+    abs_output_path = os.path.abspath(output)
+    matcher = PathMatcher.from_config(config, options.focus_patterns)
+    git_filter = load_git_filter(target) if options.git_mode else None
+    state = {"manifest": manifest}
+
+    def snapshot() -> str:
+        scan = scan_project(
+            target, config, abs_output_path, matcher=matcher, walk_workers=options.walk_workers,
+            git_filter=git_filter, incremental=True, previous=state["manifest"]
+        )
+        return Manifest.from_scan(scan, "", 0).root_hash
+
+    def rebuild() -> None:
+        written, state["manifest"] = write_directory_context(target, output, config, options)
+        if written:
+            console.print(f"[bold green]✔ UPDATED[/bold green] [cyan]'{output}'[/cyan] at {time.strftime('%H:%M:%S')}")
+
+    console.print(f"\n[bold cyan]Watching '{target}'[/bold cyan] [dim](Ctrl+C to stop)[/dim]")
+    try:
+        watch_loop(snapshot, rebuild)
+    except KeyboardInterrupt:
+        console.print("\n[dim]Watch stopped.[/dim]")
+
+
 def version_callback(value: bool):
     if value:
         try:
@@ -448,12 +1059,25 @@ def main(
     target: str = typer.Argument(None, help="The file or directory to scan."),
     help: bool = typer.Option(False, "--help", "-h", is_eager=True, help="Show this help message and exit."),
     version: Optional[bool] = typer.Option(None, "--version", "-v", callback=version_callback, is_eager=True, help="Show version and exit."),
-    output: str = typer.Option("llm_context.md", "--output", "-o", help="The output file."),
+    output: Optional[str] = typer.Option(None, "--output", "-o", help="The output file ('-' for stdout). Default: llm_context.md (llm_context.jsonl with --format jsonl)."),
     verbose: bool = typer.Option(False, "--verbose", "-V", help="Show detailed output."),
     include_all: bool = typer.Option(False, "--all", "-a", help="Include full content of ALL files."),
     light_mode: bool = typer.Option(False, "--light", "-l", help="Token-saving mode (signatures only)."),
     focus: Optional[List[str]] = typer.Option(None, "--focus", "-f", help="Pattern to focus on (repeatable)."),
-    focus_file: Optional[str] = typer.Option(None, "--focus-file", "-ff", help="Path to focus patterns file.")
+    focus_file: Optional[str] = typer.Option(None, "--focus-file", "-ff", help="Path to focus patterns file."),
+    walk_workers: int = typer.Option(1, "--walk-workers", min=1, help="Threads used to list directories in parallel."),
+    git_mode: bool = typer.Option(False, "--git", help="Only include files tracked in the git index."),
+    jobs: int = typer.Option(1, "--jobs", "-j", min=1, help="Processes used to read and render files."),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Do not read or write the persistent parse cache."),
+    incremental: bool = typer.Option(False, "--incremental", help="Only re-render what changed since the last run."),
+    watch: bool = typer.Option(False, "--watch", "-w", help="Keep running and update the output when files change."),
+    compress: Optional[str] = typer.Option(None, "--compress", help="Compress the output on the fly (gzip or zstd)."),
+    max_tokens: Optional[int] = typer.Option(None, "--max-tokens", min=1, help="Fit the document in N tokens, choosing full, light or tree-only per file."),
+    shard_tokens: Optional[int] = typer.Option(None, "--shard-tokens", min=1, help="Split FILE CONTENTS into numbered shard files of at most N tokens each."),
+    output_format: str = typer.Option(FORMAT_MARKDOWN, "--format", help="Output format: md (default) or jsonl (one JSON record per file)."),
+    write_index: bool = typer.Option(False, "--index", help="Write <output>.index.json with the byte offset of every file section."),
+    no_dedup: bool = typer.Option(False, "--no-dedup", help="Emit identical files in full instead of as references to the first copy."),
+    collapse_similar: Optional[float] = typer.Option(None, "--collapse-similar", min=0.0, max=1.0, help="Show files at least THRESHOLD similar (0-1] to an earlier one as diffs against it.")
 ):
     """
     Analyzes a directory OR a single file.
@@ -477,12 +1101,25 @@ def main(
         
         options = [
             ("-v, --version", "", "Show version and exit"),
-            ("-o, --output", "TEXT", "Output file [dim][default: llm_context.md][/dim]"),
+            ("-o, --output", "TEXT", "Output file, '-' for stdout [dim][default: llm_context.md / .jsonl][/dim]"),
             ("-V, --verbose", "", "Show detailed output"),
             ("-a, --all", "", "Include full content of ALL files"),
             ("-l, --light", "", "Token-saving mode (signatures only)"),
             ("-f, --focus", "TEXT", "Pattern to focus on (repeatable)"),
             ("-ff, --focus-file", "TEXT", "Path to focus patterns file"),
+            ("--walk-workers", "N", "Threads used to list directories in parallel [dim][default: 1][/dim]"),
+            ("--git", "", "Only include files tracked in the git index"),
+            ("-j, --jobs", "N", "Processes used to read and render files [dim][default: 1][/dim]"),
+            ("--no-cache", "", "Do not read or write the persistent parse cache"),
+            ("--incremental", "", "Only re-render what changed since the last run"),
+            ("-w, --watch", "", "Keep running and update the output when files change"),
+            ("--compress", "gzip|zstd", "Compress the output on the fly"),
+            ("--max-tokens", "N", "Fit the document in N tokens (full, light or tree-only per file)"),
+            ("--shard-tokens", "N", "Split FILE CONTENTS into shard files of at most N tokens"),
+            ("--format", "FMT", "Output format: md (default) or jsonl"),
+            ("--index", "", "Write <output>.index.json with byte offsets of file sections"),
+            ("--no-dedup", "", "Emit identical files in full (default: references to the first copy)"),
+            ("--collapse-similar", "T", "Show files at least T similar (0-1] to an earlier one as diffs"),
             ("-h, --help", "", "Show this message and exit"),
         ]
         for opt, meta, desc in options:
@@ -522,12 +1159,44 @@ def main(
         raise typer.Exit()
 
     # 2. Main Logic Start
+    if output is None:
+        output = "llm_context.jsonl" if output_format == FORMAT_JSONL else "llm_context.md"
+    # Con l'output su stdout i messaggi di stato vanno su stderr, per non sporcare il documento
+    console.stderr = output == STDOUT
+
+    if compress is not None and compress not in COMPRESSION_SUFFIXES:
+        console.print(f"[bold red]Error:[/bold red] Unknown compression '{compress}' (use gzip or zstd)")
+        raise typer.Exit(code=1)
+    if compress == "zstd" and not zstd_available():
+        console.print("[bold red]Error:[/bold red] zstd compression requires Python 3.14+ or the 'zstandard' package")
+        raise typer.Exit(code=1)
+    if (incremental or watch) and (output == STDOUT or compress is not None):
+        console.print("[bold red]Error:[/bold red] --incremental and --watch need an uncompressed output file")
+        raise typer.Exit(code=1)
+    if output_format not in FORMATS:
+        console.print(f"[bold red]Error:[/bold red] Unknown format '{output_format}' (use md or jsonl)")
+        raise typer.Exit(code=1)
+    if output_format == FORMAT_JSONL and (incremental or watch or shard_tokens is not None):
+        console.print("[bold red]Error:[/bold red] --format jsonl cannot be combined with --incremental, --watch or --shard-tokens")
+        raise typer.Exit(code=1)
+    if write_index and (output == STDOUT or compress is not None or shard_tokens is not None):
+        console.print("[bold red]Error:[/bold red] --index needs a single uncompressed output file")
+        raise typer.Exit(code=1)
+    if collapse_similar is not None and collapse_similar <= 0:
+        console.print("[bold red]Error:[/bold red] --collapse-similar needs a threshold greater than 0 (e.g. 0.8)")
+        raise typer.Exit(code=1)
+    if collapse_similar is not None and (incremental or watch):
+        console.print("[bold red]Error:[/bold red] --collapse-similar cannot be combined with --incremental or --watch")
+        raise typer.Exit(code=1)
+    if shard_tokens is not None and (output == STDOUT or incremental or watch):
+        console.print("[bold red]Error:[/bold red] --shard-tokens writes files: it cannot be combined with -o -, --incremental or --watch")
+        raise typer.Exit(code=1)
+    output = output_path_for(output, compress)
+
     if not os.path.exists(target):
         console.print(f"[bold red]Error:[/bold red] Target not found: '{target}'")
         raise typer.Exit(code=1)
 
-    abs_output_path = os.path.abspath(output)
-
     active_focus_patterns = []
     if focus: active_focus_patterns.extend(focus)
     if focus_file:
@@ -551,127 +1220,45 @@ def main(
         config, toml_found, user_ignore_dirs, user_ignore_files = load_config(parent_dir)
         if toml_found:
             print_config_info(toml_found, user_ignore_dirs, user_ignore_files)
+    configure_token_estimator(config)
 
     console.print(f"[bold green]Analyzing '{target}'...[/bold green]{mode_label}")
 
-    if light_mode:
-        def fmt_header(title): return f"### {title}\n\n"
-        def fmt_file_start(path, icon=""): return f"> FILE: {icon}{path}\n"
-        def fmt_file_end(path): return "\n"
-        def fmt_separator(): return ""
-    else:
-        def fmt_header(title): return f"{'='*80}\n### {title} ###\n{'='*80}\n\n"
-        def fmt_file_start(path, icon=""): return f"--- START OF FILE: {icon}{path} ---\n\n"
-        def fmt_file_end(path): return f"\n\n--- END OF FILE: {path} ---\n"
-        def fmt_separator(): return "-" * 40 + "\n\n"
+    options = RunOptions(
+        light_mode=light_mode, include_all=include_all, focus_patterns=active_focus_patterns,
+        walk_workers=walk_workers, git_mode=git_mode, jobs=jobs, no_cache=no_cache,
+        # La modalità watch si appoggia sempre al manifest incrementale
+        incremental=incremental or watch, verbose=verbose, compress=compress, max_tokens=max_tokens,
+        shard_tokens=shard_tokens, dedup=not no_dedup, collapse_similar=collapse_similar, output_format=output_format, write_index=write_index
+    )
 
     try:
-        with open(output, "w", encoding="utf-8") as outfile:
-            # CASO 1: Singolo file
-            if os.path.isfile(target):
-                filename = os.path.basename(target)
-                is_db = is_sqlite_database(target)
-                outfile.write(f"# Analysis: {filename}\n\n")
-                if light_mode:
-                    outfile.write(LIGHT_MODE_NOTICE + "\n")
-
-                if is_db:
-                    schema = get_database_schema(target)
-                    focused_tables = extract_focused_tables(target, active_focus_patterns)
-                    is_focused = bool(focused_tables) or (active_focus_patterns and any(
-                        fnmatch.fnmatch(filename, p) or p in filename for p in active_focus_patterns
-                    ))
-                    outfile.write(fmt_header("DATABASE SCHEMA"))
-                    if light_mode and not is_focused:
-                        outfile.write(generate_light_representation(target, ""))
-                    elif focused_tables:
-                        outfile.write(generate_database_focused(target, focused_tables))
-                    else:
-                        outfile.write(generate_database_context_full(schema, filename))
-                else:
-                    content = read_file_content(target)
-                    structure = get_document_structure(target, content)
-                    outfile.write(fmt_header("STRUCTURE"))
-                    outfile.write(structure or "N/A")
-                    outfile.write("\n\n")
-                    outfile.write(fmt_header("CONTENT"))
-                    outfile.write(fmt_file_start(filename))
-                    if light_mode:
-                        outfile.write(generate_light_representation(target, content))
-                    else:
-                        outfile.write(content)
-                    outfile.write(fmt_file_end(filename))
-
-            # CASO 2: Directory
-            elif os.path.isdir(target):
-                outfile.write(f"# Project Context: {os.path.basename(os.path.abspath(target))}\n\n")
-                if light_mode:
-                    outfile.write(LIGHT_MODE_NOTICE + "\n")
-                outfile.write(fmt_header("PROJECT STRUCTURE"))
-
-                tree_str, total_bytes, total_tokens = generate_directory_tree(target, config, abs_output_path, light_mode=light_mode)
-                
-                if light_mode:
-                    outfile.write(f"> Total Size (raw): {total_bytes/1024:.2f} KB | Est. Tokens (light): ~{total_tokens:,}\n")
-                else:
-                    outfile.write(f"> Total Size: {total_bytes/1024:.2f} KB | Est. Tokens: ~{total_tokens:,}\n")
-                
-                outfile.write(tree_str)
-                outfile.write("\n\n")
-
-                if include_all or light_mode or active_focus_patterns:
-                    section_title = "FILE CONTENTS"
-                    if light_mode: section_title += " (LIGHT — signatures only)"
-                    outfile.write(fmt_header(section_title))
-                    files = get_all_significant_files(target, config, abs_output_path)
-
-                    with Progress(console=console) as progress:
-                        task = progress.add_task("[cyan]Processing...", total=len(files))
-                        for fpath in files:
-                            rel_path = os.path.relpath(fpath, target).replace('\\', '/')
-                            is_db = is_sqlite_database(fpath)
-                            is_in_focus = active_focus_patterns and matches_focus(fpath, target, active_focus_patterns)
-                            focused_tables = []
-                            if is_db:
-                                focused_tables = extract_focused_tables(fpath, active_focus_patterns)
-                                if focused_tables: is_in_focus = True
-
-                            should_write_full = include_all or is_in_focus
-                            should_write_light = light_mode and not should_write_full
-
-                            if not should_write_full and not should_write_light:
-                                progress.update(task, advance=1)
-                                continue
-
-                            progress.update(task, advance=1, description=f"[cyan]{rel_path}[/cyan]")
-                            marker = " [FOCUSED]" if (is_in_focus and light_mode) else ""
-                            icon = "🗄️ " if is_db else ""
-                            outfile.write(fmt_file_start(rel_path + marker, icon))
-
-                            if is_db:
-                                if should_write_full:
-                                    if focused_tables:
-                                        outfile.write(generate_database_focused(fpath, focused_tables))
-                                    else:
-                                        schema = get_database_schema(fpath)
-                                        outfile.write(generate_database_context_full(schema, os.path.basename(fpath)))
-                                else:
-                                    outfile.write(generate_light_representation(fpath, ""))
-                            else:
-                                content = read_file_content(fpath)
-                                if should_write_full:
-                                    outfile.write(content)
-                                elif should_write_light:
-                                    light_output = generate_light_representation(fpath, content)
-                                    outfile.write(light_output)
-
-                            outfile.write(fmt_file_end(rel_path))
-                            outfile.write(fmt_separator())
-                else:
-                    console.print("[dim]Directory tree generated. Use --light, --all, or --focus for content.[/dim]")
-
-        console.print(f"\n[bold green]✔ SUCCESS[/bold green]: Context created in [cyan]'{output}'[/cyan]")
-
+        if os.path.isdir(target):
+            written, manifest = write_directory_context(target, output, config, options)
+        else:
+            if output_format != FORMAT_MARKDOWN or write_index:
+                console.print("[bold yellow]Warning:[/bold yellow] --format jsonl and --index are only supported for directories, ignored.")
+            write_file_context(target, output, config, options)
+            written, manifest = True, None
+
+        if written:
+            destination = "stdout" if output == STDOUT else f"'{output}'"
+            # Con --shard-tokens i contenuti (se richiesti) finiscono negli shard numerati
+            if shard_tokens is not None and os.path.isdir(target) and (
+                light_mode or include_all or active_focus_patterns or max_tokens is not None
+            ):
+                destination = f"'{shard_path_for(output, 1, compress)}' and following shards"
+            console.print(f"\n[bold green]✔ SUCCESS[/bold green]: Context created in [cyan]{destination}[/cyan]")
+
+        if watch:
+            if manifest is None:
+                console.print("[bold yellow]Warning:[/bold yellow] --watch is only supported for directories, ignored.")
+            else:
+                watch_directory(target, output, config, options, manifest)
+
+    except BrokenPipeError:
+        # Il lettore della pipe (es. "| head") ha chiuso: non è un errore da segnalare
+        raise typer.Exit(code=1)
     except Exception as e:
         console.print(f"\n[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
@@ -0,0 +1,145 @@
+# src/deepbase/matcher.py
+"""
+Matcher compilato per i pattern di ignore e di focus.
+I pattern di .deepbase.toml vengono compilati una sola volta in:
+- insiemi di nomi letterali
+- un trie di prefissi per i percorsi relativi
+- un'unica regex combinata per le wildcard
+così ogni lookup costa O(profondità del percorso) e non O(numero di pattern).
+"""
+
+import os
+import re
+import fnmatch
+from typing import Dict, Iterable, Optional, Any
+
+_WILDCARD_CHARS = set("*?[")
+_TRIE_END = "\0"
+
+
+def _is_wildcard(pattern: str) -> bool:
+    return any(c in _WILDCARD_CHARS for c in pattern)
+
+
+def _normalize(pattern: str) -> str:
+    return pattern.replace(os.sep, '/')
+
+
+def _compile_wildcards(patterns: Iterable[str]) -> Optional["re.Pattern"]:
+    """Combina i pattern fnmatch in un'unica regex (None se non ce ne sono)."""
+    translated = [fnmatch.translate(os.path.normcase(p)) for p in sorted(patterns)]
+    if not translated:
+        return None
+    return re.compile("|".join(f"(?:{t})" for t in translated))
+
+
+class _PrefixTrie:
+    """Trie sui componenti del percorso: 'app/templates' matcha anche 'app/templates/sub'."""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+
+    def add(self, path: str) -> None:
+        node = self._root
+        for part in path.strip('/').split('/'):
+            node = node.setdefault(part, {})
+        node[_TRIE_END] = True
+
+    def matches_prefix(self, rel_path: str) -> bool:
+        node = self._root
+        for part in rel_path.split('/'):
+            node = node.get(part)
+            if node is None:
+                return False
+            if _TRIE_END in node:
+                return True
+        return False
+
+
+class PathMatcher:
+    """
+    Decide se directory e file vanno ignorati e se un file è in focus.
+    Tutti i percorsi sono relativi alla root del progetto e usano '/' come separatore.
+    """
+
+    def __init__(
+        self,
+        ignore_dirs: Iterable[str] = (),
+        ignore_files: Iterable[str] = (),
+        focus_patterns: Iterable[str] = ()
+    ):
+        # --- Directory ---
+        self._dir_names = set()
+        self._dir_prefixes = _PrefixTrie()
+        dir_wildcards = set()
+        for pattern in map(_normalize, ignore_dirs):
+            if _is_wildcard(pattern):
+                dir_wildcards.add(pattern)
+            else:
+                if '/' not in pattern:
+                    self._dir_names.add(pattern)
+                self._dir_prefixes.add(pattern)
+        self._dir_regex = _compile_wildcards(dir_wildcards)
+
+        # --- File ---
+        self._file_names = set()
+        self._file_paths = set()
+        file_wildcards = set()
+        for pattern in map(_normalize, ignore_files):
+            if _is_wildcard(pattern):
+                file_wildcards.add(pattern)
+            elif '/' in pattern:
+                self._file_paths.add(pattern)
+            else:
+                self._file_names.add(pattern)
+        self._file_regex = _compile_wildcards(file_wildcards)
+
+        # --- Focus ---
+        # Un pattern di focus matcha se fa fnmatch sul percorso o se ne è una sottostringa
+        focus = {_normalize(p) for p in focus_patterns}
+        self.has_focus = bool(focus)
+        self._focus_regex = _compile_wildcards(p for p in focus if _is_wildcard(p))
+        self._focus_substrings = (
+            re.compile("|".join(re.escape(p) for p in sorted(focus, key=len))) if focus else None
+        )
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], focus_patterns: Iterable[str] = ()) -> "PathMatcher":
+        return cls(config["ignore_dirs"], config["ignore_files"], focus_patterns)
+
+    @staticmethod
+    def _regex_match(regex: Optional["re.Pattern"], *candidates: str) -> bool:
+        if regex is None:
+            return False
+        return any(regex.match(os.path.normcase(c)) for c in candidates)
+
+    def ignores_dir(self, rel_path: str, name: Optional[str] = None) -> bool:
+        """
+        Supporta nomi semplici ("node_modules"), percorsi relativi ("app/templates",
+        incluse le sotto-directory) e wildcard ("*.egg-info") su nome o percorso.
+        """
+        if name is None:
+            name = rel_path.rsplit('/', 1)[-1]
+        if name in self._dir_names:
+            return True
+        if self._dir_prefixes.matches_prefix(rel_path):
+            return True
+        return self._regex_match(self._dir_regex, name, rel_path)
+
+    def ignores_file(self, rel_path: str, name: Optional[str] = None) -> bool:
+        """
+        Supporta nomi esatti ("secrets.env"), percorsi relativi ("app/config/local.env")
+        e wildcard ("*.log") su nome o percorso.
+        """
+        if name is None:
+            name = rel_path.rsplit('/', 1)[-1]
+        if name in self._file_names or rel_path in self._file_paths:
+            return True
+        return self._regex_match(self._file_regex, name, rel_path)
+
+    def matches_focus(self, rel_path: str) -> bool:
+        if not self.has_focus:
+            return False
+        if self._focus_substrings.search(rel_path):
+            return True
+        return self._regex_match(self._focus_regex, rel_path)
@@ -0,0 +1,108 @@
+# src/deepbase/output.py
+"""
+Destinazione del documento generato: un file su disco oppure stdout ("-o -"),
+con compressione opzionale al volo (gzip, o zstd se il modulo è disponibile).
+Il testo viene codificato e compresso man mano che viene scritto: nessun file
+intermedio da rileggere e comprimere a parte.
+"""
+
+import gzip
+import io
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, TextIO
+
+STDOUT = "-"
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def _zstd_writer(raw: BinaryIO) -> Optional[BinaryIO]:
+    """Stream zstd sopra raw (che resta aperto alla chiusura), oppure None se zstd non è disponibile."""
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.ZstdFile(raw, mode="wb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+
+def write_atomic(path: str, data: str) -> None:
+    """
+    Scrive data (UTF-8) su un file temporaneo accanto a path e lo rinomina al suo posto:
+    un run interrotto non lascia mai un file scritto a metà (cache, manifest, indice).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def zstd_available() -> bool:
+    writer = _zstd_writer(io.BytesIO())
+    if writer is None:
+        return False
+    writer.close()
+    return True
+
+
+def output_path_for(output: str, compress: Optional[str] = None) -> str:
+    """Percorso effettivo dell'output: con la compressione si aggiunge l'estensione se manca."""
+    if output == STDOUT or compress is None:
+        return output
+    suffix = COMPRESSION_SUFFIXES[compress]
+    return output if output.endswith(suffix) else output + suffix
+
+
+@contextmanager
+def open_output(output: str, compress: Optional[str] = None) -> Iterator[TextIO]:
+    """
+    Apre la destinazione in scrittura testuale (UTF-8).
+    Un file non compresso viene aperto come sempre, quindi supporta tell()
+    (usato dal manifest di --incremental); stdout non viene mai chiuso.
+    """
+    if output != STDOUT and compress is None:
+        with open(output, "w", encoding="utf-8") as f:
+            yield f
+        return
+
+    to_stdout = output == STDOUT
+    if to_stdout:
+        sys.stdout.flush()
+        raw = sys.stdout.buffer
+    else:
+        raw = open(output, "wb")
+    stream: BinaryIO = raw
+    try:
+        if compress == "gzip":
+            stream = gzip.GzipFile(fileobj=raw, mode="wb")
+        elif compress == "zstd":
+            stream = _zstd_writer(raw)
+            if stream is None:
+                raise RuntimeError("zstd compression requires Python 3.14+ or the 'zstandard' package")
+        text = io.TextIOWrapper(stream, encoding="utf-8")
+        try:
+            yield text
+        finally:
+            text.flush()
+            # detach: il wrapper non deve chiudere lo stream sottostante (stdout in particolare)
+            text.detach()
+            if stream is not raw:
+                # Scrive il trailer del formato compresso; raw resta aperto
+                stream.close()
+    finally:
+        if to_stdout:
+            raw.flush()
+        else:
+            raw.close()
@@ -0,0 +1,107 @@
+# src/deepbase/parsers/cfamily.py
+"""
+Parser light per C, C++ e C#: funzioni e prototipi, tipi (struct, class, enum, union),
+namespace con i loro membri. Le righe di preprocessore vengono saltate.
+"""
+
+import re
+from typing import Optional
+from .clike import (
+    BraceLanguageParser, CONTROL_KEYWORDS, is_callable, split_top_level, words_before_paren,
+)
+
+# [[nodiscard]] e specificatori di accesso ("public:", "private slots:")
+_CPP_PREFIX_RE = re.compile(
+    r'^(?:\[\[[^\]]*\]\]\s*|(?:public|private|protected|signals|Q_SIGNALS|Q_SLOTS)(?:\s+slots)?\s*:(?!:)\s*)+'
+)
+# Attributi C# in testa alla dichiarazione ([Serializable], [HttpGet("x")])
+_CS_ATTRIBUTES_RE = re.compile(r'^(?:\[[^\]]*\]\s*)+')
+_CS_VERBATIM_RE = re.compile(r'"(?:[^"]|"")*"?')
+
+_IDENT_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+
+class CParser(BraceLanguageParser):
+    """C e C++ (registrato anche per gli header)."""
+
+    preprocessor = True
+    trailing_declarators = True
+    _type_keywords = frozenset({"class", "struct", "union", "namespace"})
+
+    def raw_literal_end(self, src: str, i: int) -> Optional[int]:
+        # Raw string C++11: R"delim(...)delim", anche con prefisso u8/u/U/L
+        j = i
+        while j > 0 and src[j - 1] in _IDENT_CHARS:
+            j -= 1
+        if src[j:i] not in ("R", "u8R", "uR", "UR", "LR"):
+            return None
+        paren = src.find('(', i + 1, i + 18)
+        if paren < 0:
+            return None
+        close = ')' + src[i + 1:paren] + '"'
+        end = src.find(close, paren + 1)
+        return len(src) if end < 0 else end + len(close)
+
+    def clean(self, header: str) -> str:
+        return _CPP_PREFIX_RE.sub("", header)
+
+    def is_container(self, header: str) -> bool:
+        if header.startswith('extern "C"'):
+            return True
+        if '(' in header or '=' in header:
+            return False
+        return any(w in self._type_keywords for w in header.split())
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        return is_callable(header) or ("enum" in header.split() and '=' not in header)
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        signature, value = split_top_level(header, " = ")
+        # Metodi puri, default o cancellati restano; inizializzazioni no
+        if value and value not in ("0", "default", "delete"):
+            return None
+        return super().format_statement(header, terminator, in_container)
+
+
+class CSharpParser(BraceLanguageParser):
+    literals = {
+        '"': re.compile(r'"""[\s\S]*?(?:"""|\Z)|"(?:[^"\\\n]|\\.)*"?'),
+        "'": re.compile(r"'(?:[^'\\\n]|\\.[^'\n]{0,8})'"),
+    }
+    preprocessor = True
+    _type_keywords = frozenset({"namespace", "class", "struct", "interface", "record", "enum"})
+
+    def raw_literal_end(self, src: str, i: int) -> Optional[int]:
+        # Stringhe verbatim: @"...", $@"...", @$"..." (le virgolette si raddoppiano)
+        if src[i - 1:i] == '@' or src[i - 2:i] == '@$':
+            return _CS_VERBATIM_RE.match(src, i).end()
+        return None
+
+    def clean(self, header: str) -> str:
+        return _CS_ATTRIBUTES_RE.sub("", header)
+
+    def is_container(self, header: str) -> bool:
+        words = words_before_paren(header)
+        return "=" not in words and any(w in self._type_keywords for w in words)
+
+    @staticmethod
+    def _is_property(header: str) -> bool:
+        words = header.split()
+        return (
+            '(' not in header and '=' not in header and len(words) >= 2
+            and words[0] not in CONTROL_KEYWORDS
+        )
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        return is_callable(header) or (in_container and self._is_property(header))
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        if header.startswith("namespace "):
+            return header + terminator
+        signature, body = split_top_level(header, " => ")
+        if body:
+            # Membri con corpo espressione: "public int Area() => w * h;"
+            if is_callable(signature) or (in_container and self._is_property(signature)):
+                return f"{signature} => ..."
+            return None
+        return super().format_statement(header, terminator, in_container)
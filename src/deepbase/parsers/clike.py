@@ -0,0 +1,395 @@
+# src/deepbase/parsers/clike.py
+"""
+Base comune per i linguaggi "a graffe" (Java, Kotlin, Go, Rust, C, C++, C#).
+Un'unica scansione lineare del sorgente: stringhe, caratteri e commenti vengono saltati
+come token opachi, i corpi delle funzioni attraversati contando solo le graffe.
+Restano le intestazioni delle dichiarazioni (anche su più righe), che le sottoclassi
+classificano in contenitori (classi, namespace, impl... di cui si elencano i membri),
+firme (funzioni, metodi, tipi) o altro (ignorato).
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+from .interface import LanguageParser
+
+_WS_RE = re.compile(r'\s+')
+_BLOCK_COMMENT_RE = re.compile(r'/\*.*?(?:\*/|\Z)', re.DOTALL)
+_DOC_TAG_RE = re.compile(r'<[^>]*>')
+
+# Oltre questa lunghezza l'intestazione non è una firma (inizializzatori, tabelle, macro)
+MAX_HEADER = 1000
+INDENT = "    "
+
+# Parole che aprono un'istruzione, mai una dichiarazione
+CONTROL_KEYWORDS = frozenset({
+    "if", "for", "while", "switch", "catch", "return", "else", "do", "sizeof", "new", "throw",
+    "case", "using", "lock", "synchronized", "try", "foreach", "fixed", "checked", "defer",
+    "go", "select", "match", "loop", "let", "await", "yield", "when", "assert", "delete",
+    "typeof", "nameof",
+})
+
+
+def split_top_level(text: str, separator: str) -> Tuple[str, str]:
+    """Divide text alla prima occorrenza di separator fuori da parentesi e generics."""
+    depth = 0
+    size = len(separator)
+    for i, c in enumerate(text):
+        if c in "([<":
+            depth += 1
+        elif c in ")]>" and depth > 0 and not (c == '>' and text[i - 1:i] in ('-', '=')):
+            depth -= 1
+        elif depth == 0 and text.startswith(separator, i):
+            return text[:i].rstrip(), text[i + size:].lstrip()
+    return text, ""
+
+
+def words_before_paren(header: str) -> List[str]:
+    return header.partition('(')[0].split()
+
+
+def is_callable(header: str, min_words: int = 1) -> bool:
+    """Intestazione di funzione/metodo: nome seguito da '(' e nessuna assegnazione prima."""
+    pre, paren, _ = header.partition('(')
+    if not paren:
+        return False
+    pre = pre.strip()
+    words = pre.split()
+    if len(words) < min_words or not words:
+        return False
+    if words[0] in CONTROL_KEYWORDS or words[-1] in CONTROL_KEYWORDS:
+        return False
+    if '=' in pre.replace('==', '') and 'operator' not in pre:
+        return False
+    return pre[-1].isalnum() or pre[-1] in "_>]$~!?"
+
+
+class BraceLanguageParser(LanguageParser):
+    """
+    Parser light per un linguaggio a graffe.
+    Le sottoclassi definiscono i letterali del linguaggio e la classificazione delle intestazioni.
+    """
+
+    # Letterali: carattere iniziale -> pattern (il match parte dal carattere stesso)
+    literals: Dict[str, Pattern] = {
+        '"': re.compile(r'"(?:[^"\\\n]|\\.)*"?', re.DOTALL),
+        "'": re.compile(r"'(?:[^'\\\n]|\\.[^'\n]{0,8})'"),
+    }
+    # Righe di preprocessore ('#include', '#define', '#region'...)
+    preprocessor = False
+    # Attributi in stile Rust: #[...] e #![...]
+    hash_attributes = False
+    # Go e Kotlin: una nuova riga può chiudere lo statement (niente ';')
+    newline_statements = False
+    # C/C++: dopo la graffa di un tipo possono seguire dei dichiaratori ("} Name;")
+    trailing_declarators = False
+    # Prefissi dei commenti di documentazione riportati nell'output
+    doc_markers: Tuple[str, ...] = ("/**", "///")
+
+    def parse(self, content: str, file_path: str) -> str:
+        lines = _BraceScanner(self, content).scan()
+        if not lines:
+            return f"(No types or functions found in {os.path.basename(file_path)})"
+        return "\n".join(lines)
+
+    # --- Hook per i letterali ---
+
+    def raw_literal_end(self, src: str, i: int) -> Optional[int]:
+        """
+        i punta a '"': se il prefisso che lo precede apre una stringa raw/verbatim
+        ritorna l'indice di fine del letterale, altrimenti None.
+        """
+        return None
+
+    # --- Hook di classificazione (header già ripulito, spazi compattati) ---
+
+    def clean(self, header: str) -> str:
+        return header
+
+    def is_container(self, header: str) -> bool:
+        return False
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        return is_callable(header)
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        """Statement senza corpo (prototipi, metodi astratti, alias di tipo)."""
+        if is_callable(header, min_words=1 if in_container else 2):
+            return header + terminator
+        return None
+
+
+class _BraceScanner:
+    def __init__(self, parser: BraceLanguageParser, source: str):
+        self.parser = parser
+        self.src = source
+        self.n = len(source)
+        self.output: List[str] = []
+        specials = "{}/" + "".join(parser.literals)
+        if parser.preprocessor or parser.hash_attributes:
+            specials += "#"
+        escaped = re.escape(specials)
+        self.body_skip = re.compile(f"[^{escaped}]+")
+        self.word_run = re.compile(f"[^\\s(){{}}\\[\\];{escaped}]+")
+
+    # --- Salti ---
+
+    def _at_line_start(self, i: int) -> bool:
+        j = self.src.rfind('\n', 0, i) + 1
+        return not self.src[j:i].strip()
+
+    def _skip_preprocessor(self, i: int) -> int:
+        """Salta una riga di preprocessore, comprese le continuazioni con '\\'."""
+        src, n = self.src, self.n
+        while True:
+            end = src.find('\n', i)
+            if end < 0:
+                return n
+            if src[end - 1:end] != '\\' and src[end - 2:end] != '\\\r':
+                return end
+            i = end + 1
+
+    def _skip_hash(self, i: int) -> Optional[int]:
+        """'#' di preprocessore o attributo Rust; None se è un carattere qualsiasi."""
+        src = self.src
+        if self.parser.preprocessor and self._at_line_start(i):
+            return self._skip_preprocessor(i)
+        if self.parser.hash_attributes and (src.startswith('#[', i) or src.startswith('#![', i)):
+            return self._skip_group(src.index('[', i) + 1, '[', ']')
+        return None
+
+    def _skip_group(self, i: int, open_char: str, close_char: str) -> int:
+        depth = 0
+        src, n = self.src, self.n
+        while i < n:
+            c = src[i]
+            if c == open_char:
+                depth += 1
+            elif c == close_char:
+                if depth == 0:
+                    return i + 1
+                depth -= 1
+            elif c in self.parser.literals:
+                i = self._skip_literal(i)
+                continue
+            i += 1
+        return n
+
+    def _skip_literal(self, i: int) -> int:
+        if self.src[i] == '"':
+            end = self.parser.raw_literal_end(self.src, i)
+            if end is not None:
+                return end
+        m = self.parser.literals[self.src[i]].match(self.src, i)
+        # Un apice isolato (es. lifetime Rust 'a) non apre nessun letterale
+        return m.end() if m else i + 1
+
+    def _skip_comment(self, i: int) -> int:
+        src = self.src
+        if src.startswith('//', i):
+            end = src.find('\n', i)
+            return self.n if end < 0 else end
+        if src.startswith('/*', i):
+            return _BLOCK_COMMENT_RE.match(src, i).end()
+        return i
+
+    def _skip_block(self, i: int) -> int:
+        """Salta fino alla graffa che chiude il blocco corrente; ritorna l'indice successivo."""
+        src, n, skip = self.src, self.n, self.body_skip
+        depth = 0
+        while i < n:
+            m = skip.match(src, i)
+            if m:
+                i = m.end()
+                if i >= n:
+                    break
+            c = src[i]
+            if c == '{':
+                depth += 1
+                i += 1
+            elif c == '}':
+                if depth == 0:
+                    return i + 1
+                depth -= 1
+                i += 1
+            elif c == '/':
+                end = self._skip_comment(i)
+                i = end if end != i else i + 1
+            elif c == '#':
+                end = self._skip_hash(i)
+                i = end if end is not None else i + 1
+            else:
+                i = self._skip_literal(i)
+        return n
+
+    # --- Documentazione ---
+
+    def _doc_first_line(self, comment: str) -> Optional[Tuple[str, str]]:
+        for marker in self.parser.doc_markers:
+            if comment.startswith(marker) and not comment.startswith(marker + marker[-1]):
+                text = comment[len(marker):]
+                if marker == "/**":
+                    text = text[:-2] if text.endswith("*/") else text
+                for line in text.splitlines():
+                    line = _DOC_TAG_RE.sub("", line.strip().lstrip('*').strip()).strip()
+                    if line:
+                        return marker, line
+                return marker, ""
+        return None
+
+    @staticmethod
+    def _format_doc(marker: str, text: str) -> str:
+        return f"/** {text} */" if marker == "/**" else f"{marker} {text}"
+
+    # --- Intestazioni ---
+
+    def scan(self) -> List[str]:
+        self._scan_level(0, "", in_container=False)
+        return self.output
+
+    def _continues(self, header: List[str], end: int) -> bool:
+        """Con newline_statements: la riga successiva continua lo statement corrente?"""
+        last = header[-1][-1]
+        if not (last.isalnum() or last in "_)]\"'>?`"):
+            return True
+        return self.src[end:end + 1] in ".?:=&|+-*,){" and not self.src.startswith("//", end)
+
+    def _scan_level(self, i: int, indent: str, in_container: bool) -> int:
+        """
+        Scandisce le dichiarazioni di un livello (file o corpo di un contenitore)
+        fino alla fine del sorgente o alla graffa di chiusura del contenitore.
+        """
+        parser, src, n = self.parser, self.src, self.n
+        header: List[str] = []
+        length = 0
+        depth = 0                   # parentesi tonde/quadre aperte nell'intestazione
+        doc: Optional[Tuple[str, str]] = None
+        tail_line: Optional[int] = None     # riga di un tipo appena chiuso (es. "typedef struct {...} Name;")
+
+        def append(text: str) -> None:
+            nonlocal length
+            if length <= MAX_HEADER:
+                header.append(text)
+                length += len(text)
+
+        def reset() -> None:
+            nonlocal length, depth, doc
+            header.clear()
+            length = 0
+            depth = 0
+            doc = None
+
+        def emit(line: str) -> None:
+            if doc is not None and doc[1]:
+                self.output.append(indent + self._format_doc(*doc))
+            self.output.append(indent + line)
+
+        def finish(terminator: str) -> None:
+            nonlocal tail_line
+            text = "".join(header).strip()
+            if text and length <= MAX_HEADER:
+                if tail_line is not None and re.fullmatch(r'[\w\s,*&]+', text):
+                    self.output[tail_line] += f" {text}{terminator}"
+                else:
+                    line = parser.format_statement(parser.clean(text), terminator, in_container)
+                    if line:
+                        emit(line)
+            tail_line = None
+            reset()
+
+        while i < n:
+            c = src[i]
+            if c.isspace():
+                end = _WS_RE.match(src, i).end()
+                if (
+                    parser.newline_statements and depth == 0 and header and '\n' in src[i:end]
+                    and not self._continues(header, end)
+                ):
+                    finish("")
+                elif header and header[-1][-1] not in "([ ":
+                    append(" ")
+                i = end
+            elif c == '/':
+                end = self._skip_comment(i)
+                if end == i:
+                    append('/')
+                    i += 1
+                    continue
+                if not header:
+                    found = self._doc_first_line(src[i:end])
+                    if found is not None and (doc is None or not doc[1]):
+                        doc = found
+                i = end
+            elif c == '#' and (parser.preprocessor or parser.hash_attributes):
+                end = self._skip_hash(i)
+                if end is None:
+                    append('#')
+                    i += 1
+                else:
+                    i = end
+            elif c in parser.literals:
+                end = self._skip_literal(i)
+                append(src[i:end] if end - i <= 200 else '"..."')
+                i = end
+            elif c in '([':
+                depth += 1
+                append(c)
+                i += 1
+            elif c in ')]':
+                depth = max(0, depth - 1)
+                if header and header[-1] == " ":
+                    header.pop()
+                    length -= 1
+                if header and header[-1].endswith(','):
+                    header[-1] = header[-1][:-1]
+                append(c)
+                i += 1
+            elif c == '{':
+                text = parser.clean("".join(header).strip())
+                body_start = i + 1
+                if depth != 0:
+                    # Graffe dentro parentesi (array in annotazioni, lambda negli argomenti)
+                    i = self._skip_block(body_start)
+                    append("{...}")
+                    continue
+                if length > MAX_HEADER or not text:
+                    i = self._skip_block(body_start)
+                    reset()
+                    continue
+                if parser.is_container(text):
+                    emit(f"{text} {{ ... }}")
+                    line = len(self.output) - 1
+                    i = self._scan_level(body_start, indent + INDENT, in_container=True)
+                    reset()
+                    tail_line = line if parser.trailing_declarators else None
+                    continue
+                if parser.is_block_signature(text, in_container):
+                    emit(f"{text} {{ ... }}")
+                    i = self._skip_block(body_start)
+                    reset()
+                    if parser.trailing_declarators and not is_callable(text):
+                        tail_line = len(self.output) - 1
+                    continue
+                i = self._skip_block(body_start)
+                reset()
+                tail_line = None
+            elif c == '}':
+                finish("")
+                if in_container:
+                    return i + 1
+                # Graffa spaiata al primo livello: si riparte da uno statement nuovo
+                i += 1
+            elif c == ';' and depth == 0:
+                finish(";")
+                i += 1
+            elif c == ';':
+                append(c)
+                i += 1
+            else:
+                end = self.word_run.match(src, i)
+                end = end.end() if end else i + 1
+                append(src[i:end])
+                i = end
+
+        finish("")
+        return n
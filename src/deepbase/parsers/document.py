@@ -1,12 +1,12 @@
 # src/deepbase/parsers/document.py
 import re
 import os
-from .interface import LanguageParser
+from .interface import LanguageParser, iter_lines
 
 class MarkdownParser(LanguageParser):
     def parse(self, content: str, file_path: str) -> str:
         lines = []
-        for line in content.splitlines():
+        for line in iter_lines(content):
             if line.strip().startswith("#"):
                 lines.append(line.strip())
         if not lines:
@@ -29,7 +29,7 @@ class LatexParser(LanguageParser):
         ]
         combined_pattern = re.compile('|'.join(keep_patterns))
         lines = []
-        for line in content.splitlines():
+        for line in iter_lines(content):
             # Rimuovi commenti inline parziali se necessario, qui semplifichiamo
             line_clean = line.split('%')[0].rstrip()
             if combined_pattern.match(line_clean):
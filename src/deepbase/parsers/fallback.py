@@ -1,5 +1,5 @@
 # src/deepbase/parsers/fallback.py
-from .interface import LanguageParser
+from .interface import LanguageParser, iter_lines
 
 class FallbackParser(LanguageParser):
     """
@@ -8,18 +8,21 @@ class FallbackParser(LanguageParser):
     """
     def parse(self, content: str, file_path: str) -> str:
         lines = []
-        # Rimuove righe vuote e commenti base
-        for line in content.splitlines():
+        total = 0
+        # Rimuove righe vuote e commenti base; conserva solo l'anteprima, conta il resto
+        for line in iter_lines(content):
             clean = line.strip()
             if clean and not clean.startswith("#"):
-                lines.append(clean)
+                total += 1
+                if total <= 20:
+                    lines.append(clean)
         
         if not lines:
             return "(Empty or comments-only file)"
             
         # Se il file è molto lungo, troncalo per il fallback
-        if len(lines) > 20:
-            preview = "\n".join(lines[:20])
-            return f"{preview}\n... ({len(lines)-20} more lines hidden - Light Mode Fallback)"
+        if total > 20:
+            preview = "\n".join(lines)
+            return f"{preview}\n... ({total-20} more lines hidden - Light Mode Fallback)"
             
         return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,34 @@
+# src/deepbase/parsers/go.py
+"""
+Parser light per Go: funzioni e metodi, dichiarazioni di tipo,
+metodi delle interfacce. I commenti che precedono una dichiarazione sono la sua doc.
+"""
+
+import re
+from typing import Optional
+from .clike import BraceLanguageParser, is_callable, words_before_paren
+
+
+class GoParser(BraceLanguageParser):
+    literals = {
+        '"': re.compile(r'"(?:[^"\\\n]|\\.)*"?'),
+        "'": re.compile(r"'(?:[^'\\\n]|\\.[^'\n]{0,8})'"),
+        '`': re.compile(r'`[^`]*`?'),
+    }
+    newline_statements = True
+    doc_markers = ("//",)
+
+    def is_container(self, header: str) -> bool:
+        words = header.split()
+        return len(words) >= 3 and words[0] == "type" and words[-1] in ("struct", "interface")
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        return not in_container and header.startswith("func")
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        if in_container:
+            # Metodi di un'interfaccia; i campi delle struct vengono omessi
+            return header if is_callable(header) and "func" not in words_before_paren(header) else None
+        if header.startswith("func") or (header.startswith("type ") and not header.startswith("type (")):
+            return header
+        return None
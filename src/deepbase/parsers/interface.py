@@ -1,11 +1,28 @@
 # src/deepbase/parsers/interface.py
+import re
 from abc import ABC, abstractmethod
+from typing import Iterator
+
+_LINE_RE = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+$')
+
+
+def iter_lines(content: str) -> Iterator[str]:
+    """
+    Come content.splitlines(), ma produce le righe una alla volta:
+    sui file grandi non viene materializzata la lista di tutte le righe.
+    """
+    for match in _LINE_RE.finditer(content):
+        yield match.group(0).rstrip('\r\n')
+
 
 class LanguageParser(ABC):
     """
     Interfaccia base per i parser di linguaggio.
     """
-    
+
+    # Fa parte della chiave della cache persistente: va incrementata quando cambia l'output
+    version = "1"
+
     @abstractmethod
     def parse(self, content: str, file_path: str) -> str:
         """
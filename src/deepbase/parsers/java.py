@@ -0,0 +1,50 @@
+# src/deepbase/parsers/java.py
+"""
+Parser light per Java e Kotlin: tipi (classi, interfacce, enum, record, object)
+con i loro membri, firme di metodi e costruttori. Le annotazioni vengono omesse.
+"""
+
+import re
+from typing import Optional
+from .clike import BraceLanguageParser, is_callable, split_top_level, words_before_paren
+
+# Annotazioni in testa alla dichiarazione (@Override, @GetMapping("/x"), @file:JvmName(...))
+_ANNOTATIONS_RE = re.compile(r'^(?:@(?!interface\b)[\w.:]+(?:\((?:[^()]|\([^()]*\))*\))?\s*)+')
+
+_JVM_LITERALS = {
+    '"': re.compile(r'"""[\s\S]*?(?:"""|\Z)|"(?:[^"\\\n]|\\.)*"?'),
+    "'": re.compile(r"'(?:[^'\\\n]|\\.[^'\n]{0,8})'"),
+}
+
+
+class JavaParser(BraceLanguageParser):
+    literals = _JVM_LITERALS
+    _type_keywords = frozenset({"class", "interface", "enum", "record", "@interface"})
+
+    def clean(self, header: str) -> str:
+        return _ANNOTATIONS_RE.sub("", header)
+
+    def is_container(self, header: str) -> bool:
+        words = words_before_paren(header)
+        return "=" not in words and any(w in self._type_keywords for w in words)
+
+
+class KotlinParser(JavaParser):
+    newline_statements = True
+    _type_keywords = frozenset({"class", "interface", "object"})
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        words = words_before_paren(header)
+        return "fun" in words or (bool(words) and words[-1] == "constructor")
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        words = words_before_paren(header)
+        if "fun" in words:
+            # Corpo espressione: "fun area() = width * height" -> "fun area() = ..."
+            signature, body = split_top_level(header, " = ")
+            return f"{signature} = ..." if body else signature
+        if self.is_container(header) or (words and words[0] == "typealias"):
+            return header
+        if in_container and is_callable(header) and words[-1] == "constructor":
+            return header
+        return None
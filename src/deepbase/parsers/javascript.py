@@ -1,87 +1,449 @@
 # src/deepbase/parsers/javascript.py
+import os
 import re
+from typing import List, Tuple
 from .interface import LanguageParser
 
+# --- Token del lexer (compilati una sola volta, nessun pattern con backtracking) ---
+_WS_RE = re.compile(r'\s+')
+_STRING_RE = {
+    "'": re.compile(r"'(?:[^'\\\n]|\\.)*'?", re.DOTALL),
+    '"': re.compile(r'"(?:[^"\\\n]|\\.)*"?', re.DOTALL),
+}
+_TEMPLATE_CHUNK_RE = re.compile(r'(?:[^`\\$]|\\.|\$(?!\{))*', re.DOTALL)
+_REGEX_LITERAL_RE = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+_WORD_RUN_RE = re.compile(r'[^\s{}()\[\];\'"`/<]+')
+# Nel corpo di funzioni e blocchi interessano solo i caratteri che cambiano contesto
+_BODY_SKIP_RE = re.compile(r'[^{}\'"`/]+')
+_BODY_SKIP_JSX_RE = re.compile(r'[^{}\'"`/<]+')
+
+# --- JSX ---
+_JSX_START_RE = re.compile(r'<(?:>|[A-Za-z_$][\w$.:-]*[\s/>])')
+_JSX_NAME_RE = re.compile(r'[\w$.:-]*')
+_JSX_ATTR_RE = re.compile(r'[^\s=/>{\'"]+')
+_JSX_TEXT_RE = re.compile(r'[^<{]+')
+_JSX_ATTR_STRING_RE = {"'": re.compile(r"'[^']*'?"), '"': re.compile(r'"[^"]*"?')}
+
+# Contesto in cui '/' apre una regex e '<' un elemento JSX (invece di divisione / minore)
+_EXPRESSION_CHARS = frozenset("(,=:[!&|?{};+-*%<>~^")
+_EXPRESSION_KEYWORDS = frozenset({
+    "return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+    "void", "throw", "yield", "await", "instanceof", "default",
+})
+
+# --- Classificazione delle dichiarazioni ---
+_CLASS_RE = re.compile(r'(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?class\b')
+_FUNCTION_RE = re.compile(r'(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?function\b')
+_VARIABLE_RE = re.compile(r'(?:export\s+)?(?:declare\s+)?(?:const|let|var)\s+[\w$]+')
+_TYPE_RE = re.compile(r'(?:export\s+)?(?:declare\s+)?(?:const\s+)?(?:interface|type|enum)\s+[\w$]+')
+_EXPORT_DEFAULT_RE = re.compile(r'export\s+default\s+[\w$.]+$')
+_MEMBER_RE = re.compile(
+    r'(?:(?:public|private|protected|static|readonly|async|get|set|abstract|override|declare)\s+)*'
+    r'\*?\s*[#\w$]+\??\s*(?:<[^>]*>\s*)?\('
+)
+_CONTROL_KEYWORDS = frozenset({"if", "for", "while", "switch", "catch", "with", "return", "function"})
+_DECORATOR_NAME_RE = re.compile(r'@[\w$.]+')
+
+# Una nuova riga che inizia con queste parole chiude lo statement precedente (ASI)
+_STATEMENT_START_RE = re.compile(
+    r'(?:export|import|function|class|const|let|var|async|interface|type|enum|abstract|declare|namespace)\b|@'
+)
+# ...a meno che la riga precedente non termini con un operatore
+_CONTINUATION_CHARS = frozenset("=,|&?:.+-*<>(")
+
+# Oltre questa lunghezza l'intestazione non è una firma (es. espressioni minificate)
+_MAX_HEADER = 1000
+# Gli oggetti/tipi annidati nelle firme vengono riportati per esteso solo se brevi
+_MAX_INLINE_BLOCK = 200
+
+_NON_JSX_EXTENSIONS = {".ts", ".mts", ".cts"}
+
+# Contesti dei costrutti annidabili saltati da _JsLexer._skip_nested
+_IN_CODE, _IN_TEMPLATE, _IN_JSX_ATTRS, _IN_JSX_CHILDREN = range(4)
+
+
+class _JsLexer:
+    """
+    Scansione lineare del sorgente in un'unica passata.
+    Stringhe, template literal, commenti, regex e JSX vengono saltati senza essere
+    interpretati; i corpi di funzioni e blocchi vengono attraversati contando solo le graffe.
+    Restano le intestazioni degli statement di primo livello (e dei membri di classe),
+    anche se spezzate su più righe.
+    """
+
+    def __init__(self, source: str, jsx: bool):
+        self.src = source
+        self.n = len(source)
+        self.jsx = jsx
+        self.body_skip = _BODY_SKIP_JSX_RE if jsx else _BODY_SKIP_RE
+        self.output: List[str] = []
+
+    # --- Contesto ---
+
+    def _prev_token(self, i: int) -> Tuple[str, str]:
+        """Ultimo carattere significativo prima di i e, se è una parola, la parola intera."""
+        src = self.src
+        j = i - 1
+        while j >= 0 and src[j].isspace():
+            j -= 1
+        if j < 0:
+            return "", ""
+        end = j + 1
+        while j >= 0 and (src[j].isalnum() or src[j] in "_$"):
+            j -= 1
+        return src[end - 1], src[j + 1:end]
+
+    def _in_expression(self, i: int) -> bool:
+        char, word = self._prev_token(i)
+        if not char:
+            return True
+        if word:
+            return word in _EXPRESSION_KEYWORDS
+        return char in _EXPRESSION_CHARS
+
+    def _starts_jsx(self, i: int) -> bool:
+        return self.jsx and _JSX_START_RE.match(self.src, i) is not None and self._in_expression(i)
+
+    # --- Salti ---
+
+    def _skip_string(self, i: int) -> int:
+        return _STRING_RE[self.src[i]].match(self.src, i).end()
+
+    def _skip_template(self, i: int) -> int:
+        """i punta al backtick di apertura; ritorna l'indice dopo quello di chiusura."""
+        return self._skip_nested(i + 1, _IN_TEMPLATE)
+
+    def _skip_comment(self, i: int) -> int:
+        """i punta a '/'; ritorna la fine del commento, oppure i se non è un commento."""
+        src = self.src
+        nxt = src[i + 1] if i + 1 < self.n else ""
+        if nxt == '/':
+            end = src.find('\n', i)
+            return self.n if end < 0 else end
+        if nxt == '*':
+            end = src.find('*/', i + 2)
+            return self.n if end < 0 else end + 2
+        return i
+
+    def _skip_slash(self, i: int) -> int:
+        """Commento, regex letterale o operatore di divisione."""
+        end = self._skip_comment(i)
+        if end != i:
+            return end
+        if self._in_expression(i):
+            m = _REGEX_LITERAL_RE.match(self.src, i)
+            if m:
+                return m.end()
+        return i + 1
+
+    def _skip_code(self, i: int) -> int:
+        """Salta codice fino alla graffa che chiude il blocco corrente; ritorna l'indice successivo."""
+        return self._skip_nested(i, _IN_CODE)
+
+    def _skip_jsx(self, i: int) -> int:
+        """i punta a '<' di un elemento (o fragment) JSX; ritorna l'indice dopo la sua chiusura."""
+        return self._skip_nested(_JSX_NAME_RE.match(self.src, i + 1).end(), _IN_JSX_ATTRS)
+
+    def _skip_nested(self, i: int, context: int) -> int:
+        """
+        Salta il costrutto aperto subito prima di i (context) fino alla sua chiusura.
+        Codice, template literal ed elementi JSX possono contenersi a vicenda a qualsiasi
+        profondità: i contesti aperti stanno su uno stack esplicito, non sullo stack di Python.
+        """
+        src, n, skip = self.src, self.n, self.body_skip
+        # Ogni voce: [contesto, graffe aperte (solo per il codice)]
+        stack = [[context, 0]]
+        while i < n:
+            frame = stack[-1]
+            context = frame[0]
+            closed = False
+
+            if context == _IN_CODE:
+                m = skip.match(src, i)
+                if m:
+                    i = m.end()
+                    if i >= n:
+                        break
+                c = src[i]
+                if c == '{':
+                    frame[1] += 1
+                    i += 1
+                elif c == '}':
+                    i += 1
+                    if frame[1] == 0:
+                        closed = True
+                    else:
+                        frame[1] -= 1
+                elif c == '`':
+                    stack.append([_IN_TEMPLATE, 0])
+                    i += 1
+                elif c == '/':
+                    i = self._skip_slash(i)
+                elif c == '<':
+                    if self._starts_jsx(i):
+                        stack.append([_IN_JSX_ATTRS, 0])
+                        i = _JSX_NAME_RE.match(src, i + 1).end()
+                    else:
+                        i += 1
+                else:
+                    i = self._skip_string(i)
+
+            elif context == _IN_TEMPLATE:
+                i = _TEMPLATE_CHUNK_RE.match(src, i).end()
+                if i >= n:
+                    break
+                if src[i] == '`':
+                    i += 1
+                    closed = True
+                else:
+                    # "${": espressione annidata fino alla graffa di chiusura
+                    stack.append([_IN_CODE, 0])
+                    i += 2
+
+            elif context == _IN_JSX_ATTRS:
+                if src[i].isspace():
+                    i = _WS_RE.match(src, i).end()
+                    if i >= n:
+                        break
+                c = src[i]
+                if c == '>':
+                    frame[0] = _IN_JSX_CHILDREN
+                    i += 1
+                elif src.startswith('/>', i):
+                    i += 2
+                    closed = True
+                elif c == '{':
+                    stack.append([_IN_CODE, 0])
+                    i += 1
+                elif c in '\'"':
+                    i = _JSX_ATTR_STRING_RE[c].match(src, i).end()
+                else:
+                    m = _JSX_ATTR_RE.match(src, i)
+                    i = m.end() if m else i + 1
+
+            else:
+                # Figli JSX: testo, espressioni {...}, elementi annidati, tag di chiusura
+                m = _JSX_TEXT_RE.match(src, i)
+                if m:
+                    i = m.end()
+                    if i >= n:
+                        break
+                if src[i] == '{':
+                    stack.append([_IN_CODE, 0])
+                    i += 1
+                elif src.startswith('</', i):
+                    end = src.find('>', i)
+                    if end < 0:
+                        break
+                    i = end + 1
+                    closed = True
+                else:
+                    stack.append([_IN_JSX_ATTRS, 0])
+                    i = _JSX_NAME_RE.match(src, i + 1).end()
+
+            if closed:
+                stack.pop()
+                if not stack:
+                    return i
+        return n
+
+    # --- Intestazioni ---
+
+    def scan(self) -> List[str]:
+        self._scan_level(0, "", in_class=False)
+        return self.output
+
+    def _scan_level(self, i: int, indent: str, in_class: bool) -> int:
+        """
+        Scandisce gli statement di un livello (file o corpo di classe) fino alla fine
+        del file o alla graffa di chiusura della classe.
+        """
+        src, n = self.src, self.n
+        header: List[str] = []
+        length = 0
+        depth = 0       # parentesi tonde/quadre aperte nell'intestazione
+
+        def append(text: str) -> None:
+            nonlocal length
+            if length <= _MAX_HEADER:
+                header.append(text)
+                length += len(text)
+
+        def finish(terminator: str) -> None:
+            nonlocal length, depth
+            if header and length <= _MAX_HEADER:
+                self._emit_statement("".join(header).strip(), terminator, indent, in_class)
+            header.clear()
+            length = 0
+            depth = 0
+
+        while i < n:
+            c = src[i]
+            if c.isspace():
+                end = _WS_RE.match(src, i).end()
+                if (
+                    depth == 0 and header and header[-1][-1] not in _CONTINUATION_CHARS
+                    and '\n' in src[i:end] and _STATEMENT_START_RE.match(src, end)
+                ):
+                    finish("")
+                elif header and header[-1][-1] not in "([ ":
+                    append(" ")
+                i = end
+            elif c == '/':
+                if src.startswith('/**', i) and not src.startswith('/**/', i):
+                    end = self._skip_comment(i)
+                    if not header:
+                        self.output.extend(indent + line.strip() for line in src[i:end].splitlines())
+                    i = end
+                    continue
+                end = self._skip_slash(i)
+                if end - i > 1 and src[i + 1] not in '/*':
+                    append(src[i:end])
+                elif end == i + 1:
+                    append('/')
+                i = end
+            elif c in '\'"':
+                end = self._skip_string(i)
+                append(src[i:end])
+                i = end
+            elif c == '`':
+                end = self._skip_template(i)
+                append(src[i:end] if end - i <= _MAX_INLINE_BLOCK else "`...`")
+                i = end
+            elif c == '<' and self._starts_jsx(i):
+                i = self._skip_jsx(i)
+                append("<...>")
+            elif c in '([':
+                depth += 1
+                append(c)
+                i += 1
+            elif c in ')]':
+                depth = max(0, depth - 1)
+                if header and header[-1] == " ":
+                    header.pop()
+                    length -= 1
+                if header and header[-1].endswith(','):
+                    header[-1] = header[-1][:-1]
+                append(c)
+                i += 1
+            elif c == '{':
+                kind = self._classify_block("".join(header).strip(), in_class) \
+                    if depth == 0 and length <= _MAX_HEADER else None
+                if kind is None:
+                    # Oggetto letterale, blocco di controllo o espressione: saltato per intero
+                    end = self._skip_code(i + 1)
+                    block = src[i:end]
+                    append(" ".join(block.split()) if len(block) <= _MAX_INLINE_BLOCK else "{...}")
+                    i = end
+                    continue
+                decorators, signature = kind
+                self.output.extend(indent + d for d in decorators)
+                self.output.append(f"{indent}{signature} {{ ... }}")
+                if _CLASS_RE.match(signature):
+                    i = self._scan_level(i + 1, indent + "    ", in_class=True)
+                else:
+                    i = self._skip_code(i + 1)
+                header.clear()
+                length = 0
+            elif c == '}':
+                if in_class:
+                    finish("")
+                    return i + 1
+                # Graffa spaiata al primo livello: si riparte da uno statement nuovo
+                finish("")
+                i += 1
+            elif c == ';' and depth == 0:
+                finish(";")
+                i += 1
+            elif c in ';<':
+                append(c)
+                i += 1
+            else:
+                end = _WORD_RUN_RE.match(src, i).end()
+                append(src[i:end])
+                i = end
+
+        finish("")
+        return n
+
+    @staticmethod
+    def _split_decorators(header: str) -> Tuple[List[str], str]:
+        decorators = []
+        while header.startswith('@'):
+            m = _DECORATOR_NAME_RE.match(header)
+            if not m:
+                break
+            end = m.end()
+            if header.startswith('(', end):
+                depth = 0
+                for j in range(end, len(header)):
+                    if header[j] == '(':
+                        depth += 1
+                    elif header[j] == ')':
+                        depth -= 1
+                        if depth == 0:
+                            end = j + 1
+                            break
+            decorators.append(header[:end])
+            header = header[end:].lstrip()
+        return decorators, header
+
+    def _classify_block(self, header: str, in_class: bool):
+        """Ritorna (decoratori, firma) se l'intestazione che precede '{' è una dichiarazione."""
+        decorators, signature = self._split_decorators(header)
+        if not signature:
+            return None
+        if in_class:
+            first = signature.split(None, 1)[0].split('(', 1)[0]
+            is_member = first not in _CONTROL_KEYWORDS and (
+                _MEMBER_RE.match(signature) or ('=>' in signature and '=' in signature.split('=>', 1)[0])
+            )
+            return (decorators, signature) if is_member else None
+        if (
+            _CLASS_RE.match(signature) or _FUNCTION_RE.match(signature) or _TYPE_RE.match(signature)
+            or (_VARIABLE_RE.match(signature) and '=>' in signature)
+        ):
+            return decorators, signature
+        return None
+
+    def _emit_statement(self, statement: str, terminator: str, indent: str, in_class: bool) -> None:
+        """Statement senza corpo a graffe: export default, alias di tipo, arrow function con espressione."""
+        decorators, statement = self._split_decorators(statement)
+        if not statement:
+            return
+        if in_class:
+            head = statement.split('=', 1)[0]
+            if '=>' in statement and '=' in statement.split('=>', 1)[0]:
+                line = statement.split('=>', 1)[0].rstrip() + " => ..."
+            elif _MEMBER_RE.match(statement) and '(' in head:
+                line = statement + terminator
+            else:
+                return
+        elif _EXPORT_DEFAULT_RE.match(statement) or _TYPE_RE.match(statement) or _FUNCTION_RE.match(statement):
+            line = statement + terminator
+        elif _VARIABLE_RE.match(statement) and '=>' in statement:
+            line = statement.split('=>', 1)[0].rstrip() + " => ..."
+        else:
+            return
+        self.output.extend(indent + d for d in decorators)
+        self.output.append(indent + line)
+
+
 class JavaScriptParser(LanguageParser):
     """
     Parser per JavaScript, TypeScript e React Native (.js, .jsx, .ts, .tsx).
-    Versione 1.1: Logica Regex base + Supporto Export Default.
+    Versione 2.0: lexer a passata singola (tempo lineare anche su bundle minificati)
+    con supporto a firme su più righe, membri di classe e decoratori.
     """
 
+    version = "2"
+
     def parse(self, content: str, file_path: str) -> str:
-        lines = []
-        
-        # Regex patterns per catturare le definizioni strutturali (classi, funzioni, var, tipi)
-        patterns = [
-            # Class definition
-            re.compile(r'^\s*(export\s+)?(default\s+)?(abstract\s+)?class\s+([a-zA-Z0-9_]+)(.*)?\{'),
-            
-            # Function definition standard
-            re.compile(r'^\s*(export\s+)?(default\s+)?(async\s+)?function\s+([a-zA-Z0-9_]+)\s*\(.*'),
-            
-            # Arrow Function / Variable Assignments
-            re.compile(r'^\s*(export\s+)?(const|let|var)\s+([a-zA-Z0-9_]+)\s*=\s*(async\s*)?(\(.*\)|[^=]+)\s*=>.*'),
-            
-            # TypeScript Interfaces & Types
-            re.compile(r'^\s*(export\s+)?(interface|type)\s+([a-zA-Z0-9_]+).*'),
-        ]
-
-        # --- NEW: Regex specifica per Export Default diretto (V2 Feature) ---
-        # Cattura: export default router; | export default MyComponent;
-        # Il (?!...) assicura che non catturi "class" o "function" che sono gestiti meglio dai pattern sopra.
-        re_export_default = re.compile(r'^\s*export\s+default\s+(?!class|function)([a-zA-Z0-9_]+);?')
-
-        # JSDoc pattern
-        in_comment = False
-        source_lines = content.splitlines()
-        
-        for i, line in enumerate(source_lines):
-            stripped = line.strip()
-            
-            # Gestione commenti JSDoc
-            if stripped.startswith("/**"):
-                in_comment = True
-                lines.append(stripped)
-                if stripped.endswith("*/"): 
-                    in_comment = False
-                continue
-            
-            if in_comment:
-                lines.append(stripped)
-                if stripped.endswith("*/"):
-                    in_comment = False
-                continue
-
-            # Ignora commenti single line o righe vuote
-            if not stripped or stripped.startswith("//"):
-                continue
-
-            # --- NEW: Controllo Export Default ---
-            # Se è un export default semplice, lo aggiungiamo così com'è (senza { ... })
-            if re_export_default.match(stripped):
-                lines.append(stripped)
-                continue
-
-            # Verifica patterns standard
-            is_match = False
-            for pattern in patterns:
-                if pattern.match(stripped):
-                    # Pulizia fine riga: se finisce con '{', lo sostituiamo con '...'
-                    clean_line = stripped
-                    if clean_line.endswith("{"):
-                        clean_line = clean_line[:-1].strip()
-                    
-                    # Aggiunge firma + { ... } per indicare struttura compressa
-                    lines.append(f"{clean_line} {{ ... }}")
-                    is_match = True
-                    break
-            
-            # Fallback per decoratori
-            if not is_match and stripped.startswith("@"):
-                if i + 1 < len(source_lines) and "class " in source_lines[i+1]:
-                    lines.append(stripped)
+        _, ext = os.path.splitext(file_path)
+        # In TypeScript puro '<' apre generics e type assertion, mai JSX
+        lines = _JsLexer(content, jsx=ext.lower() not in _NON_JSX_EXTENSIONS).scan()
 
         if not lines:
             return f"(No exported functions, classes or components found in {file_path})"
 
-        return "\n".join(lines)
\ No newline at end of file
+        return "\n".join(lines)
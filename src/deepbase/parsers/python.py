@@ -1,52 +1,40 @@
 # src/deepbase/parsers/python.py
 import ast
+import io
+import itertools
 import os
-from .interface import LanguageParser
+import tokenize
+from functools import lru_cache
+from typing import Optional
+from .interface import LanguageParser, iter_lines
 
 def _extract_module_comments(source: str) -> str:
     """
     Estrae i commenti # e la docstring di modulo dalle prime righe del sorgente.
+    La tokenizzazione si ferma al primo token di codice: il resto del file non viene letto.
     """
-    lines = []
-    in_docstring = False
-    docstring_char = None
-    source_lines = source.splitlines()
-
-    for line in source_lines:
-        stripped = line.strip()
-
-        # Riga vuota: la includiamo solo se siamo già dentro i commenti iniziali
-        if not stripped:
-            if lines:
-                lines.append("")
-            continue
-
-        # Commenti # semplici
-        if stripped.startswith("#") and not in_docstring:
-            lines.append(line.rstrip())
-            continue
-
-        # Inizio docstring di modulo (""" o ''')
-        if not in_docstring and (stripped.startswith('"""') or stripped.startswith("'''")):
-            docstring_char = stripped[:3]
-            in_docstring = True
-            lines.append(line.rstrip())
-            # Docstring su singola riga
-            rest = stripped[3:]
-            if rest.endswith(docstring_char) and len(rest) >= 3:
-                in_docstring = False
-            continue
-
-        if in_docstring:
-            lines.append(line.rstrip())
-            if stripped.endswith(docstring_char):
-                in_docstring = False
-            continue
-
-        # Qualsiasi altra cosa: fine dell'header
-        break
-
-    # Rimuovi trailing blank lines
+    end_line = 0
+    pending_string = 0
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type == tokenize.COMMENT:
+                end_line = tok.end[0]
+            elif tok.type == tokenize.STRING:
+                # È una docstring solo se lo statement termina con la stringa
+                pending_string = tok.end[0]
+            elif tok.type == tokenize.NEWLINE and pending_string:
+                end_line = pending_string
+                pending_string = 0
+            elif tok.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.ENCODING):
+                break
+    except (tokenize.TokenError, SyntaxError):
+        pass
+
+    lines = [line.rstrip() for line in itertools.islice(iter_lines(source), end_line)]
+
+    # Rimuovi blank lines iniziali e finali
+    while lines and not lines[0].strip():
+        lines.pop(0)
     while lines and not lines[-1].strip():
         lines.pop()
 
@@ -179,27 +167,121 @@ class LightVisitor(ast.NodeVisitor):
                 self.visit(child)
 
 
+class ToonVisitor(ast.NodeVisitor):
+    """
+    Visita l'AST e produce lo scheletro TOON (classi, funzioni, prima riga delle docstring).
+    """
+
+    def __init__(self):
+        self.output = []
+        self.indent_level = 0
+
+    def _log(self, text):
+        indent = "  " * self.indent_level
+        self.output.append(f"{indent}{text}")
+
+    def visit_ClassDef(self, node):
+        bases = [b.id for b in node.bases if isinstance(b, ast.Name)]
+        base_str = f"({', '.join(bases)})" if bases else ""
+        self._log(f"C: {node.name}{base_str}")
+
+        self.indent_level += 1
+        docstring = ast.get_docstring(node)
+        if docstring:
+            short_doc = docstring.split('\n')[0].strip()
+            self._log(f"\"\"\"{short_doc}...\"\"\"")
+
+        self.generic_visit(node)
+        self.indent_level -= 1
+
+    def visit_FunctionDef(self, node):
+        self._handle_function(node)
+
+    def visit_AsyncFunctionDef(self, node):
+        self._handle_function(node, is_async=True)
+
+    def _handle_function(self, node, is_async=False):
+        args = [arg.arg for arg in node.args.args]
+        args_str = ", ".join(args)
+        prefix = "async " if is_async else ""
+        self._log(f"{prefix}F: {node.name}({args_str})")
+        
+        docstring = ast.get_docstring(node)
+        if docstring:
+            self.indent_level += 1
+            short_doc = docstring.split('\n')[0].strip()
+            self._log(f"\"\"\"{short_doc}...\"\"\"")
+            self.indent_level -= 1
+
+    def generic_visit(self, node):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.visit(child)
+
+
+class PythonAnalysis:
+    """
+    Analisi condivisa di un sorgente Python: un solo ast.parse e una sola tokenizzazione
+    dell'header. Light, TOON e stime dei token vengono generati da qui e memorizzati.
+    """
+
+    def __init__(self, source: str):
+        self.tree: Optional[ast.Module] = None
+        self.error: Optional[Exception] = None
+        try:
+            self.tree = ast.parse(source)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            self.error = e
+        self.module_header = _extract_module_comments(source) if self.tree is not None else ""
+        self._signatures: Optional[str] = None
+        self._toon: Optional[str] = None
+
+    @property
+    def signatures(self) -> str:
+        if self._signatures is None:
+            visitor = LightVisitor()
+            visitor.visit(self.tree)
+            self._signatures = "\n".join(visitor.output)
+        return self._signatures
+
+    @property
+    def toon(self) -> str:
+        if self._toon is None:
+            visitor = ToonVisitor()
+            visitor.visit(self.tree)
+            self._toon = "\n".join(visitor.output)
+        return self._toon
+
+    def light(self, filename: str) -> str:
+        parts = []
+        if self.module_header:
+            parts.append(self.module_header)
+        if self.signatures:
+            parts.append(self.signatures)
+
+        result = "\n\n".join(parts)
+        return result.strip() or f"(No functions or classes found in {filename})"
+
+
+# Una sola voce: le rappresentazioni dello stesso file vengono generate una dopo l'altra,
+# e la cache non deve tenere in vita sorgenti e AST di altri file (in ogni worker)
+@lru_cache(maxsize=1)
+def analyze_python(source: str) -> PythonAnalysis:
+    """Analisi del sorgente, riusata dalle rappresentazioni dello stesso contenuto generate di seguito."""
+    return PythonAnalysis(source)
+
+
 class PythonParser(LanguageParser):
+    version = "2"
+
     def parse(self, content: str, file_path: str) -> str:
         filename = os.path.basename(file_path)
-        try:
-            tree = ast.parse(content)
-            visitor = LightVisitor()
-            visitor.visit(tree)
-            signatures = "\n".join(visitor.output)
-
-            # Prepend commenti/docstring iniziali del modulo
-            module_header = _extract_module_comments(content)
-            
-            parts = []
-            if module_header:
-                parts.append(module_header)
-            if signatures:
-                parts.append(signatures)
-                
-            result = "\n\n".join(parts)
-            return result.strip() or f"(No functions or classes found in {filename})"
-        except SyntaxError:
+        analysis = analyze_python(content)
+        if isinstance(analysis.error, SyntaxError):
             return f"(Syntax Error parsing {filename})"
+        if analysis.error is not None:
+            return f"(Error parsing Python file: {analysis.error})"
+        try:
+            return analysis.light(filename)
         except Exception as e:
-            return f"(Error parsing Python file: {e})"
\ No newline at end of file
+            return f"(Error parsing Python file: {e})"
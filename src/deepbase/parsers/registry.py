@@ -4,6 +4,10 @@ from typing import Dict, Set
 from .interface import LanguageParser
 from .python import PythonParser
 from .javascript import JavaScriptParser  # <--- NUOVO IMPORT
+from .java import JavaParser, KotlinParser
+from .go import GoParser
+from .rust import RustParser
+from .cfamily import CParser, CSharpParser
 from .document import MarkdownParser, LatexParser
 from .fallback import FallbackParser
 
@@ -22,6 +26,18 @@ class ParserRegistry:
         for ext in ['.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs']:
             self.register_parser(ext, js_parser)
         
+        # --- Linguaggi a graffe (JVM, Go, Rust, famiglia C) ---
+        self.register_parser('.java', JavaParser())
+        kotlin_parser = KotlinParser()
+        for ext in ['.kt', '.kts']:
+            self.register_parser(ext, kotlin_parser)
+        self.register_parser('.go', GoParser())
+        self.register_parser('.rs', RustParser())
+        c_parser = CParser()
+        for ext in ['.c', '.h', '.cc', '.cpp', '.cxx', '.hh', '.hpp', '.hxx']:
+            self.register_parser(ext, c_parser)
+        self.register_parser('.cs', CSharpParser())
+
         # --- Documentazione ---
         md_parser = MarkdownParser()
         self.register_parser('.md', md_parser)
@@ -46,6 +62,17 @@ class ParserRegistry:
             
         return self._fallback
 
+    def parser_id(self, file_path: str) -> str:
+        """Identità del parser usato per file_path (nome + versione), per la cache persistente."""
+        parser = self.get_parser(file_path)
+        return f"{type(parser).__name__}@{parser.version}"
+
+    def fingerprint(self) -> str:
+        """Identità di tutti i parser registrati: cambia se un parser viene aggiornato."""
+        parsers = [f"{ext}={type(p).__name__}@{p.version}" for ext, p in self._parsers.items()]
+        parsers.append(f"*={type(self._fallback).__name__}@{self._fallback.version}")
+        return ",".join(sorted(parsers))
+
     def parse_file(self, file_path: str, content: str) -> str:
         parser = self.get_parser(file_path)
         return parser.parse(content, file_path)
@@ -0,0 +1,58 @@
+# src/deepbase/parsers/rust.py
+"""
+Parser light per Rust: funzioni, struct/enum/union, alias di tipo,
+e i membri di impl, trait, mod e blocchi extern. Gli attributi #[...] vengono omessi.
+"""
+
+import re
+from typing import Optional
+from .clike import BraceLanguageParser
+
+# Modificatori che possono precedere la parola chiave di un item
+_MODIFIERS_RE = re.compile(
+    r'^(?:pub(?:\s*\([^)]*\))?\s*|unsafe\s+|default\s+|async\s+|const\s+(?=fn\b|unsafe\b|async\b|extern\b)'
+    r'|extern\s*(?:"[^"]*")?\s*)*'
+)
+
+_KEYWORD_RE = re.compile(r'[a-z_]+\b')
+
+
+def _item_keyword(header: str) -> str:
+    m = _KEYWORD_RE.match(header, _MODIFIERS_RE.match(header).end())
+    return m.group(0) if m else ""
+
+
+class RustParser(BraceLanguageParser):
+    literals = {
+        '"': re.compile(r'"(?:[^"\\]|\\.)*"?', re.DOTALL),
+        "'": re.compile(r"'(?:[^'\\\n]|\\.[^'\n]{0,8})'"),
+    }
+    hash_attributes = True
+
+    def raw_literal_end(self, src: str, i: int) -> Optional[int]:
+        # r"...", r#"..."#, br##"..."##
+        j = i
+        while j > 0 and src[j - 1] == '#':
+            j -= 1
+        start = j - 1
+        if start < 0 or src[start] != 'r':
+            return None
+        if start > 0 and src[start - 1] == 'b':
+            start -= 1
+        if start > 0 and (src[start - 1].isalnum() or src[start - 1] == '_'):
+            return None
+        close = '"' + '#' * (i - j)
+        end = src.find(close, i + 1)
+        return len(src) if end < 0 else end + len(close)
+
+    def is_container(self, header: str) -> bool:
+        keyword = _item_keyword(header)
+        return keyword in ("impl", "trait", "mod") or (not keyword and header.startswith("extern"))
+
+    def is_block_signature(self, header: str, in_container: bool) -> bool:
+        return _item_keyword(header) in ("fn", "struct", "enum", "union")
+
+    def format_statement(self, header: str, terminator: str, in_container: bool) -> Optional[str]:
+        if _item_keyword(header) in ("fn", "struct", "type"):
+            return header + terminator
+        return None
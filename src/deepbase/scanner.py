@@ -0,0 +1,625 @@
+# src/deepbase/scanner.py
+"""
+Motore di scansione di DeepBase.
+Visita il progetto una sola volta e costruisce un record per ogni file significativo:
+statistiche, albero e sezione FILE CONTENTS vengono poi generati da questi record
+senza rileggere né riparsare i file.
+"""
+
+import os
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple, Union, Callable, Iterator, TYPE_CHECKING
+
+from deepbase.toon import generate_light_representation
+from deepbase.database import get_database_schema, generate_database_context_full
+from deepbase.matcher import PathMatcher
+from deepbase.gitindex import GitFilter
+from deepbase.cache import ParseCache
+from deepbase.parsers.registry import registry
+from deepbase.encoding import encoding_cache, decode_bytes, detect_window_encoding, trim_window_start, tail_encoding
+from deepbase.tokens import estimator, category_for
+from deepbase.shards import is_shard_name
+from deepbase.export import index_path_for
+from deepbase.sniff import (
+    KIND_TEXT, KIND_DATABASE, KIND_BINARY, SNIFF_BYTES,
+    sniff_kind, is_database_file, is_binary_data, may_be_database
+)
+
+if TYPE_CHECKING:
+    from deepbase.incremental import Manifest
+
+
+@dataclass
+class FileRecord:
+    path: str
+    rel_path: str
+    name: str
+    size: int
+    kind: str                           # KIND_TEXT | KIND_DATABASE | KIND_BINARY (vedi deepbase.sniff)
+    mtime: float = 0.0
+    mtime_ns: int = 0
+    encoding: Optional[str] = None
+    light_size: Optional[int] = None
+    light_repr: Optional[str] = None
+    max_bytes: Optional[int] = None     # valorizzato solo se il file supera il limite configurato
+    tokens: Optional[int] = None        # token del contenuto completo, se il file è stato letto
+    light_tokens: Optional[int] = None
+    duplicate_of: Optional[str] = None  # rel_path del primo file emesso con lo stesso contenuto
+    similar_to: Optional[str] = None    # rel_path del rappresentante del gruppo (--collapse-similar)
+    reference_size: int = 0             # byte della riga di riferimento che sostituisce un duplicato
+
+    @property
+    def truncated(self) -> bool:
+        return self.max_bytes is not None
+
+    @property
+    def stats_size(self) -> int:
+        """Dimensione usata per percentuali e stime token (light se disponibile)."""
+        if self.kind == KIND_BINARY:
+            # I file binari compaiono nell'albero ma non vengono mai emessi
+            return 0
+        if self.duplicate_of is not None:
+            # Un duplicato occupa nel documento solo la riga di riferimento
+            return self.reference_size
+        if self.light_size is not None:
+            return self.light_size
+        return min(self.size, self.max_bytes) if self.truncated else self.size
+
+    @property
+    def stats_tokens(self) -> int:
+        """Token stimati della stessa rappresentazione di stats_size."""
+        if self.kind == KIND_BINARY:
+            return 0
+        if self.duplicate_of is not None:
+            return estimator.estimate_size(self.reference_size)
+        if self.light_size is not None:
+            if self.light_tokens is not None:
+                return self.light_tokens
+            return estimator.estimate_size(self.light_size, self.name)
+        if self.tokens is not None:
+            return self.tokens
+        return estimator.estimate_size(self.stats_size, self.name)
+
+
+@dataclass
+class DirNode:
+    path: str
+    rel_path: str
+    name: str
+    entries: List[Union["DirNode", FileRecord]] = field(default_factory=list)
+    size: int = 0
+    raw_size: int = 0
+    tokens: int = 0
+    mtime_ns: int = 0                   # valorizzato solo nelle scansioni incrementali
+
+
+@dataclass
+class ScanResult:
+    root: DirNode
+    files: List[FileRecord]
+
+    @property
+    def total_size(self) -> int:
+        return self.root.size
+
+    @property
+    def raw_size(self) -> int:
+        return self.root.raw_size
+
+    @property
+    def total_tokens(self) -> int:
+        return self.root.tokens
+
+
+# --- FILTRI ---
+
+@lru_cache(maxsize=8)
+def _output_names(output_name: str) -> frozenset:
+    """Nome dell'output e dei file esatti derivati da esso (manifest di --incremental, indice di --index)."""
+    # Import locale: incremental importa scanner
+    from deepbase.incremental import manifest_path_for
+    return frozenset((output_name, manifest_path_for(output_name), index_path_for(output_name)))
+
+
+def _is_excluded(rel_path: str, file_name: str, matcher: PathMatcher, output_file_abs: Optional[str]) -> bool:
+    # Il confronto sul nome copre anche il caso del percorso assoluto coincidente,
+    # più i file derivati dall'output e gli shard di --shard-tokens
+    if output_file_abs:
+        output_name = os.path.basename(output_file_abs)
+        if file_name in _output_names(output_name) or is_shard_name(file_name, output_name):
+            return True
+    return matcher.ignores_file(rel_path, file_name)
+
+
+def _has_significant_name(file_name: str, config: Dict[str, Any]) -> bool:
+    significant_extensions = config["significant_extensions"]
+    if file_name in significant_extensions:
+        return True
+    _, ext = os.path.splitext(file_name)
+    return ext in significant_extensions
+
+
+def is_significant_file(
+    file_path: str,
+    config: Dict[str, Any],
+    root_dir: str = "",
+    output_file_abs: str = None,
+    matcher: Optional[PathMatcher] = None
+) -> bool:
+    file_name = os.path.basename(file_path)
+    rel_path = os.path.relpath(file_path, root_dir).replace(os.sep, '/') if root_dir else file_name
+    if matcher is None:
+        matcher = PathMatcher.from_config(config)
+    if _is_excluded(rel_path, file_name, matcher, output_file_abs):
+        return False
+    return _has_significant_name(file_name, config) or is_database_file(file_path)
+
+
+# --- LETTURA ---
+
+def file_byte_limit(config: Dict[str, Any], file_path: str = "") -> Optional[int]:
+    """
+    Limite in byte per il file file_path da max_file_bytes / max_file_tokens; i token vengono
+    convertiti in byte con il rapporto byte/token dello stimatore per quel tipo di file.
+    Ritorna None se nessun limite è configurato.
+    """
+    limits = []
+    if config.get("max_file_bytes"):
+        limits.append(config["max_file_bytes"])
+    if config.get("max_file_tokens"):
+        limits.append(estimator.bytes_for_tokens(config["max_file_tokens"], file_path))
+    return min(limits) if limits else None
+
+
+# Oltre questa dimensione i file vengono letti tramite mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def _truncation_notice(omitted: int, size: int) -> str:
+    return f"\n\n... [TRUNCATED: {omitted:,} of {size:,} bytes omitted] ...\n\n"
+
+
+def read_text_windows(
+    file_path: str,
+    max_bytes: Optional[int] = None
+) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """
+    Legge un file di testo rilevandone l'encoding.
+    Ritorna: (testo, avviso, coda, encoding). Se il file supera max_bytes vengono lette solo
+    due finestre: testo è la testa, avviso il segnaposto della parte omessa e coda la fine
+    del file (il file non viene mai caricato per intero in memoria); altrimenti avviso e
+    coda sono None. testo è None se il file risulta binario (non viene né decodificato né
+    parsato); encoding è None se la lettura fallisce.
+    """
+    try:
+        with open(file_path, "rb") as fb:
+            st = os.fstat(fb.fileno())
+            size = st.st_size
+            cache_key = (file_path, size, st.st_mtime_ns)
+            encoding = encoding_cache.get(cache_key)
+
+            if max_bytes is None or size <= max_bytes:
+                if size >= MMAP_THRESHOLD:
+                    # File grande: sniffing e decodifica lavorano sul buffer mappato, senza copia in bytes
+                    with mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as raw_data:
+                        if is_binary_data(raw_data[:SNIFF_BYTES]):
+                            return None, None, None, None
+                        content, encoding = decode_bytes(raw_data, encoding)
+                else:
+                    raw_data = fb.read()
+                    if is_binary_data(raw_data[:SNIFF_BYTES]):
+                        return None, None, None, None
+                    content, encoding = decode_bytes(raw_data, encoding)
+                encoding_cache.put(cache_key, encoding)
+                return content, None, None, encoding
+
+            tail_len = max_bytes // 2
+            head = fb.read(max_bytes - tail_len)
+            if is_binary_data(head[:SNIFF_BYTES]):
+                return None, None, None, None
+            fb.seek(size - tail_len)
+            tail = fb.read(tail_len)
+
+        # Stesso encoding per le due finestre, verificato su entrambe
+        if encoding is None:
+            encoding = detect_window_encoding(head, tail)
+            encoding_cache.put(cache_key, encoding)
+        tail = trim_window_start(tail, encoding)
+        return (
+            head.decode(encoding, errors="replace"),
+            _truncation_notice(size - len(head) - len(tail), size),
+            tail.decode(tail_encoding(head, encoding), errors="replace"),
+            encoding
+        )
+    except Exception as e:
+        return f"!!! Error reading file: {e} !!!", None, None, None
+
+
+def read_text_file(file_path: str, max_bytes: Optional[int] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Legge un file di testo rilevandone l'encoding.
+    Ritorna: (contenuto, encoding) — encoding è None se la lettura fallisce,
+    contenuto è None se il file risulta binario (non viene né decodificato né parsato).
+    Se il file supera max_bytes contiene testa e coda separate dall'avviso di troncamento.
+    """
+    content, notice, tail, encoding = read_text_windows(file_path, max_bytes)
+    if notice is not None:
+        content = content + notice + tail
+    return content, encoding
+
+
+def _complete_head(head: str) -> str:
+    """
+    Testa di un file troncato fino all'ultima riga al livello più esterno (non indentata):
+    i blocchi precedenti sono completi, quindi il taglio non produce errori di sintassi.
+    """
+    for i in range(len(head) - 2, -1, -1):
+        if head[i] == "\n" and head[i + 1] not in " \t\r\n":
+            return head[:i + 1]
+    return head[:head.rfind("\n") + 1]
+
+
+def light_representation(file_path: str, text: str, notice: Optional[str] = None) -> str:
+    """
+    Rappresentazione light di un file letto con read_text_windows. Se il file è troncato
+    (notice presente) si parsa solo la testa, mai il testo con l'avviso in mezzo.
+    """
+    if notice is None:
+        return generate_light_representation(file_path, text)
+    return generate_light_representation(file_path, _complete_head(text)) + notice.rstrip("\n") + "\n"
+
+
+def read_file_content(file_path: str, max_bytes: Optional[int] = None) -> str:
+    if is_database_file(file_path):
+        try:
+            schema = get_database_schema(file_path)
+            return generate_database_context_full(schema, os.path.basename(file_path))
+        except Exception as e:
+            return f"!!! Error reading database: {e} !!!"
+    content, _ = read_text_file(file_path, max_bytes)
+    if content is None:
+        return f"(Binary file, {os.path.getsize(file_path):,} bytes — content omitted)"
+    return content
+
+
+def read_record_content(record: FileRecord) -> Optional[str]:
+    """
+    Legge il contenuto testuale di un record.
+    Se il file si rivela binario il record viene marcato KIND_BINARY e ritorna None.
+    """
+    if record.kind == KIND_BINARY:
+        return None
+    content, encoding = read_text_file(record.path, record.max_bytes)
+    if content is None:
+        record.kind = KIND_BINARY
+        return None
+    record.encoding = encoding
+    return content
+
+
+# --- ELABORAZIONE PARALLELA ---
+
+def _parallel_map(fn: Callable, items: list, jobs: int) -> Iterator:
+    """
+    Come map(fn, items), ma con jobs > 1 distribuisce il lavoro su un ProcessPoolExecutor.
+    I risultati arrivano sempre nell'ordine di items. In volo ci sono al più jobs * 4 lavori:
+    i risultati non ancora consumati (contenuti interi dei file) non si accumulano in memoria.
+    """
+    if jobs <= 1 or len(items) < 2:
+        yield from map(fn, items)
+        return
+    remaining = iter(items)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque(pool.submit(fn, item) for item in islice(remaining, jobs * 4))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(remaining, 1):
+                    pending.append(pool.submit(fn, item))
+                yield result
+        finally:
+            # Consumatore interrotto: i lavori non ancora avviati non servono più
+            for future in pending:
+                future.cancel()
+
+
+def _read_task(task: Tuple[str, Optional[int]]) -> Tuple[Optional[str], Optional[str]]:
+    path, max_bytes = task
+    return read_text_file(path, max_bytes)
+
+
+def _light_task(task: Tuple[str, Optional[int], int, int, Optional[str]]) -> Tuple[Optional[str], Optional[str], int]:
+    """Rappresentazione light, encoding e token del contenuto completo (letto comunque per il parsing)."""
+    path, max_bytes, size, mtime_ns, vocab_path = task
+    if vocab_path is not None and estimator.vocab_path != vocab_path:
+        # Worker avviati con spawn: il vocabolario va ricaricato nel processo
+        estimator.load_vocabulary(vocab_path)
+    head, notice, tail, encoding = read_text_windows(path, max_bytes)
+    if head is None:
+        return None, None, 0
+    content = head if notice is None else head + notice + tail
+    light_repr = light_representation(path, head, notice)
+    return light_repr, encoding, estimator.count_file(path, size, mtime_ns, content)
+
+
+def _light_cache_key(record: FileRecord, cache: ParseCache) -> Optional[str]:
+    content_hash = cache.content_hash(record.path, record.size, record.mtime_ns)
+    if content_hash is None:
+        return None
+    # Il metodo di conteggio fa parte della chiave: cambiando vocabolario i token vanno ricalcolati
+    mode = f"light|{estimator.fingerprint}|{category_for(record.path)}"
+    return cache.make_key(content_hash, registry.parser_id(record.path), mode, record.max_bytes)
+
+
+def _set_light(record: FileRecord, light_repr: str, encoding: Optional[str], tokens: Optional[int]) -> None:
+    record.encoding = encoding
+    record.light_repr = light_repr
+    record.light_size = len(light_repr.encode("utf-8"))
+    record.light_tokens = estimator.count(light_repr, record.path)
+    record.tokens = tokens
+
+
+def render_light_records(records: List[FileRecord], jobs: int = 1, cache: Optional[ParseCache] = None) -> None:
+    """
+    Calcola la rappresentazione light dei record di testo (in parallelo con jobs > 1).
+    Con cache vengono parsati solo i file il cui contenuto non è già in cache.
+    """
+    keys: Dict[int, str] = {}
+    pending = records
+    if cache is not None:
+        pending = []
+        for record in records:
+            key = _light_cache_key(record, cache)
+            cached = cache.get(key) if key is not None else None
+            if cached is None:
+                if key is not None:
+                    keys[id(record)] = key
+                pending.append(record)
+                continue
+            light_repr, encoding, tokens = cached
+            _set_light(record, light_repr, encoding, tokens)
+            if encoding is not None:
+                # Le letture complete successive riusano l'encoding senza rilevarlo di nuovo
+                encoding_cache.put((record.path, record.size, record.mtime_ns), encoding)
+
+    # Contenuti identici (stessa chiave di cache) vengono parsati una sola volta
+    first_by_key: Dict[str, FileRecord] = {}
+    copies: List[Tuple[FileRecord, FileRecord]] = []
+    unique = []
+    for record in pending:
+        key = keys.get(id(record))
+        if key is not None and key in first_by_key:
+            copies.append((record, first_by_key[key]))
+            continue
+        if key is not None:
+            first_by_key[key] = record
+        unique.append(record)
+    pending = unique
+
+    tasks = [(r.path, r.max_bytes, r.size, r.mtime_ns, estimator.vocab_path) for r in pending]
+    for record, (light_repr, encoding, tokens) in zip(pending, _parallel_map(_light_task, tasks, jobs)):
+        if light_repr is None:
+            record.kind = KIND_BINARY
+            continue
+        _set_light(record, light_repr, encoding, tokens)
+        key = keys.get(id(record))
+        if key is not None and encoding is not None:
+            cache.put(key, light_repr, encoding, tokens)
+
+    for record, original in copies:
+        if original.light_repr is None:
+            record.kind = original.kind
+        else:
+            _set_light(record, original.light_repr, original.encoding, original.tokens)
+
+
+def iter_record_contents(records: List[FileRecord], jobs: int = 1) -> Iterator[Optional[str]]:
+    """
+    Legge i contenuti completi dei record, nello stesso ordine di records.
+    Con jobs > 1 la lettura avviene su più processi; i file binari producono None.
+    """
+    tasks = [(r.path, r.max_bytes) for r in records]
+    for record, (content, encoding) in zip(records, _parallel_map(_read_task, tasks, jobs)):
+        if content is None:
+            record.kind = KIND_BINARY
+        else:
+            record.encoding = encoding
+        yield content
+
+
+# --- SCANSIONE ---
+
+def _list_dir(path: str) -> List[os.DirEntry]:
+    """
+    Elenca una directory con os.scandir, ordinata per nome.
+    I DirEntry conservano tipo e stat, così ogni voce costa al massimo una stat per run.
+    """
+    try:
+        with os.scandir(path) as it:
+            return sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _collect_dir(
+    node: DirNode,
+    config: Dict[str, Any],
+    matcher: PathMatcher,
+    output_file_abs: str,
+    git_filter: Optional[GitFilter] = None
+) -> List[Union[DirNode, FileRecord]]:
+    """
+    Elenca e filtra una singola directory.
+    Non tocca lo stato condiviso, quindi può girare su un thread del pool.
+    """
+    entries: List[Union[DirNode, FileRecord]] = []
+    for entry in _list_dir(node.path):
+        item = entry.name
+        rel_path = f"{node.rel_path}/{item}" if node.rel_path else item
+
+        if _is_dir(entry):
+            if item.startswith('.') or matcher.ignores_dir(rel_path, item):
+                continue
+            # Le directory senza file tracciati non vengono nemmeno elencate
+            if git_filter is not None and not git_filter.allows_dir(rel_path):
+                continue
+            entries.append(DirNode(entry.path, rel_path, item))
+        elif git_filter is not None and not git_filter.allows_file(rel_path):
+            continue
+        elif not _is_excluded(rel_path, item, matcher, output_file_abs):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            # Il tipo viene dalla sniff cache: i sorgenti noti non vengono mai aperti, gli altri
+            # file (formati di dati, possibili database) solo se possono entrare nell'output
+            significant = _has_significant_name(item, config)
+            if not significant and not may_be_database(entry.path):
+                continue
+            kind = sniff_kind(entry.path, st)
+            if kind != KIND_DATABASE and not significant:
+                continue
+            entries.append(FileRecord(
+                entry.path, rel_path, item, st.st_size, kind, mtime=st.st_mtime, mtime_ns=st.st_mtime_ns
+            ))
+    return entries
+
+
+def _collect_incremental(
+    node: DirNode,
+    collect: Callable[[DirNode], list],
+    previous: Optional["Manifest"]
+) -> List[Union[DirNode, FileRecord]]:
+    """Registra l'mtime della directory e, se è invariata dal run precedente, evita di elencarla."""
+    try:
+        node.mtime_ns = os.stat(node.path).st_mtime_ns
+    except OSError:
+        return []
+    if previous is not None:
+        entries = previous.known_entries(node)
+        if entries is not None:
+            return entries
+    return collect(node)
+
+
+def _walk(root: DirNode, collect: Callable[[DirNode], list], walk_workers: int) -> None:
+    """
+    Popola l'albero a partire da root.
+    Con walk_workers > 1 le directory sorelle vengono elencate in parallelo:
+    ogni risultato viene agganciato al proprio nodo, quindi la struttura finale
+    (e l'ordine dell'output) è identica a quella della visita sequenziale.
+    """
+    if walk_workers <= 1:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.entries = collect(node)
+            stack.extend(e for e in node.entries if isinstance(e, DirNode))
+        return
+
+    with ThreadPoolExecutor(max_workers=walk_workers) as pool:
+        pending = {pool.submit(collect, root): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = pending.pop(future)
+                node.entries = future.result()
+                for child in node.entries:
+                    if isinstance(child, DirNode):
+                        pending[pool.submit(collect, child)] = child
+
+
+def preorder_dirs(root: DirNode) -> List[DirNode]:
+    """Directory dell'albero in preordine (stesso ordine della sezione FILE CONTENTS)."""
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(reversed([e for e in node.entries if isinstance(e, DirNode)]))
+    return nodes
+
+
+def scan_project(
+    root_dir: str,
+    config: Dict[str, Any],
+    output_file_abs: str,
+    light_mode: bool = False,
+    matcher: Optional[PathMatcher] = None,
+    walk_workers: int = 1,
+    git_filter: Optional[GitFilter] = None,
+    jobs: int = 1,
+    cache: Optional[ParseCache] = None,
+    incremental: bool = False,
+    previous: Optional["Manifest"] = None
+) -> ScanResult:
+    """
+    Visita il progetto una sola volta e ritorna l'albero dei record.
+    In light mode ogni file di testo viene letto e parsato qui, una sola volta
+    (su jobs processi se jobs > 1).
+    Con git_filter vengono considerati solo i file tracciati nell'indice di git.
+    Con cache le rappresentazioni light dei file invariati vengono lette dalla cache persistente.
+    Con incremental vengono registrati gli mtime delle directory; con previous (manifest del
+    run precedente) le directory invariate non vengono elencate e i file invariati non vengono parsati.
+    """
+    if matcher is None:
+        matcher = PathMatcher.from_config(config)
+    root = DirNode(root_dir, "", os.path.basename(os.path.abspath(root_dir)) or ".")
+    collect = lambda node: _collect_dir(node, config, matcher, output_file_abs, git_filter)
+    if incremental:
+        collect = lambda node, _collect=collect: _collect_incremental(node, _collect, previous)
+    _walk(root, collect, walk_workers)
+
+    # Ordine dei contenuti: prima i file della directory, poi le sottodirectory
+    nodes = preorder_dirs(root)
+    files = [e for node in nodes for e in node.entries if isinstance(e, FileRecord)]
+
+    if config.get("max_file_bytes") or config.get("max_file_tokens"):
+        for record in files:
+            if record.kind != KIND_TEXT:
+                continue
+            limit = file_byte_limit(config, record.path)
+            if record.size > limit:
+                record.max_bytes = limit
+
+    if light_mode:
+        render_light_records([
+            r for r in files
+            if r.kind == KIND_TEXT and (previous is None or not previous.restore_light(r))
+        ], jobs, cache)
+
+    aggregate_stats(root, nodes)
+    return ScanResult(root, files)
+
+
+def aggregate_stats(root: DirNode, nodes: Optional[List[DirNode]] = None) -> None:
+    """
+    Calcola le statistiche delle directory a partire dai file. Si può richiamare dopo aver
+    cambiato i record (es. i duplicati marcati in main): i totali vengono azzerati e rifatti.
+    """
+    if nodes is None:
+        nodes = preorder_dirs(root)
+    # Statistiche bottom-up: i figli vengono sempre visitati prima dei genitori
+    for node in reversed(nodes):
+        node.size = node.raw_size = node.tokens = 0
+        for entry in node.entries:
+            if isinstance(entry, DirNode):
+                node.size += entry.size
+                node.raw_size += entry.raw_size
+                node.tokens += entry.tokens
+            else:
+                node.size += entry.stats_size
+                node.raw_size += entry.size
+                node.tokens += entry.stats_tokens
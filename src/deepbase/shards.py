@@ -0,0 +1,122 @@
+# src/deepbase/shards.py
+"""
+Output a shard per --shard-tokens: le sezioni FILE CONTENTS vengono distribuite
+in file numerati (llm_context.part001.md, ...) di al più N token ciascuno, senza
+mai spezzare un file. Ogni shard ripete un'intestazione compatta e riporta
+l'elenco dei file che contiene.
+
+I corpi vengono prodotti in ordine dal chiamante; appena uno shard è completo
+viene scritto (ed eventualmente compresso) da un thread separato, mentre il
+rendering prosegue con lo shard successivo.
+"""
+
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from deepbase.output import COMPRESSION_SUFFIXES, open_output, output_path_for
+
+# Shard in scrittura contemporaneamente oltre a quello in costruzione (limita la memoria)
+_MAX_PENDING = 4
+
+
+def shard_path_for(output: str, index: int, compress: Optional[str] = None) -> str:
+    """llm_context.md -> llm_context.part001.md (index parte da 1); con compress llm_context.part001.md.gz."""
+    if compress is not None and output.endswith(COMPRESSION_SUFFIXES[compress]):
+        output = output[:-len(COMPRESSION_SUFFIXES[compress])]
+    stem, ext = os.path.splitext(output)
+    return output_path_for(f"{stem}.part{index:03d}{ext}", compress)
+
+
+def is_shard_name(file_name: str, output_name: str) -> bool:
+    """Vero se file_name è uno shard (anche compresso) dell'output output_name."""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if output_name.endswith(suffix):
+            output_name = output_name[:-len(suffix)]
+    stem, ext = os.path.splitext(output_name)
+    pattern = re.escape(stem) + r"\.part\d{3,}" + re.escape(ext) + r"(\.gz|\.zst)?"
+    return re.fullmatch(pattern, file_name) is not None
+
+
+@dataclass
+class Shard:
+    index: int
+    files: List[str] = field(default_factory=list)
+    sections: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+class ShardWriter:
+    """
+    Accumula sezioni già formattate e le scrive in shard di al più limit token.
+    Una sezione più grande del limite occupa da sola uno shard.
+    render_header(shard) produce l'intestazione di ogni shard (con l'elenco dei suoi file).
+    """
+
+    def __init__(
+        self,
+        output: str,
+        limit: int,
+        render_header: Callable[[Shard], str],
+        compress: Optional[str] = None,
+        workers: int = 2
+    ):
+        self.output = output
+        self.limit = limit
+        self.render_header = render_header
+        self.compress = compress
+        self.paths: List[str] = []
+        self._current = Shard(1)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._pending: List[Future] = []
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True)
+
+    def add(self, rel_path: str, section: str, tokens: int) -> None:
+        if self._current.files and self._current.tokens + tokens > self.limit:
+            self._flush()
+        self._current.files.append(rel_path)
+        self._current.sections.append(section)
+        self._current.tokens += tokens
+
+    def _write(self, shard: Shard, path: str) -> None:
+        with open_output(path, self.compress) as f:
+            f.write(self.render_header(shard))
+            f.writelines(shard.sections)
+
+    def _flush(self) -> None:
+        shard = self._current
+        path = shard_path_for(self.output, shard.index, self.compress)
+        self.paths.append(path)
+        self._pending.append(self._pool.submit(self._write, shard, path))
+        self._current = Shard(shard.index + 1)
+        # Le eccezioni di scrittura emergono qui, non a fine run
+        while len(self._pending) > _MAX_PENDING:
+            self._pending.pop(0).result()
+
+    def close(self) -> List[str]:
+        """Scrive l'ultimo shard, attende le scritture e rimuove gli shard avanzati da run precedenti."""
+        if self._current.files or not self.paths:
+            self._flush()
+        try:
+            for future in self._pending:
+                future.result()
+        finally:
+            self._pool.shutdown(wait=True)
+        index = len(self.paths) + 1
+        while True:
+            stale = shard_path_for(self.output, index, self.compress)
+            if not os.path.exists(stale):
+                break
+            os.remove(stale)
+            index += 1
+        return self.paths
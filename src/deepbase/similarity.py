@@ -0,0 +1,148 @@
+# src/deepbase/similarity.py
+"""
+Raggruppamento dei file quasi identici per --collapse-similar.
+
+Ogni file è l'insieme delle sue righe (senza spazi iniziali e finali): config per
+tenant, migrazioni e schermate generate differiscono in poche righe. La firma è un
+MinHash "one permutation": un solo hash per riga, distribuito in NUM_BINS bin di cui
+si tiene il minimo, quindi O(righe) per file. Con l'LSH a bande i candidati si cercano
+solo tra i file che condividono almeno una banda: nessun confronto tutti-contro-tutti.
+
+I file vengono visitati nell'ordine di emissione; ognuno viene confrontato solo con i
+rappresentanti già emessi e, se abbastanza simile, diventa un membro del loro gruppo,
+mostrato come diff rispetto al rappresentante.
+"""
+
+import difflib
+import zlib
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NUM_BINS = 64
+# I file più corti non vengono raggruppati: un diff non farebbe risparmiare nulla
+MIN_LINES = 8
+
+_EMPTY = 1 << 32
+# Distanza aggiunta ai valori presi in prestito da un altro bin (densificazione)
+_ROTATION = 1 << 26
+
+
+def _line_hashes(text: str) -> List[int]:
+    return [zlib.crc32(line.encode("utf-8", errors="replace")) for line in {l.strip() for l in text.splitlines()} if line]
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """Firma MinHash delle righe di text, oppure None se il file è troppo corto."""
+    hashes = _line_hashes(text)
+    if len(hashes) < MIN_LINES:
+        return None
+    bins = [_EMPTY] * NUM_BINS
+    for h in hashes:
+        index, value = h % NUM_BINS, h // NUM_BINS
+        if value < bins[index]:
+            bins[index] = value
+    # Densificazione: un bin vuoto prende il valore del primo bin pieno che lo segue,
+    # spostato della distanza, così due file simili restano confrontabili bin per bin
+    for i in range(NUM_BINS):
+        if bins[i] == _EMPTY:
+            for step in range(1, NUM_BINS):
+                value = bins[(i + step) % NUM_BINS]
+                if value < _EMPTY:
+                    bins[i] = _EMPTY + value + step * _ROTATION
+                    break
+    return tuple(bins)
+
+
+def estimated_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Stima della similarità di Jaccard tra gli insiemi di righe."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_BINS
+
+
+def band_rows(threshold: float) -> int:
+    """
+    Righe per banda: la più grande per cui la soglia dell'LSH, (1/b)^(1/r), non supera
+    threshold; i candidati oltre la soglia vengono poi verificati sulla firma intera.
+    """
+    rows = 1
+    for r in (2, 4, 8, 16, 32):
+        if (r / NUM_BINS) ** (1 / r) <= threshold:
+            rows = r
+    return rows
+
+
+def find_similar(items: Iterable[Tuple[str, Optional[str]]], threshold: float) -> Dict[str, str]:
+    """
+    items: (rel_path, testo) nell'ordine di emissione (testo None = file da non considerare).
+    Ritorna {membro: rappresentante} per i file con similarità stimata >= threshold
+    rispetto a un file precedente; i rappresentanti non compaiono come chiavi.
+    """
+    rows = band_rows(threshold)
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+    signatures: Dict[str, Tuple[int, ...]] = {}
+    similar_to: Dict[str, str] = {}
+    for rel_path, text in items:
+        sig = signature(text) if text is not None else None
+        if sig is None:
+            continue
+        bands = [(start, sig[start:start + rows]) for start in range(0, NUM_BINS, rows)]
+        best, best_score = None, threshold
+        seen = set()
+        for band in bands:
+            for candidate in buckets.get(band, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                score = estimated_similarity(sig, signatures[candidate])
+                if score >= best_score:
+                    best, best_score = candidate, score
+        if best is not None:
+            similar_to[rel_path] = best
+            continue
+        # Nuovo rappresentante: solo i rappresentanti entrano nei bucket
+        signatures[rel_path] = sig
+        for band in bands:
+            buckets.setdefault(band, []).append(rel_path)
+    return similar_to
+
+
+def compact_diff(original: str, text: str) -> str:
+    """Diff unificato (senza contesto e senza intestazioni) che porta original a text."""
+    lines = difflib.unified_diff(original.splitlines(), text.splitlines(), n=0, lineterm="")
+    # Le prime due righe sono le intestazioni ---/+++; le righe dei hunk possono iniziare
+    # anch'esse con "--" o "++" (commenti SQL) e vanno tenute
+    return "\n".join(islice(lines, 2, None))
+
+
+class SimilarCollapser:
+    """
+    Durante la scrittura tiene in memoria solo il testo dei rappresentanti che hanno
+    ancora membri da emettere, e produce il diff di ogni membro.
+    """
+
+    def __init__(self, similar_to: Dict[str, str]):
+        self.similar_to = similar_to
+        self._pending: Dict[str, int] = {}
+        for representative in similar_to.values():
+            self._pending[representative] = self._pending.get(representative, 0) + 1
+        self._texts: Dict[str, str] = {}
+
+    def diff_for(self, rel_path: str, text: str) -> Optional[str]:
+        """
+        Diff da emettere al posto di text se rel_path è un membro (None altrimenti, o se
+        il diff non è più corto del file). I rappresentanti vengono ricordati per i membri successivi.
+        """
+        if rel_path in self._pending:
+            self._texts[rel_path] = text
+            return None
+        representative = self.similar_to.get(rel_path)
+        if representative is None:
+            return None
+        original = self._texts.get(representative)
+        self._pending[representative] -= 1
+        if self._pending[representative] == 0:
+            self._texts.pop(representative, None)
+            del self._pending[representative]
+        if original is None:
+            return None
+        diff = compact_diff(original, text)
+        return diff if len(diff) < len(text) else None
@@ -0,0 +1,124 @@
+# src/deepbase/sniff.py
+"""
+Riconoscimento del tipo di file (database / binario / testo) con cache per run.
+Ogni file viene aperto al massimo una volta per (path, size, mtime); i file con
+estensioni di codice sorgente note non vengono mai aperti durante la scansione (se
+sono binari lo rileva la lettura del contenuto). Per i formati di dati (un .json
+può essere un blob) si controlla solo che il prefisso non sia binario, mai la firma SQLite.
+"""
+
+import codecs
+import os
+from typing import Dict, Optional, Tuple
+
+KIND_TEXT = "text"
+KIND_DATABASE = "database"
+KIND_BINARY = "binary"
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Byte letti per classificare un file: basta un prefisso, mai il file intero
+SNIFF_BYTES = 8192
+
+# Oltre questa quota di byte "non testuali" nel prefisso il file è considerato binario
+BINARY_RATIO_THRESHOLD = 0.30
+
+# Byte che possono comparire in un file di testo: ASCII stampabile, spazi e
+# controlli comuni, più tutti i byte alti (UTF-8, Latin-1, ...)
+_TEXT_BYTES = bytes(range(32, 127)) + b"\n\r\t\f\b\x1b" + bytes(range(128, 256))
+
+# Con questi BOM i byte NUL sono legittimi (UTF-16 / UTF-32)
+_WIDE_BOMS = (codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+# Estensioni che non possono contenere un database SQLite: nessun accesso al disco
+SOURCE_EXTENSIONS = {
+    ".py", ".pyi", ".java", ".kt", ".kts", ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs",
+    ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".html", ".css", ".scss",
+    ".sql", ".md", ".markdown", ".sh", ".bat", ".txt", ".tex", ".bib", ".sty", ".cls",
+}
+
+# Formati di dati: mai database, ma a volte blob con l'estensione sbagliata.
+# Il prefisso viene letto solo per il controllo dei binari
+DATA_EXTENSIONS = {".json", ".xml", ".yml", ".yaml", ".toml", ".cfg", ".ini"}
+
+
+def is_binary_data(prefix: bytes) -> bool:
+    """
+    Classifica un prefisso di file: binario se contiene byte NUL (salvo BOM UTF-16/32)
+    o se la quota di byte non testuali supera BINARY_RATIO_THRESHOLD.
+    """
+    if not prefix:
+        return False
+    if prefix.startswith(_WIDE_BOMS):
+        return False
+    if b"\0" in prefix:
+        return True
+    non_text = prefix.translate(None, _TEXT_BYTES)
+    return len(non_text) / len(prefix) > BINARY_RATIO_THRESHOLD
+
+
+def may_be_database(file_path: str) -> bool:
+    """Falso per le estensioni di SOURCE_EXTENSIONS e DATA_EXTENSIONS, senza accedere al disco."""
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    return ext not in SOURCE_EXTENSIONS and ext not in DATA_EXTENSIONS
+
+
+def classify_prefix(prefix: bytes, check_database: bool = True) -> str:
+    if check_database and prefix.startswith(SQLITE_HEADER):
+        return KIND_DATABASE
+    if is_binary_data(prefix):
+        return KIND_BINARY
+    return KIND_TEXT
+
+
+def _read_prefix(file_path: str) -> bytes:
+    try:
+        with open(file_path, "rb") as f:
+            return f.read(SNIFF_BYTES)
+    except OSError:
+        return b""
+
+
+class SniffCache:
+    """
+    Cache dei tipi di file, con chiave (path, size, mtime).
+    Se il file cambia su disco la chiave cambia e il file viene riesaminato.
+    """
+
+    def __init__(self):
+        self._kinds: Dict[Tuple[str, int, int], str] = {}
+
+    def sniff(self, file_path: str, st: Optional[os.stat_result] = None) -> str:
+        _, ext = os.path.splitext(file_path)
+        if ext.lower() in SOURCE_EXTENSIONS:
+            return KIND_TEXT
+
+        if st is None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return KIND_TEXT
+
+        key = (file_path, st.st_size, st.st_mtime_ns)
+        kind = self._kinds.get(key)
+        if kind is None:
+            kind = classify_prefix(_read_prefix(file_path), may_be_database(file_path))
+            self._kinds[key] = kind
+        return kind
+
+    def clear(self) -> None:
+        self._kinds.clear()
+
+
+sniff_cache = SniffCache()
+
+
+def sniff_kind(file_path: str, st: Optional[os.stat_result] = None) -> str:
+    return sniff_cache.sniff(file_path, st)
+
+
+def is_database_file(file_path: str, st: Optional[os.stat_result] = None) -> bool:
+    if not may_be_database(file_path):
+        return False
+    return sniff_cache.sniff(file_path, st) == KIND_DATABASE
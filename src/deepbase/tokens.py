@@ -0,0 +1,201 @@
+# src/deepbase/tokens.py
+"""
+Stima dei token, al posto della regola fissa "4 byte per token".
+
+Senza vocabolario la stima è un modello lineare su conteggi di classi di byte
+(parole, cifre, camelCase, punteggiatura, spazi, newline, caratteri multibyte),
+calcolati con bytes.translate/bytes.count: nessun ciclo Python sul contenuto,
+centinaia di MB/s. I coefficienti sono calibrati per categoria di file (codice,
+testo/markup, dati) su un tokenizer BPE reale; per i file non letti si usa un
+rapporto byte/token per estensione.
+
+Con un vocabolario locale (tokenizer.json di HuggingFace o file .tiktoken) e il
+relativo pacchetto installato, i conteggi diventano esatti.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+CATEGORY_CODE = "code"
+CATEGORY_MARKUP = "markup"
+CATEGORY_DATA = "data"
+
+_EXT_CATEGORY = {
+    **dict.fromkeys([".md", ".markdown", ".txt", ".rst", ".tex", ".bib", ".html", ".htm", ".xml", ".svg"], CATEGORY_MARKUP),
+    **dict.fromkeys([".json", ".yml", ".yaml", ".toml", ".csv", ".sql", ".css", ".scss", ".ini", ".cfg", ".lock"], CATEGORY_DATA),
+}
+
+# Byte per token, per le stime dalla sola dimensione (file mai letti, es. albero senza contenuti)
+_CATEGORY_BYTES_PER_TOKEN = {CATEGORY_CODE: 3.1, CATEGORY_MARKUP: 3.0, CATEGORY_DATA: 2.7}
+_EXT_BYTES_PER_TOKEN = {
+    ".py": 4.1, ".rb": 3.2, ".sh": 3.5, ".c": 2.8, ".h": 3.0, ".js": 3.4, ".jsx": 3.4,
+    ".md": 3.1, ".txt": 3.9, ".html": 2.9, ".xml": 2.6,
+    ".json": 2.7, ".yml": 2.3, ".yaml": 2.3, ".css": 2.7,
+}
+
+# Classi di byte. Prima tabella: l=minuscola, U=maiuscola, d=cifra, spazio, newline,
+# .=punteggiatura, c=byte di continuazione UTF-8, 2/3/4=inizio di un carattere da 2/3/4 byte
+def _table(mapping, default: bytes) -> bytes:
+    table = bytearray(default * 256)
+    for chars, cls in mapping:
+        for b in chars:
+            table[b] = ord(cls)
+    return bytes(table)
+
+_LOWER = bytes(range(97, 123)) + b"_"
+_UPPER = bytes(range(65, 91))
+_DIGIT = bytes(range(48, 58))
+_CLASSES = _table([
+    (_LOWER, "l"), (_UPPER, "U"), (_DIGIT, "d"), (b" \t", " "), (b"\r\n", "\n"),
+    (bytes(range(0x80, 0xC0)), "c"), (bytes(range(0xC0, 0xE0)), "2"),
+    (bytes(range(0xE0, 0xF0)), "3"), (bytes(range(0xF0, 0x100)), "4"),
+], b".")
+# Seconda tabella: a=alfanumerico, tutto il resto spazio (per contare parole e parole lunghe)
+_WORDS = _table([(_LOWER + _UPPER + _DIGIT, "a")], b" ")
+
+# Coefficienti per: parole, caratteri alfanumerici, cifre, passaggi camelCase, blocchi di 4 e 8
+# caratteri nella stessa parola, punteggiatura, newline, spazi, coppie e quartine di spazi,
+# caratteri da 2, 3 e 4 byte
+_COEFFICIENTS = {
+    CATEGORY_CODE: (1.083, -0.272, 0.566, 1.337, 2.416, -0.421, 0.269, 2.038, -0.352, 0.837, -0.723, 1.58, 1.052, 5.294),
+    CATEGORY_MARKUP: (0.725, -0.081, 0.673, 0.029, 0.851, 1.308, 0.56, 1.784, -0.254, 1.697, -2.681, 1.58, 1.052, 5.294),
+    CATEGORY_DATA: (2.115, -0.31, 0.62, 1.235, 0.342, 1.795, 0.776, 0.754, 0.289, 0.526, -2.971, 1.58, 1.052, 5.294),
+}
+
+_MEMO_SIZE = 8192
+
+# Oltre questa dimensione le feature si calcolano su finestre campione distribuite
+# uniformemente nel testo e si riscalano: la stima resta entro pochi punti percentuali
+# e il costo smette di crescere con la dimensione
+_SAMPLE_THRESHOLD = 256 * 1024
+_SAMPLE_WINDOWS = 64
+_SAMPLE_WINDOW_BYTES = 4096
+
+# Pattern di pre-tokenizzazione di cl100k_base, per i vocabolari .tiktoken
+_TIKTOKEN_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+
+
+def category_for(file_path: str) -> str:
+    _, ext = os.path.splitext(file_path)
+    return _EXT_CATEGORY.get(ext.lower(), CATEGORY_CODE)
+
+
+def bytes_per_token(file_path: str) -> float:
+    """Rapporto medio byte/token per l'estensione (o la categoria) di file_path."""
+    _, ext = os.path.splitext(file_path)
+    return _EXT_BYTES_PER_TOKEN.get(ext.lower()) or _CATEGORY_BYTES_PER_TOKEN[category_for(file_path)]
+
+
+def _sample(data: bytes) -> Tuple[bytes, float]:
+    """Finestre campione di un testo lungo (separate da newline) e fattore di scala."""
+    if len(data) <= _SAMPLE_THRESHOLD:
+        return data, 1.0
+    step = len(data) // _SAMPLE_WINDOWS
+    sample = b"\n".join(data[i:i + _SAMPLE_WINDOW_BYTES] for i in range(0, step * _SAMPLE_WINDOWS, step))
+    return sample, len(data) / len(sample)
+
+
+def _features(data: bytes) -> Tuple[int, ...]:
+    classes = data.translate(_CLASSES)
+    words = data.translate(_WORDS)
+    return (
+        words.count(b" a") + (words[:1] == b"a"),
+        words.count(b"a"),
+        classes.count(b"d"),
+        classes.count(b"lU"),
+        words.count(b"aaaa"),
+        words.count(b"aaaaaaaa"),
+        classes.count(b"."),
+        classes.count(b"\n"),
+        classes.count(b" "),
+        classes.count(b"  "),
+        classes.count(b"    "),
+        classes.count(b"2"),
+        classes.count(b"3"),
+        classes.count(b"4"),
+    )
+
+
+class TokenEstimator:
+    """Conta (o stima) i token di un testo; singleton di modulo: estimator."""
+
+    def __init__(self):
+        self.vocab_path: Optional[str] = None
+        self._encode = None
+        self._fingerprint = "heuristic-1"
+        # (path, size, mtime_ns) -> token: i file invariati non vengono ricontati
+        self._memo: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+
+    @property
+    def fingerprint(self) -> str:
+        """Identità del metodo di conteggio (entra nelle chiavi di cache e manifest)."""
+        return self._fingerprint
+
+    def load_vocabulary(self, vocab_path: str) -> None:
+        """
+        Usa un vocabolario BPE locale: tokenizer.json (pacchetto 'tokenizers')
+        oppure un file .tiktoken (pacchetto 'tiktoken').
+        Solleva ImportError se il pacchetto manca, OSError/ValueError se il file non è leggibile.
+        """
+        if vocab_path.endswith(".json"):
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(vocab_path)
+            encode = lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        else:
+            import tiktoken
+            from tiktoken.load import load_tiktoken_bpe
+            encoding = tiktoken.Encoding(
+                os.path.basename(vocab_path), pat_str=_TIKTOKEN_PATTERN,
+                mergeable_ranks=load_tiktoken_bpe(vocab_path), special_tokens={}
+            )
+            encode = lambda text: len(encoding.encode_ordinary(text))
+
+        st = os.stat(vocab_path)
+        self.vocab_path = vocab_path
+        self._encode = encode
+        digest = hashlib.sha1(f"{os.path.abspath(vocab_path)}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+        self._fingerprint = "vocab-" + digest.hexdigest()[:16]
+        self._memo.clear()
+
+    def count(self, text: str, file_path: str = "") -> int:
+        """Token di text; file_path sceglie la tabella di calibrazione."""
+        if not text:
+            return 0
+        if self._encode is not None:
+            return self._encode(text)
+        data = text.encode("utf-8", errors="replace")
+        coefficients = _COEFFICIENTS[category_for(file_path)]
+        sample, scale = _sample(data)
+        estimate = scale * sum(c * f for c, f in zip(coefficients, _features(sample)))
+        # Il modello è lineare: su input anomali non deve scendere sotto un minimo plausibile
+        return max(1, round(estimate), len(data) // 10)
+
+    def count_file(self, file_path: str, size: int, mtime_ns: int, text: str) -> int:
+        """Come count(), memorizzato per (path, size, mtime): un file invariato non viene ricontato."""
+        key = (file_path, size, mtime_ns)
+        tokens = self._memo.get(key)
+        if tokens is not None:
+            self._memo.move_to_end(key)
+            return tokens
+        tokens = self.count(text, file_path)
+        self._memo[key] = tokens
+        if len(self._memo) > _MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return tokens
+
+    def estimate_size(self, size_bytes: int, file_path: str = "") -> int:
+        """Stima dalla sola dimensione, per i file di cui non si è letto il contenuto."""
+        if size_bytes <= 0:
+            return 0
+        return max(1, round(size_bytes / bytes_per_token(file_path)))
+
+    def bytes_for_tokens(self, tokens: int, file_path: str = "") -> int:
+        """Byte di un file di questo tipo che corrispondono (in media) a tokens token."""
+        return max(1, int(tokens * bytes_per_token(file_path)))
+
+
+estimator = TokenEstimator()
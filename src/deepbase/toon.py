@@ -1,7 +1,6 @@
 # src/deepbase/toon.py
 
 import os
-import ast
 import json
 import re
 
@@ -9,61 +8,16 @@ import re
 from deepbase.database import (
     get_database_schema,
     generate_database_context_toon,
-    generate_database_context_hybrid,
-    is_sqlite_database
+    generate_database_context_hybrid
 )
+from deepbase.sniff import is_database_file
 
 # Import new parser registry
 from deepbase.parsers.registry import registry
 
-# Manteniamo ToonVisitor originale per la retrocompatibilità (se usato altrove)
-# o per la funzione generate_toon_representation "standard" (non light).
-class ToonVisitor(ast.NodeVisitor):
-    def __init__(self):
-        self.output = []
-        self.indent_level = 0
-
-    def _log(self, text):
-        indent = "  " * self.indent_level
-        self.output.append(f"{indent}{text}")
-
-    def visit_ClassDef(self, node):
-        bases = [b.id for b in node.bases if isinstance(b, ast.Name)]
-        base_str = f"({', '.join(bases)})" if bases else ""
-        self._log(f"C: {node.name}{base_str}")
-
-        self.indent_level += 1
-        docstring = ast.get_docstring(node)
-        if docstring:
-            short_doc = docstring.split('\n')[0].strip()
-            self._log(f"\"\"\"{short_doc}...\"\"\"")
-
-        self.generic_visit(node)
-        self.indent_level -= 1
-
-    def visit_FunctionDef(self, node):
-        self._handle_function(node)
-
-    def visit_AsyncFunctionDef(self, node):
-        self._handle_function(node, is_async=True)
-
-    def _handle_function(self, node, is_async=False):
-        args = [arg.arg for arg in node.args.args]
-        args_str = ", ".join(args)
-        prefix = "async " if is_async else ""
-        self._log(f"{prefix}F: {node.name}({args_str})")
-        
-        docstring = ast.get_docstring(node)
-        if docstring:
-            self.indent_level += 1
-            short_doc = docstring.split('\n')[0].strip()
-            self._log(f"\"\"\"{short_doc}...\"\"\"")
-            self.indent_level -= 1
-
-    def generic_visit(self, node):
-        for child in ast.iter_child_nodes(node):
-            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
-                self.visit(child)
+# ToonVisitor vive ora accanto al parser Python (analisi AST condivisa);
+# resta importabile da qui per retrocompatibilità.
+from deepbase.parsers.python import ToonVisitor, analyze_python
 
 # --- Helper Legacy per TOON non-light (struttura scheletrica) ---
 # (Qui potresti voler spostare anche questi nei parser in futuro, 
@@ -74,7 +28,7 @@ def _handle_markdown(content: str) -> str:
     return "\n".join(lines) or "(Markdown file with no headers)"
 
 def _handle_database_toon(file_path: str) -> str:
-    if is_sqlite_database(file_path):
+    if is_database_file(file_path):
         try:
             schema = get_database_schema(file_path)
             return generate_database_context_toon(schema, os.path.basename(file_path))
@@ -91,7 +45,7 @@ def generate_light_representation(file_path: str, content: str) -> str:
     Genera una rappresentazione LIGHT usando il nuovo sistema di plugin/parser.
     """
     # 1. Gestione Database (caso speciale, non basato su contenuto testo)
-    if is_sqlite_database(file_path):
+    if is_database_file(file_path):
         return _handle_database_toon(file_path)
 
     # 2. Usa il registro per trovare il parser corretto
@@ -116,17 +70,15 @@ def generate_toon_representation(file_path: str, content: str) -> str:
     _, ext = os.path.splitext(file_path)
     ext = ext.lower()
 
-    if is_sqlite_database(file_path):
+    if is_database_file(file_path):
         return _handle_database_toon(file_path)
 
     if ext == ".py":
-        try:
-            tree = ast.parse(content)
-            visitor = ToonVisitor()
-            visitor.visit(tree)
-            return "\n".join(visitor.output)
-        except SyntaxError:
+        # Stessa analisi usata dalla modalità light: il file non viene riparsato
+        analysis = analyze_python(content)
+        if analysis.tree is None:
             return f"(Syntax Error parsing {os.path.basename(file_path)})"
+        return analysis.toon
     
     elif ext in [".md", ".markdown"]:
         return _handle_markdown(content)
@@ -142,7 +94,7 @@ def generate_toon_representation(file_path: str, content: str) -> str:
 
 def generate_database_focused(file_path: str, focused_tables: list = None) -> str:
     from deepbase.database import generate_database_context_full, generate_database_context_hybrid
-    if not is_sqlite_database(file_path):
+    if not is_database_file(file_path):
         return "(Not a valid SQLite database)"
     try:
         schema = get_database_schema(file_path)
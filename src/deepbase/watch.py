@@ -0,0 +1,52 @@
+# src/deepbase/watch.py
+"""
+Ciclo di polling per --watch, senza servizi esterni né dipendenze da inotify.
+L'intervallo di controllo parte basso e raddoppia finché il progetto resta fermo
+(come il backoff di un watcher), e torna al minimo appena qualcosa cambia.
+Una raffica di salvataggi produce una sola rigenerazione (debounce).
+"""
+
+import time
+from typing import Callable, Hashable, Optional
+
+MIN_INTERVAL = 0.1
+MAX_INTERVAL = 2.0
+DEBOUNCE = 0.3
+
+
+def watch_loop(
+    snapshot: Callable[[], Hashable],
+    rebuild: Callable[[], None],
+    min_interval: float = MIN_INTERVAL,
+    max_interval: float = MAX_INTERVAL,
+    debounce: float = DEBOUNCE,
+    max_rebuilds: Optional[int] = None
+) -> None:
+    """
+    Chiama rebuild() ogni volta che snapshot() cambia valore.
+    Prima di rigenerare attende che snapshot() resti stabile per almeno debounce secondi.
+    Termina dopo max_rebuilds rigenerazioni (None = mai, fino a KeyboardInterrupt).
+    """
+    last = snapshot()
+    interval = min_interval
+    rebuilds = 0
+    while max_rebuilds is None or rebuilds < max_rebuilds:
+        time.sleep(interval)
+        current = snapshot()
+        if current == last:
+            interval = min(max_interval, interval * 2)
+            continue
+
+        # Debounce: si rigenera solo quando i salvataggi si sono fermati
+        while True:
+            time.sleep(debounce)
+            settled = snapshot()
+            if settled == current:
+                break
+            current = settled
+
+        rebuild()
+        rebuilds += 1
+        # Le modifiche arrivate durante la rigenerazione verranno viste al prossimo controllo
+        last = current
+        interval = min_interval
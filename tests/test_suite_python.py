@@ -1,6 +1,7 @@
 # tests/test_suite_python.py
 
 import os
+import codecs
 import typer
 from typer.testing import CliRunner
 from deepbase.main import main
@@ -630,4 +631,967 @@ significant_extensions = [".xyz"]
         
         # Nessuna cartella tests deve apparire
         assert "tests/test1.py" not in content.replace("\\", "/")
-        assert "src/tests/test2.py" not in content.replace("\\", "/")
\ No newline at end of file
+        assert "src/tests/test2.py" not in content.replace("\\", "/")
+
+########## TEST SUITE PER IL MOTORE DI SCANSIONE ###########
+    def test_light_mode_parses_each_file_once(self, tmp_path, monkeypatch):
+        """In light mode ogni file viene letto e parsato una sola volta per run."""
+        import deepbase.scanner as scanner
+        self.create_dummy_project(tmp_path)
+
+        calls = []
+        original = scanner.generate_light_representation
+        def counting(file_path, content):
+            calls.append(file_path)
+            return original(file_path, content)
+        monkeypatch.setattr(scanner, "generate_light_representation", counting)
+
+        output_file = tmp_path / "context.md"
+        result = runner.invoke(app_test, [str(tmp_path), "--light", "-o", str(output_file)])
+
+        assert result.exit_code == 0
+        assert len(calls) == len(set(calls)), "Nessun file deve essere parsato più di una volta"
+        content = output_file.read_text(encoding="utf-8")
+        assert "async def async_func" in content
+        # Albero e totale sono calcolati sugli stessi record: nessuna percentuale oltre il 100%
+        import re
+        tree_section = content.split("FILE CONTENTS")[0]
+        percents = [float(p) for p in re.findall(r"\((\d+\.\d)% \|", tree_section)]
+        assert percents and max(percents) <= 100.0
+
+    def test_compiled_matcher_semantics(self):
+        """Il matcher compilato rispetta nomi, percorsi annidati, wildcard e focus."""
+        from deepbase.matcher import PathMatcher
+        matcher = PathMatcher(
+            ignore_dirs=["tests", "app/templates", "*.egg-info"],
+            ignore_files=["*.log", "secrets.env", "app/config/local.env"],
+            focus_patterns=["main.py", "src/*.ts"]
+        )
+
+        assert matcher.ignores_dir("tests")
+        assert matcher.ignores_dir("src/tests")
+        assert matcher.ignores_dir("app/templates")
+        assert matcher.ignores_dir("app/templates/partials")
+        assert not matcher.ignores_dir("templates")
+        assert matcher.ignores_dir("pkg/my_package.egg-info")
+
+        assert matcher.ignores_file("logs/debug.log")
+        assert matcher.ignores_file("deep/secrets.env")
+        assert matcher.ignores_file("app/config/local.env")
+        assert not matcher.ignores_file("config/local.env")
+
+        assert matcher.matches_focus("pkg/main.py")
+        assert matcher.matches_focus("src/index.ts")
+        assert not matcher.matches_focus("lib/index.ts")
+
+    def test_scanner_uses_direntry_stat(self, tmp_path, monkeypatch):
+        """Il walker ricava tipo e dimensione dai DirEntry, senza stat aggiuntive."""
+        from deepbase.main import load_config
+        from deepbase.scanner import scan_project
+        self.create_dummy_project(tmp_path)
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / "mod.py").write_text("x = 1\n", encoding="utf-8")
+        config, _, _, _ = load_config(str(tmp_path))
+
+        def forbidden(*args, **kwargs):
+            raise AssertionError("stat ridondante")
+
+        with monkeypatch.context() as m:
+            m.setattr(os.path, "getsize", forbidden)
+            m.setattr(os.path, "isdir", forbidden)
+            scan = scan_project(str(tmp_path), config, str(tmp_path / "context.md"))
+
+        sizes = {record.rel_path: record.size for record in scan.files}
+        assert sizes["pkg/mod.py"] == 6
+        assert sizes["main.py"] == (tmp_path / "main.py").stat().st_size
+        assert scan.raw_size == sum(sizes.values())
+
+    def test_parallel_walk_is_deterministic(self, tmp_path):
+        """--walk-workers produce lo stesso output della visita sequenziale."""
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        for i in range(6):
+            sub = project_dir / f"pkg{i}" / "nested"
+            sub.mkdir(parents=True)
+            (sub / f"mod{i}.py").write_text(f"def f{i}():\n    pass\n", encoding="utf-8")
+            (project_dir / f"pkg{i}" / "README.md").write_text(f"# Pkg {i}\n", encoding="utf-8")
+
+        sequential = tmp_path / "seq.md"
+        parallel = tmp_path / "par.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(sequential)])
+        assert result.exit_code == 0
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--walk-workers", "4", "-o", str(parallel)])
+        assert result.exit_code == 0
+
+        assert sequential.read_text(encoding="utf-8") == parallel.read_text(encoding="utf-8")
+
+    def test_git_mode_skips_untracked_trees(self, tmp_path):
+        """--git considera solo i file presenti nell'indice di git."""
+        import shutil
+        import subprocess
+        import pytest
+        if shutil.which("git") is None:
+            pytest.skip("git non disponibile")
+
+        project_dir = tmp_path / "repo"
+        project_dir.mkdir()
+        (project_dir / "main.py").write_text("print('tracked')", encoding="utf-8")
+        (project_dir / ".gitignore").write_text("wandb/\n", encoding="utf-8")
+        (project_dir / "wandb").mkdir()
+        (project_dir / "wandb" / "run.json").write_text("{}", encoding="utf-8")
+        (project_dir / "untracked.py").write_text("print('new')", encoding="utf-8")
+        subprocess.run(["git", "init", "-q"], cwd=project_dir, check=True)
+        subprocess.run(["git", "add", "main.py", ".gitignore"], cwd=project_dir, check=True)
+
+        output_file = tmp_path / "context.md"
+        result = runner.invoke(app_test, [str(project_dir), "--git", "-o", str(output_file)])
+
+        assert result.exit_code == 0, result.stdout
+        content = output_file.read_text(encoding="utf-8")
+        assert "main.py" in content
+        assert "wandb" not in content
+        assert "untracked.py" not in content
+
+    def test_sniff_cache_opens_each_file_once(self, tmp_path, monkeypatch):
+        """I sorgenti noti non vengono aperti; database e formati di dati una sola volta (solo il prefisso)."""
+        import deepbase.sniff as sniff
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        conn = sqlite3.connect(project_dir / "data.db")
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.commit()
+        conn.close()
+
+        opened = []
+        original = sniff._read_prefix
+        def counting(file_path):
+            opened.append(os.path.basename(file_path))
+            return original(file_path)
+        monkeypatch.setattr(sniff, "_read_prefix", counting)
+        monkeypatch.setattr(sniff, "sniff_cache", sniff.SniffCache())
+
+        output_file = tmp_path / "context.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(output_file)])
+
+        assert result.exit_code == 0
+        assert sorted(opened) == ["config.json", "data.db"]
+        assert "items" in output_file.read_text(encoding="utf-8")
+
+        opened.clear()
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(output_file)])
+        assert result.exit_code == 0
+        assert opened == []
+
+    def test_binary_files_are_never_decoded(self, tmp_path, monkeypatch):
+        """I file binari compaiono nell'albero con la dimensione ma non vengono decodificati né emessi."""
+        import deepbase.scanner as scanner
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        (project_dir / "main.py").write_text("def ok():\n    pass\n", encoding="utf-8")
+        (project_dir / "blob.json").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8)
+        (project_dir / "tool.bin").write_bytes(b"\x7fELF" + b"\x00" * 512)
+        (project_dir / ".deepbase.toml").write_text('significant_extensions = [".bin"]', encoding="utf-8")
+
+        decoded = []
+        original = scanner.decode_bytes
+        def tracking(data, encoding=None):
+            decoded.append(data)
+            return original(data, encoding)
+        monkeypatch.setattr(scanner, "decode_bytes", tracking)
+
+        output_file = tmp_path / "context.md"
+        result = runner.invoke(app_test, [str(project_dir), "--all", "-o", str(output_file)])
+
+        assert result.exit_code == 0
+        content = output_file.read_text(encoding="utf-8")
+        tree, contents = content.split("FILE CONTENTS")
+        assert "tool.bin (binary |" in tree
+        # Il blob .json è riconosciuto già nella scansione: nell'albero e nei totali è un binario
+        assert "blob.json (binary |" in tree
+        assert "blob.json" not in contents and "tool.bin" not in contents
+        assert "def ok()" in contents
+        assert len(decoded) == 1, "Solo i file di testo devono essere decodificati"
+
+        result = runner.invoke(app_test, [str(project_dir), "-o", str(output_file)])
+        assert result.exit_code == 0
+        assert "📦 blob.json (binary |" in output_file.read_text(encoding="utf-8")
+
+    def test_max_file_bytes_truncates_with_head_and_tail(self, tmp_path):
+        """I file oltre max_file_bytes vengono letti solo in testa e coda e marcati come troncati."""
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        body = "\n".join(f"INSERT INTO t VALUES ({i});" for i in range(5000))
+        (project_dir / "dump.sql").write_text("-- HEAD MARKER\n" + body + "\n-- TAIL MARKER\n", encoding="utf-8")
+        (project_dir / "small.sql").write_text("SELECT 1;\n", encoding="utf-8")
+        (project_dir / ".deepbase.toml").write_text("max_file_bytes = 2000\n", encoding="utf-8")
+
+        output_file = tmp_path / "context.md"
+        result = runner.invoke(app_test, [str(project_dir), "--all", "-o", str(output_file)])
+
+        assert result.exit_code == 0
+        content = output_file.read_text(encoding="utf-8")
+        tree, contents = content.split("FILE CONTENTS")
+        assert "dump.sql" in tree and "[truncated]" in tree
+        assert "small.sql" in tree and tree.count("[truncated]") == 1
+        assert "dump.sql [TRUNCATED]" in contents
+        assert "-- HEAD MARKER" in contents and "-- TAIL MARKER" in contents
+        assert "INSERT INTO t VALUES (2500);" not in contents
+        assert "bytes omitted" in contents
+
+        # In --light si parsa solo la testa: il taglio non produce errori di sintassi
+        (project_dir / "big.py").write_text("".join(f"def func_{i}(x):\n    return x + {i}\n\n" for i in range(400)), encoding="utf-8")
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(output_file)])
+        assert result.exit_code == 0
+        contents = output_file.read_text(encoding="utf-8").split("FILE CONTENTS")[1]
+        assert "Syntax Error" not in contents
+        assert "func_1" in contents and "func_399" not in contents and "bytes omitted" in contents
+
+        # L'encoding vale per entrambe le finestre: una coda non UTF-8 dopo una testa ASCII
+        from deepbase.scanner import read_text_file
+        legacy = project_dir / "legacy.txt"
+        legacy.write_bytes(b"ascii line\n" * 300 + "Perché è già così: più caffè, meno attività.\n".encode("latin-1") * 60)
+        text, encoding = read_text_file(str(legacy), 2000)
+        assert encoding.lower() != "utf-8" and "\ufffd" not in text
+
+        # UTF-16 big endian: la coda usa l'ordine dei byte del BOM in testa
+        wide = project_dir / "wide.txt"
+        wide.write_bytes(codecs.BOM_UTF16_BE + ("riga di testo\n" * 200 + "FINE è\n").encode("utf-16-be"))
+        text, encoding = read_text_file(str(wide), 2000)
+        assert encoding == "utf-16" and text.startswith("riga di testo") and text.endswith("FINE è\n")
+
+    def test_tiered_encoding_detection(self, monkeypatch):
+        """UTF-8 e BOM non passano da chardet; gli altri encoding sì, su un campione limitato."""
+        import deepbase.encoding as encoding
+        sampled = []
+        original = encoding._detect_with_chardet
+        def tracking(data):
+            sampled.append(len(data))
+            return original(data)
+        monkeypatch.setattr(encoding, "_detect_with_chardet", tracking)
+
+        assert encoding.decode_bytes("perché ünïcode".encode("utf-8")) == ("perché ünïcode", "utf-8")
+        assert encoding.decode_bytes("\ufeffciao".encode("utf-8"))[1] == "utf-8-sig"
+        assert encoding.decode_bytes("ciao".encode("utf-16"))[0] == "ciao"
+        assert encoding.detect_encoding("è".encode("utf-8")[:1], partial=True) == "utf-8"
+        assert sampled == []
+
+        fed = []
+        original_feed = encoding.UniversalDetector.feed
+        def counting_feed(self, data):
+            fed.append(len(data))
+            return original_feed(self, data)
+        monkeypatch.setattr(encoding.UniversalDetector, "feed", counting_feed)
+
+        latin = ("Questo è un testo già codificato in latin-1, perché sì. " * 4000).encode("latin-1")
+        _, detected = encoding.decode_bytes(latin)
+        assert detected.lower() not in ("utf-8", "ascii")
+        assert len(sampled) == 1
+        assert 0 < sum(fed) <= encoding.CHARDET_SAMPLE_BYTES
+
+    def test_large_files_are_read_through_mmap(self, tmp_path, monkeypatch):
+        """Sopra la soglia il file viene letto via mmap e il risultato è identico alla lettura normale."""
+        import mmap
+        import deepbase.scanner as scanner
+        big = tmp_path / "big.md"
+        text = "# Titolo è\n" + ("riga di testo qualsiasi\n" * 200) + "## Fine\n"
+        big.write_text(text, encoding="utf-8")
+
+        mapped = []
+        original_mmap = mmap.mmap
+        def tracking_mmap(*args, **kwargs):
+            mapped.append(args)
+            return original_mmap(*args, **kwargs)
+        monkeypatch.setattr(scanner.mmap, "mmap", tracking_mmap)
+        monkeypatch.setattr(scanner, "MMAP_THRESHOLD", 1024)
+
+        content, encoding = scanner.read_text_file(str(big))
+        assert mapped, "Il file sopra soglia deve essere mappato"
+        assert (content, encoding) == (text, "utf-8")
+
+        from deepbase.parsers.document import MarkdownParser
+        assert MarkdownParser().parse(content, str(big)) == "# Titolo è\n## Fine"
+
+    def test_jobs_output_matches_sequential(self, tmp_path):
+        """--jobs distribuisce il lavoro su più processi senza cambiare l'output."""
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        for i in range(5):
+            (project_dir / f"mod{i}.py").write_text(f"def f{i}(x):\n    return x * {i}\n", encoding="utf-8")
+
+        for mode in ("--light", "--all"):
+            sequential = tmp_path / "seq.md"
+            parallel = tmp_path / "par.md"
+            result = runner.invoke(app_test, [str(project_dir), mode, "-o", str(sequential)])
+            assert result.exit_code == 0
+            result = runner.invoke(app_test, [str(project_dir), mode, "--jobs", "2", "-o", str(parallel)])
+            assert result.exit_code == 0, result.stdout
+
+            assert sequential.read_text(encoding="utf-8") == parallel.read_text(encoding="utf-8")
+
+    def test_parallel_map_bounds_in_flight_work(self, monkeypatch):
+        """_parallel_map tiene al più jobs * 4 lavori in volo e rispetta l'ordine."""
+        import concurrent.futures
+        import deepbase.scanner as scanner
+        submitted = []
+        class CountingPool(concurrent.futures.ThreadPoolExecutor):
+            def submit(self, fn, *args):
+                submitted.append(args)
+                return super().submit(fn, *args)
+        monkeypatch.setattr(scanner, "ProcessPoolExecutor", CountingPool)
+
+        results = []
+        for result in scanner._parallel_map(abs, list(range(-100, 0)), 2):
+            # Il risultato appena ricevuto è già uscito dalla finestra
+            assert len(submitted) - len(results) - 1 <= 2 * 4
+            results.append(result)
+        assert results == list(range(100, 0, -1))
+
+    def test_parse_cache_skips_unchanged_files(self, tmp_path, monkeypatch):
+        """Con la cache persistente i file invariati non vengono riparsati al run successivo."""
+        import deepbase.scanner as scanner
+        from deepbase.cache import ParseCache
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+
+        parsed = []
+        original = scanner.generate_light_representation
+        def counting(path, content):
+            parsed.append(os.path.basename(path))
+            return original(path, content)
+        monkeypatch.setattr(scanner, "generate_light_representation", counting)
+
+        first = tmp_path / "first.md"
+        second = tmp_path / "second.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(first)])
+        assert result.exit_code == 0
+        assert "main.py" in parsed
+        assert (project_dir / ".deepbase_cache" / "index.json").exists()
+
+        parsed.clear()
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(second)])
+        assert result.exit_code == 0
+        assert parsed == []
+        assert first.read_text(encoding="utf-8") == second.read_text(encoding="utf-8")
+
+        # File modificato: solo quello viene riparsato
+        (project_dir / "main.py").write_text("def changed():\n    pass\n", encoding="utf-8")
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(second)])
+        assert parsed == ["main.py"]
+        assert "changed" in second.read_text(encoding="utf-8")
+
+        parsed.clear()
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--no-cache", "-o", str(second)])
+        assert "main.py" in parsed
+
+        # Eviction LRU: con un limite minimo la cache viene svuotata
+        cache = ParseCache.for_project(str(project_dir), max_bytes=1)
+        cache._dirty = True
+        cache.save()
+        assert not any((project_dir / ".deepbase_cache" / "objects").rglob("*.json"))
+
+    def test_javascript_lexer_multiline_and_strings(self, tmp_path):
+        """Il lexer JS ignora graffe in stringhe, template, regex e JSX e unisce le firme su più righe."""
+        from deepbase.parsers.javascript import JavaScriptParser
+        source = """
+export const View = () => {
+    const re = /[{]+/g;
+    const s = `tpl ${ {a: 1}.a } }`;
+    return <Text style={{flex: 1}}>Don't {"}"} stop</Text>;
+};
+
+export async function fetchData<T>(
+  url: string,
+  retries: number,
+): Promise<T> {
+  return fetch(url);
+}
+
+export default class Store extends Base {
+    load(id) {
+        return "}";
+    }
+}
+export default router
+"""
+        result = JavaScriptParser().parse(source, "store.jsx")
+        lines = result.splitlines()
+
+        assert "export const View = () => { ... }" in lines
+        assert "export async function fetchData<T>(url: string, retries: number): Promise<T> { ... }" in lines
+        assert "export default class Store extends Base { ... }" in lines
+        assert "    load(id) { ... }" in lines
+        assert "export default router" in lines
+        assert "fetch(url)" not in result and "stop" not in result
+
+        # Riga minificata molto lunga: tempo lineare, nessun backtracking
+        minified = "var x=" + "(a)=>" * 50000 + "1;\nexport function tail() {}\n"
+        assert "export function tail() { ... }" in JavaScriptParser().parse(minified, "bundle.js")
+
+    def test_javascript_lexer_deep_nesting(self):
+        """Template ed elementi JSX annidati a migliaia di livelli non esauriscono lo stack."""
+        from deepbase.parsers.javascript import JavaScriptParser
+        depth = 3000
+        source = (
+            "export const deep = () => `" + "${`" * depth + "x" + "`}" * depth + "`;\n"
+            + "export function Tree() {\n    return " + "<div>{" * depth + "x" + "}</div>" * depth + ";\n}\n"
+            + "export function after() {}\n"
+        )
+        result = JavaScriptParser().parse(source, "deep.jsx")
+        assert "export const deep = () => ..." in result
+        assert "export function Tree() { ... }" in result
+        assert "export function after() { ... }" in result
+
+    def test_brace_language_light_parsers(self, tmp_path):
+        """Java, Kotlin, Go, Rust, C/C++ e C# hanno un parser light nativo registrato."""
+        from deepbase.parsers.registry import registry
+        sources = {
+            "Service.java": """
+@Service
+public class UserService {
+    /** Trova un utente. */
+    public Optional<User> find(String id,
+                               int depth) throws IOException {
+        return "}".isEmpty() ? null : Optional.empty();
+    }
+}
+""",
+            "repo.kt": """
+class Repo(private val db: Db) {
+    fun area() = width *
+        height
+}
+""",
+            "server.go": """
+package main
+
+// Start avvia il server.
+func (s *Server) Start(ctx context.Context) error {
+	x := `raw } string`
+	return nil
+}
+""",
+            "point.rs": """
+#[derive(Debug)]
+pub struct Point<'a> { x: &'a str }
+
+impl<'a> Point<'a> {
+    pub fn new(x: &'a str) -> Self { let s = r#"raw "}" "#; Point { x } }
+}
+""",
+            "util.c": """
+#define OPEN {
+typedef struct {
+    int a;
+} Pair;
+static int add(int a, int b) {
+    return a + b;
+}
+""",
+            "Orders.cs": """
+namespace App {
+    public class OrderService {
+        public int Count { get; set; }
+        public int Double(int x) => x * 2;
+    }
+}
+""",
+        }
+        expected = {
+            "Service.java": [
+                "public class UserService { ... }",
+                "    /** Trova un utente. */",
+                "    public Optional<User> find(String id, int depth) throws IOException { ... }",
+            ],
+            "repo.kt": ["class Repo(private val db: Db) { ... }", "    fun area() = ..."],
+            "server.go": ["// Start avvia il server.", "func (s *Server) Start(ctx context.Context) error { ... }"],
+            "point.rs": [
+                "pub struct Point<'a> { ... }",
+                "impl<'a> Point<'a> { ... }",
+                "    pub fn new(x: &'a str) -> Self { ... }",
+            ],
+            "util.c": ["typedef struct { ... } Pair;", "static int add(int a, int b) { ... }"],
+            "Orders.cs": [
+                "namespace App { ... }",
+                "    public class OrderService { ... }",
+                "        public int Count { ... }",
+                "        public int Double(int x) => ...",
+            ],
+        }
+        for name, source in sources.items():
+            assert registry.get_parser(name) is not registry._fallback
+            assert registry.parse_file(name, source).splitlines() == expected[name], name
+
+    def test_python_analysis_shared_between_representations(self, monkeypatch):
+        """Light, TOON e stima dei token dello stesso sorgente Python usano un solo ast.parse."""
+        import ast
+        from deepbase.parsers.python import analyze_python
+        from deepbase.toon import generate_light_representation, generate_toon_representation
+        from deepbase.main import calculate_light_tokens
+
+        analyze_python.cache_clear()
+        calls = []
+        original = ast.parse
+        def counting(*args, **kwargs):
+            calls.append(1)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(ast, "parse", counting)
+
+        source = '#!/usr/bin/env python\nr"""Modulo di prova."""\n\nclass A:\n    def run(self, x: int) -> int:\n        return x\n'
+        light = generate_light_representation("mod.py", source)
+        toon = generate_toon_representation("mod.py", source)
+        tokens = calculate_light_tokens("mod.py", source)
+
+        assert len(calls) == 1
+        assert 'r"""Modulo di prova."""' in light
+        assert "def run(self, x: int) -> int: ..." in light
+        assert "C: A" in toon and "F: run(self, x)" in toon
+        assert tokens > 0
+
+    def test_incremental_rebuild(self, tmp_path, monkeypatch):
+        """--incremental: nessuna modifica = no-op, file modificato = solo la sua sezione rigenerata."""
+        import time
+        import deepbase.scanner as scanner
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        (project_dir / "pkg").mkdir()
+        (project_dir / "pkg" / "util.py").write_text("def util():\n    pass\n", encoding="utf-8")
+        # mtime nel passato: fuori dalla finestra in cui lo stato non è affidabile
+        old = time.time() - 3600
+        for path in [project_dir, *project_dir.rglob("*")]:
+            os.utime(path, (old, old))
+
+        parsed = []
+        original = scanner.generate_light_representation
+        def counting(path, content):
+            parsed.append(os.path.basename(path))
+            return original(path, content)
+        monkeypatch.setattr(scanner, "generate_light_representation", counting)
+
+        output_file = tmp_path / "context.md"
+        args = [str(project_dir), "--light", "--no-cache", "--incremental", "-o", str(output_file)]
+        result = runner.invoke(app_test, args)
+        assert result.exit_code == 0
+        assert (tmp_path / "context.md.manifest.json").exists()
+        first = output_file.read_text(encoding="utf-8")
+        first_mtime = output_file.stat().st_mtime_ns
+
+        # Nessuna modifica: l'output non viene riscritto
+        parsed.clear()
+        result = runner.invoke(app_test, args)
+        assert result.exit_code == 0
+        assert "UP TO DATE" in result.stdout
+        assert parsed == []
+        assert output_file.stat().st_mtime_ns == first_mtime
+
+        # Un file modificato: viene riparsato solo quello, il resto è copiato dal vecchio output
+        (project_dir / "pkg" / "util.py").write_text("def util(changed):\n    pass\n", encoding="utf-8")
+        result = runner.invoke(app_test, args)
+        assert result.exit_code == 0
+        assert parsed == ["util.py"]
+        incremental = output_file.read_text(encoding="utf-8")
+        assert "def util(changed): ..." in incremental
+        assert incremental != first
+
+        # Stesso risultato di una generazione completa
+        full_file = tmp_path / "full.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--no-cache", "-o", str(full_file)])
+        assert full_file.read_text(encoding="utf-8") == incremental
+
+        # Cache e output dentro il progetto: le scritture del run non invalidano il successivo
+        monkeypatch.setattr(scanner, "generate_light_representation", original)
+        os.utime(project_dir / "pkg" / "util.py", (old, old))
+        inside = project_dir / "context.md"
+        cached_args = [str(project_dir), "--light", "--incremental", "-o", str(inside)]
+        result = runner.invoke(app_test, cached_args)
+        assert result.exit_code == 0
+        assert (project_dir / ".deepbase_cache").is_dir()
+        for _ in range(2):
+            result = runner.invoke(app_test, cached_args)
+            assert result.exit_code == 0
+            assert "UP TO DATE" in result.stdout
+
+    def test_output_derived_files_excluded_by_exact_name(self, tmp_path):
+        """Dentro il progetto si escludono l'output e i suoi file derivati, non i file con lo stesso prefisso."""
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        (project_dir / "context.py").write_text("def ctx():\n    return 1\n", encoding="utf-8")
+        output_file = project_dir / "context"
+        for _ in range(2):
+            result = runner.invoke(app_test, [str(project_dir), "-a", "--incremental", "--index", "-o", str(output_file)])
+            assert result.exit_code == 0, result.stdout
+        assert (project_dir / "context.manifest.json").exists() and (project_dir / "context.index.json").exists()
+        text = output_file.read_text(encoding="utf-8")
+        assert "--- START OF FILE: context.py ---" in text
+        assert "context.manifest.json" not in text and "context.index.json" not in text
+
+    def test_watch_loop_backoff_and_debounce(self, monkeypatch):
+        """Il polling rallenta quando nulla cambia e una raffica di modifiche produce una sola rigenerazione."""
+        import time
+        from deepbase.watch import watch_loop
+        sleeps = []
+        monkeypatch.setattr(time, "sleep", sleeps.append)
+
+        states = iter(["a", "a", "a", "b", "c", "c"])
+        rebuilds = []
+        watch_loop(lambda: next(states), lambda: rebuilds.append(1),
+                   min_interval=0.1, max_interval=0.3, debounce=0.05, max_rebuilds=1)
+
+        assert rebuilds == [1]
+        assert sleeps == [0.1, 0.2, 0.3, 0.05, 0.05]
+
+    def test_watch_mode_updates_output(self, tmp_path, monkeypatch):
+        """--watch rigenera l'output quando un file del progetto cambia."""
+        import time
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        output_file = tmp_path / "context.md"
+
+        calls = []
+        def fake_sleep(seconds):
+            calls.append(seconds)
+            if len(calls) == 1:
+                (project_dir / "main.py").write_text("def edited_in_watch():\n    pass\n", encoding="utf-8")
+            elif len(calls) > 4:
+                raise KeyboardInterrupt
+        monkeypatch.setattr(time, "sleep", fake_sleep)
+
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--no-cache", "--watch", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        assert "Watch stopped" in result.stdout
+        assert "def edited_in_watch(): ..." in output_file.read_text(encoding="utf-8")
+
+    def test_tree_rendering_is_iterative(self, tmp_path):
+        """L'albero viene generato senza ricorsione: catene più profonde del limite di ricorsione funzionano."""
+        import sys
+        project_dir = tmp_path / "project"
+        depth = sys.getrecursionlimit() + 50
+        deepest = str(project_dir)
+        project_dir.mkdir()
+        for _ in range(depth):
+            deepest = os.path.join(deepest, "d")
+            os.mkdir(deepest)
+        with open(os.path.join(deepest, "leaf.py"), "w", encoding="utf-8") as f:
+            f.write("x = 1\n")
+        (project_dir / "top.py").write_text("y = 2\n", encoding="utf-8")
+        output_file = tmp_path / "tree.md"
+
+        try:
+            result = runner.invoke(app_test, [str(project_dir), "-o", str(output_file)])
+        finally:
+            # shutil.rmtree (usato da pytest per ripulire tmp_path) è ricorsivo: la catena va smontata qui
+            os.remove(os.path.join(deepest, "leaf.py"))
+            while deepest != str(project_dir):
+                os.rmdir(deepest)
+                deepest = os.path.dirname(deepest)
+        assert result.exit_code == 0, result.stdout
+
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        start = lines.index("📁 project/")
+        assert lines[start + 1].startswith("├── 📁 d/")
+        indent = "│   " + "    " * (depth - 2)
+        assert lines[start + depth].startswith(indent + "└── 📁 d/")
+        assert lines[start + depth + 1].startswith(indent + "    └── 📄 leaf.py")
+        assert lines[start + depth + 2].startswith("└── 📄 top.py")
+
+    def test_output_to_stdout_and_compressed(self, tmp_path):
+        """-o - scrive il documento su stdout; --compress gzip comprime al volo e aggiunge l'estensione."""
+        import gzip
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        self.create_dummy_project(project_dir)
+        plain = tmp_path / "plain.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(plain)])
+        assert result.exit_code == 0
+        expected = plain.read_text(encoding="utf-8")
+
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", "-"])
+        assert result.exit_code == 0
+        # I messaggi di stato vanno su stderr: stdout contiene solo il documento
+        assert result.stdout == expected
+
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(tmp_path / "ctx.md"), "--compress", "gzip"])
+        assert result.exit_code == 0, result.stdout
+        assert not (tmp_path / "ctx.md").exists()
+        with gzip.open(tmp_path / "ctx.md.gz", "rt", encoding="utf-8") as f:
+            assert f.read() == expected
+
+        result = runner.invoke(app_test, [str(project_dir), "-o", "-", "--incremental"])
+        assert result.exit_code == 1
+
+    def test_max_tokens_packs_representations(self, tmp_path):
+        """--max-tokens sceglie completo, light o solo albero per file e resta nel budget."""
+        project_dir = tmp_path / "project"
+        (project_dir / "pkg").mkdir(parents=True)
+        body = "".join(f"def f{k}(x, y):\n    z = x + y * {k}\n    w = z - {k}\n    return z * w\n\n" for k in range(40))
+        for i in range(6):
+            (project_dir / "pkg" / f"m{i}.py").write_text(f'"""Modulo {i}."""\n\n' + body, encoding="utf-8")
+        (project_dir / "main.py").write_text('"""Entry point."""\n\n' + body, encoding="utf-8")
+        output_file = tmp_path / "budget.md"
+
+        budget = 4000
+        result = runner.invoke(app_test, [str(project_dir), "--max-tokens", str(budget), "-f", "main.py", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        text = output_file.read_text(encoding="utf-8")
+
+        from deepbase.main import count_document_tokens
+        assert count_document_tokens([text]) <= budget
+        assert "--- START OF FILE: main.py ---" in text
+        assert "[LIGHT] ---" in text
+        assert "> Token budget: ~4,000 | full: " in text
+        # L'albero di un documento completo mostra le dimensioni reali, non quelle light
+        assert "Est. Tokens: ~" in text and "(light)" not in text
+
+        # Budget che basta solo per l'albero: nessuna sezione
+        result = runner.invoke(app_test, [str(project_dir), "--max-tokens", "50", "-o", str(output_file)])
+        assert result.exit_code == 0
+        text = output_file.read_text(encoding="utf-8")
+        assert "START OF FILE" not in text
+        assert "full: 0, light: 0, tree only: 7" in text
+
+    def test_calibrated_token_estimates(self, tmp_path, monkeypatch):
+        """Stime token calibrate per tipo di file, memorizzate per file e salvate nella cache di parsing."""
+        import json
+        from deepbase.tokens import estimator
+
+        prose = "This module loads the configuration and builds the project tree.\n" * 50
+        data = json.dumps([{"id": i, "value": i * 3.5, "tag": f"x{i:04d}"} for i in range(200)])
+        # Il testo scorrevole sta sotto i 4 byte per token, i dati numerici molto sopra
+        assert estimator.count(prose, "notes.md") < len(prose) / 4
+        assert estimator.count(data, "data.json") > len(data) / 3
+        assert estimator.estimate_size(4100, "mod.py") == 1000
+
+        # Un file invariato (stesso path, size, mtime) non viene ricontato
+        first = estimator.count_file("/x/mod.py", 10, 1, "def f(): pass")
+        monkeypatch.setattr(estimator, "count", lambda *args: 1 / 0)
+        assert estimator.count_file("/x/mod.py", 10, 1, "def f(): pass") == first
+        monkeypatch.undo()
+
+        project_dir = tmp_path / "project"
+        project_dir.mkdir()
+        (project_dir / "app.py").write_text('"""App."""\n\ndef run(x):\n    return x\n', encoding="utf-8")
+        (project_dir / "data.json").write_text(data, encoding="utf-8")
+        outputs = []
+        for name in ("first.md", "second.md"):
+            result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(tmp_path / name)])
+            assert result.exit_code == 0, result.stdout
+            outputs.append((tmp_path / name).read_text(encoding="utf-8"))
+        # Il secondo run legge rappresentazioni e token dalla cache: stesso documento
+        assert outputs[0] == outputs[1]
+        assert "Est. Tokens (light): ~" in outputs[0]
+        assert "% | ~" in outputs[0]
+
+    def test_shard_tokens_splits_contents(self, tmp_path):
+        """--shard-tokens divide FILE CONTENTS in shard numerati, senza spezzare i file e con l'elenco dei file."""
+        from deepbase.tokens import estimator
+        project_dir = tmp_path / "project"
+        (project_dir / "pkg").mkdir(parents=True)
+        body = "".join(f"def f{k}(x):\n    return x * {k}\n\n" for k in range(60))
+        for i in range(8):
+            (project_dir / "pkg" / f"m{i}.py").write_text(f'"""Modulo {i}."""\n' + body, encoding="utf-8")
+        out_dir = tmp_path / "out"
+        out_dir.mkdir()
+        # Un run precedente con shard più piccoli: gli shard in eccesso devono sparire
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--shard-tokens", "300", "-o", str(out_dir / "ctx.md")])
+        assert result.exit_code == 0, result.stdout
+        before = len(list(out_dir.iterdir()))
+
+        limit = 2500
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--shard-tokens", str(limit), "-o", str(out_dir / "ctx.md")])
+        assert result.exit_code == 0, result.stdout
+        shards = sorted(p.name for p in out_dir.iterdir())
+        assert not (out_dir / "ctx.md").exists()
+        assert 1 < len(shards) < before
+        assert shards == [f"ctx.part{i:03d}.md" for i in range(1, len(shards) + 1)]
+
+        seen = []
+        for name in shards[:-1]:
+            text = (out_dir / name).read_text(encoding="utf-8")
+            assert estimator.count(text, name) <= limit * 1.05
+            listed = [line[2:] for line in text.splitlines() if line.startswith("- pkg/")]
+            contained = [line[len("--- START OF FILE: "):-4] for line in text.splitlines() if line.startswith("--- START OF FILE: ")]
+            assert listed == contained and contained
+            assert "📁 pkg/" in text and "m0.py (" not in text
+            seen.extend(contained)
+        assert seen == [f"pkg/m{i}.py" for i in range(8)][:len(seen)]
+
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--shard-tokens", "100", "-o", "-"])
+        assert result.exit_code == 1
+
+    def test_jsonl_format_and_section_index(self, tmp_path):
+        """--format jsonl scrive un record per file; --index registra gli offset in byte di ogni sezione."""
+        import json
+        project_dir = tmp_path / "project"
+        (project_dir / "src").mkdir(parents=True)
+        (project_dir / "src" / "app.py").write_text('"""App."""\n\ndef run(x):\n    return x\n', encoding="utf-8")
+        (project_dir / "src" / "util.py").write_text("def helper():\n    return 'è'\n", encoding="utf-8")
+        (project_dir / "README.md").write_text("# Titolo\n\nTesto.\n", encoding="utf-8")
+        (project_dir / "blob.json").write_bytes(b"\x00\x01\x02binary\x00" * 10)
+
+        output_file = tmp_path / "ctx.jsonl"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-f", "src/app.py", "--format", "jsonl", "--index", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        records = [json.loads(line) for line in output_file.read_text(encoding="utf-8").splitlines()]
+        by_path = {r["path"]: r for r in records}
+        assert by_path["src/app.py"]["mode"] == "full" and by_path["src/app.py"]["focused"]
+        assert "return x" in by_path["src/app.py"]["content"]
+        assert by_path["src/util.py"]["mode"] == "light" and "def helper():" in by_path["src/util.py"]["content"]
+        assert by_path["blob.json"]["kind"] == "binary" and by_path["blob.json"]["content"] is None
+        assert all(r["tokens"] >= 0 and r["size"] >= 0 for r in records)
+
+        # L'indice permette di leggere un solo record con una seek
+        index = json.loads((tmp_path / "ctx.jsonl.index.json").read_text(encoding="utf-8"))
+        assert index["format"] == "jsonl" and len(index["files"]) == len(records)
+        with open(output_file, "rb") as f:
+            for item in index["files"]:
+                f.seek(item["offset"])
+                assert json.loads(f.read(item["length"]))["path"] == item["path"]
+
+        # Stesso indice per l'output Markdown: ogni voce copre la sezione START..END del file
+        md_file = tmp_path / "ctx.md"
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--index", "-o", str(md_file)])
+        assert result.exit_code == 0, result.stdout
+        index = json.loads((tmp_path / "ctx.md.index.json").read_text(encoding="utf-8"))
+        assert index["format"] == "md"
+        with open(md_file, "rb") as f:
+            for item in index["files"]:
+                f.seek(item["offset"])
+                section = f.read(item["length"]).decode("utf-8")
+                assert section.startswith(f"--- START OF FILE: {item['path']} ---")
+                assert section.endswith(f"--- END OF FILE: {item['path']} ---\n")
+
+        # --incremental: aggiungere --index su un progetto invariato deve comunque scrivere l'indice
+        import time
+        old = time.time() - 3600
+        for path in [project_dir, *project_dir.rglob("*")]:
+            os.utime(path, (old, old))
+        inc_file = tmp_path / "inc.md"
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--incremental", "-o", str(inc_file)])
+        assert result.exit_code == 0, result.stdout
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--incremental", "-o", str(inc_file)])
+        assert "UP TO DATE" in result.stdout
+        result = runner.invoke(app_test, [str(project_dir), "--light", "--incremental", "--index", "-o", str(inc_file)])
+        assert result.exit_code == 0, result.stdout
+        assert "UP TO DATE" not in result.stdout
+        assert (tmp_path / "inc.md.index.json").exists()
+
+        result = runner.invoke(app_test, [str(project_dir), "--format", "jsonl", "--incremental", "-o", str(output_file)])
+        assert result.exit_code == 1
+        result = runner.invoke(app_test, [str(project_dir), "--index", "-o", "-"])
+        assert result.exit_code == 1
+
+    def test_duplicate_files_emitted_as_references(self, tmp_path, monkeypatch):
+        """I file identici a uno già emesso diventano un riferimento di una riga, parsati una sola volta."""
+        import deepbase.scanner as scanner
+        project_dir = tmp_path / "project"
+        for folder in ("app", "vendor/lib", "other"):
+            (project_dir / folder).mkdir(parents=True)
+        source = '"""Client generato."""\n\ndef call(endpoint):\n    return endpoint\n'
+        source += "".join(f"\ndef helper_{i}(value):\n    return value + {i}\n" for i in range(20))
+        (project_dir / "app" / "client.py").write_text(source, encoding="utf-8")
+        (project_dir / "vendor" / "lib" / "client.py").write_text(source, encoding="utf-8")
+        (project_dir / "other" / "same_size.py").write_text(source.replace("call", "exec"), encoding="utf-8")
+        (project_dir / "app" / "config.json").write_text('{"debug": true}', encoding="utf-8")
+        (project_dir / "other" / "config.json").write_text('{"debug": true}', encoding="utf-8")
+        output_file = tmp_path / "ctx.md"
+
+        result = runner.invoke(app_test, [str(project_dir), "-a", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        text = output_file.read_text(encoding="utf-8")
+        assert text.count("def call(endpoint):") == 1
+        assert "--- DUPLICATE FILE: vendor/lib/client.py (same content as app/client.py) ---" in text
+        assert "--- DUPLICATE FILE: other/config.json (same content as app/config.json) ---" in text
+        assert "--- START OF FILE: other/same_size.py ---" in text
+        assert "[duplicate of app/client.py]" in text
+        # Nei totali dell'albero un duplicato pesa quanto la sua riga di riferimento
+        import re
+        total_tokens = lambda t: int(re.search(r"Est\. Tokens: ~([\d,]+)", t).group(1).replace(",", ""))
+        deduped_total = total_tokens(text)
+
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--no-dedup", "-o", str(output_file)])
+        assert result.exit_code == 0
+        text = output_file.read_text(encoding="utf-8")
+        assert text.count("def call(endpoint):") == 2 and "DUPLICATE" not in text
+        assert deduped_total < total_tokens(text)
+
+        # In light mode le copie non vengono riparsate
+        parsed = []
+        original = scanner.generate_light_representation
+        def counting(path, content):
+            parsed.append(os.path.relpath(path, project_dir).replace(os.sep, "/"))
+            return original(path, content)
+        monkeypatch.setattr(scanner, "generate_light_representation", counting)
+        result = runner.invoke(app_test, [str(project_dir), "--light", "-o", str(output_file)])
+        assert result.exit_code == 0
+        assert "app/client.py" in parsed and "vendor/lib/client.py" not in parsed
+        assert "> DUPLICATE: vendor/lib/client.py (same content as app/client.py)" in output_file.read_text(encoding="utf-8")
+        monkeypatch.setattr(scanner, "generate_light_representation", original)
+
+        # --incremental: attivare --no-dedup su un progetto invariato rigenera l'output
+        import time
+        old = time.time() - 3600
+        for path in [project_dir, *project_dir.rglob("*")]:
+            os.utime(path, (old, old))
+        args = [str(project_dir), "--light", "--incremental", "-o", str(output_file)]
+        assert runner.invoke(app_test, args).exit_code == 0
+        assert "UP TO DATE" in runner.invoke(app_test, args).stdout
+        result = runner.invoke(app_test, args + ["--no-dedup"])
+        assert result.exit_code == 0 and "UP TO DATE" not in result.stdout
+        assert "DUPLICATE" not in output_file.read_text(encoding="utf-8")
+
+    def test_collapse_similar_files_into_diffs(self, tmp_path):
+        """--collapse-similar emette una volta il file di riferimento e i quasi-duplicati come diff."""
+        from deepbase.similarity import find_similar, band_rows, NUM_BINS
+        assert NUM_BINS % band_rows(0.8) == 0 and band_rows(0.95) >= band_rows(0.5)
+
+        project_dir = tmp_path / "project"
+        (project_dir / "tenants").mkdir(parents=True)
+        base = "".join(f"setting_{k}: value_{k}\n" for k in range(40))
+        for tenant in ("acme", "globex", "initech"):
+            (project_dir / "tenants" / f"{tenant}.yml").write_text(f"tenant: {tenant}\n{base}owner: {tenant}@example.com\n", encoding="utf-8")
+        (project_dir / "app.py").write_text("".join(f"def f{k}(x):\n    return x ** {k}\n" for k in range(30)), encoding="utf-8")
+
+        texts = [(p.name, p.read_text(encoding="utf-8")) for p in sorted((project_dir / "tenants").iterdir())]
+        texts.append(("app.py", (project_dir / "app.py").read_text(encoding="utf-8")))
+        assert find_similar(texts, 0.8) == {"globex.yml": "acme.yml", "initech.yml": "acme.yml"}
+
+        # Le righe dei hunk che iniziano con "--" (commenti SQL) restano nel diff
+        from deepbase.similarity import compact_diff
+        assert compact_diff("-- tenant a\nselect 1;\n", "-- tenant b\nselect 1;\n") == "@@ -1 +1 @@\n--- tenant a\n+-- tenant b"
+
+        output_file = tmp_path / "ctx.md"
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--collapse-similar", "0.8", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        text = output_file.read_text(encoding="utf-8")
+        assert "--- START OF FILE: tenants/acme.yml ---" in text
+        assert "--- START OF FILE: tenants/globex.yml [DIFF vs tenants/acme.yml] ---" in text
+        assert "-tenant: acme\n+tenant: globex" in text
+        assert text.count("setting_7: value_7") == 1
+        assert "globex.yml (" in text and "[similar to tenants/acme.yml]" in text
+        assert "--- START OF FILE: app.py ---" in text
+
+        # Stesse righe in ordine inverso: simile per l'LSH, ma il diff è più lungo del file,
+        # quindi viene emesso per intero e l'albero non lo segna come raggruppato
+        lines = [f"item_{k} = {k}" for k in range(12)]
+        (project_dir / "order_a.py").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        (project_dir / "order_b.py").write_text("\n".join(reversed(lines)) + "\n", encoding="utf-8")
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--collapse-similar", "0.8", "-o", str(output_file)])
+        assert result.exit_code == 0, result.stdout
+        text = output_file.read_text(encoding="utf-8")
+        assert "--- START OF FILE: order_b.py ---" in text
+        assert "[similar to order_a.py]" not in text
+        (project_dir / "order_a.py").unlink()
+        (project_dir / "order_b.py").unlink()
+
+        # Soglia più alta della similarità reale: nessun raggruppamento
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--collapse-similar", "1.0", "-o", str(output_file)])
+        assert result.exit_code == 0
+        assert "DIFF vs" not in output_file.read_text(encoding="utf-8")
+
+        result = runner.invoke(app_test, [str(project_dir), "-a", "--collapse-similar", "0.8", "--incremental", "-o", str(output_file)])
+        assert result.exit_code == 1